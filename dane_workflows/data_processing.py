@@ -2,14 +2,15 @@ from abc import ABC, abstractmethod
 from uuid import uuid4
 import logging
 import sys
-from typing import List, Optional
+from typing import Iterator, List, Optional
 from dane_workflows.util.base_util import (
     check_setting,
     load_config_or_die,
     auto_create_dir,
 )
 from dane_workflows.status import StatusHandler, StatusRow, ProcessingStatus, ErrorCode
-from dane_workflows.util.dane_util import DANEHandler, Task, Result
+from dane_workflows.util.dane_util import DANEBatchMonitor, DANEHandler, Task, Result
+from dane_workflows.util.logging_util import log_aggregated
 from time import sleep
 from dataclasses import dataclass
 
@@ -124,6 +125,36 @@ class DataProcessingEnvironment(ABC):
         self.status_handler.persist_or_die(status_rows)
         return results
 
+    # streaming variant of fetch_results_of_batch(): yields the results in chunks (of at
+    # most chunk_size), so the whole batch of results is never kept in memory at once
+    def fetch_results_of_batch_stream(
+        self, proc_batch_id: int, chunk_size: int
+    ) -> Iterator[List[ProcessingResult]]:
+        num_results = 0
+        for results in self._fetch_results_of_batch_stream(proc_batch_id, chunk_size):
+            if not results:
+                continue
+            num_results += len(results)
+            self.status_handler.persist_or_die([r.status_row for r in results])
+            yield results
+        if num_results == 0:
+            logger.error(
+                f"Error obtaining ProcessingResults for proc_batch {proc_batch_id}"
+            )
+        else:
+            logger.info(
+                f"Retrieved {num_results} results for proc_batch {proc_batch_id}"
+            )
+
+    # override to stream the results from the processing env; by default the results of
+    # _fetch_results_of_batch() are simply split into chunks
+    def _fetch_results_of_batch_stream(
+        self, proc_batch_id: int, chunk_size: int
+    ) -> Iterator[List[ProcessingResult]]:
+        results = self._fetch_results_of_batch(proc_batch_id) or []
+        for i in range(0, len(results), chunk_size):
+            yield results[i : i + chunk_size]
+
     def get_pretty_config(self) -> dict:
         return self.config
 
@@ -168,6 +199,12 @@ class DANEEnvironment(DataProcessingEnvironment):
     def __init__(self, config, status_handler: StatusHandler, unit_test: bool = False):
         super().__init__(config, status_handler, unit_test)
         self.dane_handler = DANEHandler(self.config)
+        # optionally all outstanding batches are monitored together
+        self.batch_monitor = (
+            DANEBatchMonitor(self.dane_handler)
+            if self.config.get("DANE_MONITOR_SHARED", False)
+            else None
+        )
 
     def _validate_config(self):
         logger.info(f"Validating {self.__class__.__name__} config")
@@ -226,6 +263,7 @@ class DANEEnvironment(DataProcessingEnvironment):
             assert check_setting(
                 self.config["DANE_ES_QUERY_TIMEOUT"], int
             ), "DANEEnvironment.DANE_ES_QUERY_TIMEOUT"
+            self._validate_tuning_config()
 
             assert (
                 auto_create_dir(self.config["DANE_STATUS_DIR"]) is True
@@ -237,6 +275,39 @@ class DANEEnvironment(DataProcessingEnvironment):
 
         return True
 
+    # validates the optional settings for tuning the communication with DANE
+    def _validate_tuning_config(self):
+        for positive_int_setting in [
+            "DANE_ES_PAGE_SIZE",
+            "DANE_HTTP_POOL_SIZE",
+            "DANE_MONITOR_INTERVAL_MIN",
+            "DANE_MONITOR_INTERVAL_MAX",
+        ]:
+            if positive_int_setting in self.config:
+                assert (
+                    check_setting(self.config[positive_int_setting], int)
+                    and self.config[positive_int_setting] > 0
+                ), f"DANEEnvironment.{positive_int_setting}"
+        if "DANE_MONITOR_WATERMARK_OVERLAP" in self.config:
+            assert (
+                check_setting(self.config["DANE_MONITOR_WATERMARK_OVERLAP"], int)
+                and self.config["DANE_MONITOR_WATERMARK_OVERLAP"] >= 0
+            ), "DANEEnvironment.DANE_MONITOR_WATERMARK_OVERLAP"
+        if "DANE_MONITOR_BACKOFF" in self.config:
+            assert (
+                type(self.config["DANE_MONITOR_BACKOFF"]) in [int, float]
+                and self.config["DANE_MONITOR_BACKOFF"] >= 1
+            ), "DANEEnvironment.DANE_MONITOR_BACKOFF"
+        if "DANE_MONITOR_JITTER" in self.config:
+            assert (
+                type(self.config["DANE_MONITOR_JITTER"]) in [int, float]
+                and 0 <= self.config["DANE_MONITOR_JITTER"] < 1
+            ), "DANEEnvironment.DANE_MONITOR_JITTER"
+        if "DANE_MONITOR_SHARED" in self.config:
+            assert check_setting(
+                self.config["DANE_MONITOR_SHARED"], bool
+            ), "DANEEnvironment.DANE_MONITOR_SHARED"
+
     # uploads batch as DANE Documents to DANE environment
     def _register_batch(
         self, proc_batch_id: int, batch: List[StatusRow]
@@ -258,9 +329,15 @@ class DANEEnvironment(DataProcessingEnvironment):
     # When finished returns a list of updated StatusRows
     def _monitor_batch(self, proc_batch_id: int) -> Optional[List[StatusRow]]:
         logger.info(f"Monitoring DANE batch #{proc_batch_id}")
-        tasks_of_batch = self.dane_handler.monitor_batch(
-            proc_batch_id, False  # no verbose output
-        )
+        if self.batch_monitor:
+            if not self.batch_monitor.wait_until_done(proc_batch_id):
+                logger.error(f"Could not monitor DANE batch #{proc_batch_id}")
+                return None
+            tasks_of_batch = self.dane_handler.get_tasks_of_batch(proc_batch_id)
+        else:
+            tasks_of_batch = self.dane_handler.monitor_batch(
+                proc_batch_id, False  # no verbose output
+            )
         # convert the DANE results to StatusRows and persist the status
         return self._to_status_rows(proc_batch_id, tasks_of_batch)
 
@@ -272,8 +349,8 @@ class DANEEnvironment(DataProcessingEnvironment):
 
         # NOTE results may be empty in case the tasks were already done
         status_rows = self.status_handler.get_status_rows_of_proc_batch(proc_batch_id)
-        results_of_batch = self.dane_handler.get_results_of_batch(proc_batch_id, [])
-        tasks_of_batch = self.dane_handler.get_tasks_of_batch(proc_batch_id, [])
+        results_of_batch = self.dane_handler.get_results_of_batch(proc_batch_id)
+        tasks_of_batch = self.dane_handler.get_tasks_of_batch(proc_batch_id)
 
         num_status_rows = len(status_rows) if status_rows else 0
         logger.info(f"Number of status_rows found: {num_status_rows}")
@@ -296,6 +373,52 @@ class DANEEnvironment(DataProcessingEnvironment):
             status_rows if status_rows else [], results_of_batch, tasks_of_batch
         )
 
+    # streams the DANE results page by page, joining them to the status_rows on the fly
+    def _fetch_results_of_batch_stream(
+        self, proc_batch_id: int, chunk_size: int
+    ) -> Iterator[List[ProcessingResult]]:
+        logger.info(f"Streaming results of proc_batch {proc_batch_id} from DANE")
+        status_rows = self.status_handler.get_status_rows_of_proc_batch(proc_batch_id)
+        if not status_rows:
+            logger.error("No status_rows found, returning")
+            return
+
+        # the tasks (without any payload) are needed to link each result to a document
+        task_id_to_doc_id = {
+            task.id: task.doc_id
+            for task in self.dane_handler.iter_tasks_of_batch(proc_batch_id)
+        }
+        proc_id_to_row = {row.proc_id: row for row in status_rows}
+        processing_results: List[ProcessingResult] = []
+        with log_aggregated(
+            logger,
+            logging.WARNING,
+            "results not found in tasks or status_rows of batch! (possibly manually removed from ES)",
+        ) as not_found_log:
+            for result in self.dane_handler.iter_results_of_batch(proc_batch_id):
+                result.doc_id = task_id_to_doc_id.get(result.task_id)
+                row = proc_id_to_row.pop(result.doc_id, None)
+                if row is None:
+                    not_found_log.add(result.task_id)
+                    continue
+                row.status = ProcessingStatus.RESULTS_FETCHED  # update the status
+                processing_results.append(
+                    ProcessingResult(row, result.payload, result.generator)
+                )
+                if len(processing_results) == chunk_size:
+                    yield processing_results
+                    processing_results = []
+        if processing_results:
+            yield processing_results
+
+        with log_aggregated(
+            logger,
+            logging.WARNING,
+            "proc_ids not found in DANE results, perhaps the tasks could not finish because of failed dependencies",
+        ) as no_result_log:
+            for proc_id in proc_id_to_row:
+                no_result_log.add(proc_id)
+
     # TODO figure out how to make this work without status_rows...
     def fetch_result_of_target_id(self, target_id: str) -> Optional[ProcessingResult]:
         logger.info(f"Asking DANEEnvironment for result of target_id {target_id}")
@@ -339,31 +462,37 @@ class DANEEnvironment(DataProcessingEnvironment):
 
         # First assign the doc_id, i.e. proc_id, to each processing result via the list of tasks
         task_id_to_doc_id = {task.id: task.doc_id for task in tasks_of_batch}
-        for result in results_of_batch:
-            if result.task_id in task_id_to_doc_id:
-                result.doc_id = task_id_to_doc_id[result.task_id]
-            else:
-                logger.warning(
-                    f"{result.task_id} not found in tasks of batch! (possibly manually removed from ES)"
-                )
+        with log_aggregated(
+            logger,
+            logging.WARNING,
+            "results not found in tasks of batch! (possibly manually removed from ES)",
+        ) as not_found_log:
+            for result in results_of_batch:
+                if result.task_id in task_id_to_doc_id:
+                    result.doc_id = task_id_to_doc_id[result.task_id]
+                else:
+                    not_found_log.add(result.task_id)
 
         # now convert the Result objects to ProcessingResult objects
         processing_results = []
         proc_id_to_result = {result.doc_id: result for result in results_of_batch}
-        for row in status_rows_of_batch:
-            row.status = ProcessingStatus.RESULTS_FETCHED  # update the status
-            if row.proc_id in proc_id_to_result:
-                processing_results.append(  # and add a processing result
-                    ProcessingResult(
-                        row,
-                        proc_id_to_result[row.proc_id].payload,
-                        proc_id_to_result[row.proc_id].generator,
+        with log_aggregated(
+            logger,
+            logging.WARNING,
+            "proc_ids not found in DANE results, perhaps the tasks could not finish because of failed dependencies",
+        ) as no_result_log:
+            for row in status_rows_of_batch:
+                row.status = ProcessingStatus.RESULTS_FETCHED  # update the status
+                if row.proc_id in proc_id_to_result:
+                    processing_results.append(  # and add a processing result
+                        ProcessingResult(
+                            row,
+                            proc_id_to_result[row.proc_id].payload,
+                            proc_id_to_result[row.proc_id].generator,
+                        )
                     )
-                )
-            else:
-                logger.warning(
-                    f"{row.proc_id} not found in DANE results, perhaps the task {result.task_id} could not finished because of failed dependencies"
-                )
+                else:
+                    no_result_log.add(row.proc_id)
         return processing_results
 
     # Converts list of Task objects into StatusRows
@@ -1,7 +1,10 @@
 import sys
 import logging
+import threading
+from itertools import islice
 from abc import ABC, abstractmethod
-from typing import List, Optional
+from queue import Full, Queue
+from typing import Callable, Iterator, List, Optional, Sequence, Tuple
 from uuid import uuid4
 from dane_workflows.util.base_util import (
     check_setting,
@@ -15,6 +18,16 @@ to batch upload to its DANEEnvironment.
 
 The DataProvider also keeps a cache (persisted to disk) to be able to recover which IDs
 were already processed AND to keep track of which IDs could not be processed by DANE.
+
+Optionally (DATA_PROVIDER.CONFIG.PREFETCH_SOURCE_BATCHES > 0) the next source batches are
+fetched in a background thread while the current one is being processed, so the latency
+of the source catalogue is off the critical path. NOTE: fetch_source_batch_data is then
+called from that thread. The prefetched rows are only kept in memory until they become
+the current source batch, so after a crash they are simply fetched again.
+
+For (unbounded) sources that are read as a stream, e.g. a catalogue dump or an OAI-PMH
+harvest, implement a StreamingDataProvider instead: it pulls exactly BATCH_SIZE items at
+a time from a resumable stream, rather than slicing the source into source batches.
 """
 
 
@@ -31,10 +44,34 @@ class DataProvider(ABC):
         self.status_handler = status_handler
 
         # enforce config validation
-        if not self._validate_config():
+        if not self._validate_config() or not self._validate_prefetch_config():
             logger.critical("Malconfigured, quitting...")
             sys.exit()
 
+        # number of source batches to fetch ahead of the current one (0 means no prefetching)
+        self.PREFETCH_SOURCE_BATCHES: int = self.config.get(
+            "PREFETCH_SOURCE_BATCHES", 0
+        )
+        self._prefetcher = (
+            SourceBatchPrefetcher(
+                self.fetch_source_batch_data, self.PREFETCH_SOURCE_BATCHES
+            )
+            if self.PREFETCH_SOURCE_BATCHES > 0
+            else None
+        )
+
+    def _validate_prefetch_config(self) -> bool:
+        try:
+            if "PREFETCH_SOURCE_BATCHES" in self.config:
+                assert (
+                    check_setting(self.config["PREFETCH_SOURCE_BATCHES"], int)
+                    and self.config["PREFETCH_SOURCE_BATCHES"] >= 0
+                ), "DataProvider.PREFETCH_SOURCE_BATCHES"
+        except AssertionError as e:
+            logger.error(f"Configuration error: {str(e)}")
+            return False
+        return True
+
     """
     ------------------------------ ABSTRACT METHODS --------------------
     """
@@ -70,10 +107,9 @@ class DataProvider(ABC):
         )
 
         # 2. if it's empty fetch the next source batch
+        next_source_batch_id = self.status_handler.get_cur_source_batch_id() + 1
         if unprocessed is None:
-            new_source_batch = self.fetch_source_batch_data(
-                self.status_handler.get_cur_source_batch_id() + 1
-            )
+            new_source_batch = self._fetch_next_source_batch(next_source_batch_id)
             logger.info(
                 f"New source_batch is ok: {new_source_batch is not None}"
             )  # could be []
@@ -98,6 +134,8 @@ class DataProvider(ABC):
                 return None
 
         logger.info(f"Continuing with {len(unprocessed)} unprocessed items")
+        if self._prefetcher:  # fetch the next source batch(es) in the meantime
+            self._prefetcher.prefetch(next_source_batch_id)
 
         # 3. assign the proc_batch_id to the unprocessed[0:batch_size]
         self.status_handler.persist(
@@ -111,14 +149,228 @@ class DataProvider(ABC):
         # 4. just return the selected unprocessed status_rows
         return unprocessed
 
+    # returns the (prefetched) source batch
+    def _fetch_next_source_batch(
+        self, source_batch_id: int
+    ) -> Optional[List[StatusRow]]:
+        if self._prefetcher:
+            return self._prefetcher.get(source_batch_id)
+        return self.fetch_source_batch_data(source_batch_id)
+
+    # stops prefetching (if enabled)
+    def close(self):
+        if self._prefetcher:
+            self._prefetcher.stop()
+
+
+# Fetches the source batches following source_batch_id in a background thread, holding
+# at most max_ahead of them in memory (until they are taken with get())
+class SourceBatchPrefetcher(object):
+    def __init__(
+        self,
+        fetch: Callable[[int], Optional[List[StatusRow]]],
+        max_ahead: int,
+    ):
+        self._fetch = fetch
+        self._max_ahead = max_ahead
+        self._lock = threading.Lock()
+        self._queue: Queue = Queue(max_ahead)
+        self._stopped = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._next_source_batch_id: Optional[int] = None  # the next one in the queue
+
+    # (re)starts prefetching from source_batch_id, unless that is already happening
+    def prefetch(self, source_batch_id: int):
+        with self._lock:
+            if (
+                self._thread is not None
+                and self._next_source_batch_id == source_batch_id
+            ):
+                return
+            self._stop_thread()
+            logger.info(f"Prefetching source batches from {source_batch_id}")
+            self._queue = Queue(self._max_ahead)
+            self._stopped = threading.Event()
+            self._next_source_batch_id = source_batch_id
+            self._thread = threading.Thread(
+                target=self._run,
+                args=(source_batch_id, self._queue, self._stopped),
+                name="SourceBatchPrefetcher",
+                daemon=True,
+            )
+            self._thread.start()
+
+    # returns the source batch as soon as it's prefetched (or fetches it if that failed)
+    def get(self, source_batch_id: int) -> Optional[List[StatusRow]]:
+        self.prefetch(source_batch_id)
+        fetched_id, source_batch, success = self._queue.get()
+        with self._lock:
+            self._next_source_batch_id = fetched_id + 1
+            if not success or not source_batch:  # the prefetching thread stopped
+                self._thread = None
+        if not success:
+            logger.warning(f"Prefetching source batch {fetched_id} failed, retrying")
+            return self._fetch(source_batch_id)
+        return source_batch
+
+    def stop(self):
+        with self._lock:
+            self._stop_thread()
+
+    def _stop_thread(self):
+        if self._thread is not None:
+            self._stopped.set()
+            self._thread.join()
+            self._thread = None
+
+    def _run(self, source_batch_id: int, queue: Queue, stopped: threading.Event):
+        while not stopped.is_set():
+            try:
+                source_batch = self._fetch(source_batch_id)
+                success = True
+            except Exception:
+                logger.exception(f"Could not prefetch source batch {source_batch_id}")
+                source_batch, success = None, False
+            if not self._put(queue, stopped, (source_batch_id, source_batch, success)):
+                return  # stopped while waiting for space in the queue
+            if not success or not source_batch:  # failed or no more data
+                return
+            source_batch_id += 1
+
+    # waits until the queue has space for item, returns False if stopped meanwhile
+    def _put(
+        self,
+        queue: Queue,
+        stopped: threading.Event,
+        item: Tuple[int, Optional[List[StatusRow]], bool],
+    ) -> bool:
+        while not stopped.is_set():
+            try:
+                queue.put(item, timeout=0.1)
+                return True
+            except Full:
+                continue
+        return False
+
+
+# Each call to get_next_batch pulls (at most) batch_size items from the stream returned by
+# stream_status_rows, which become a source batch of their own. The cursor after the last
+# pulled item is persisted along with the rows (see StatusHandler.set_current_source_batch),
+# so after a restart the stream is resumed right after the last source batch
+class StreamingDataProvider(DataProvider):
+    def __init__(
+        self, config: dict, status_handler: StatusHandler, unit_test: bool = False
+    ):
+        super().__init__(config, status_handler, unit_test)
+        self._stream: Optional[Iterator[Tuple[StatusRow, str]]] = None
+        self._stream_source_batch_id = -1  # the source batch the stream continues after
+
+    @abstractmethod
+    def stream_status_rows(
+        self, cursor: Optional[str]
+    ) -> Iterator[Tuple[StatusRow, str]]:
+        """Yields the StatusRows of the source items after cursor (None means: from the
+        start), each with the cursor to resume the stream after that item. The
+        source_batch_id and source_batch_name of the rows are assigned by get_next_batch"""
+        raise NotImplementedError("All StreamingDataProviders should implement this")
+
+    # the stream is only read in get_next_batch, so its cursor is persisted with the rows.
+    # Returns an empty source batch, so StatusHandler.recover() can start afresh
+    def fetch_source_batch_data(
+        self, source_batch_id: int
+    ) -> Optional[List[StatusRow]]:
+        return []
+
+    def get_next_batch(
+        self, proc_batch_id: int, batch_size: int, called_recursively: bool = False
+    ) -> Optional[List[StatusRow]]:
+        if self.status_handler.get_current_source_batch() is None:
+            return None  # means the last batch was delivered
+
+        # 1. first the unprocessed items of the current source batch (if any)
+        unprocessed = self.status_handler.get_sb_status_rows_of_type(
+            ProcessingStatus.NEW, batch_size
+        )
+        if unprocessed is not None:
+            logger.info(f"Continuing with {len(unprocessed)} unprocessed items")
+            self.status_handler.persist(
+                self.status_handler.update_status_rows(
+                    unprocessed,
+                    status=ProcessingStatus.BATCH_ASSIGNED,
+                    proc_batch_id=proc_batch_id,
+                )
+            )
+            return unprocessed
+
+        # 2. otherwise pull the next batch_size items from the stream
+        status_rows, cursor = self._pull_from_stream(batch_size)
+        if not status_rows or cursor is None:
+            logger.info("No more data available from source, TaskScheduler should quit")
+            return None
+
+        # 3. persist them as the new source batch, assigned to the proc_batch
+        self.status_handler.update_status_rows(
+            status_rows,
+            status=ProcessingStatus.BATCH_ASSIGNED,
+            proc_batch_id=proc_batch_id,
+        )
+        if not self.status_handler.set_current_source_batch(status_rows, cursor):
+            logger.error("Could not persist the source batch pulled from the stream")
+            self._stream = None  # on the next call, resume from the persisted cursor
+            return None
+        return status_rows
+
+    # returns the next (at most) batch_size rows of the stream, and the cursor after them
+    def _pull_from_stream(
+        self, batch_size: int
+    ) -> Tuple[List[StatusRow], Optional[str]]:
+        prev_source_batch_id = self.status_handler.get_cur_source_batch_id()
+        stream = self._get_stream(prev_source_batch_id)
+        if stream is None:
+            return [], None
+
+        source_batch_id = prev_source_batch_id + 1
+        source_batch_name = self._to_semantic_source_batch_id(source_batch_id)
+        status_rows = []
+        cursor = None
+        for row, cursor in islice(stream, batch_size):
+            row.source_batch_id = source_batch_id
+            row.source_batch_name = source_batch_name
+            status_rows.append(row)
+        self._stream_source_batch_id = source_batch_id
+        return status_rows, cursor
+
+    # (re)opens the stream right after the source batch, using its persisted cursor
+    def _get_stream(
+        self, source_batch_id: int
+    ) -> Optional[Iterator[Tuple[StatusRow, str]]]:
+        if self._stream is not None and self._stream_source_batch_id == source_batch_id:
+            return self._stream
+
+        cursor = None  # no source batch yet: start from the beginning
+        if source_batch_id != -1:
+            cursor = self.status_handler.get_source_batch_cursor(source_batch_id)
+            if cursor is None:
+                logger.error(
+                    f"No cursor found for source batch {source_batch_id}, "
+                    "cannot resume the stream"
+                )
+                return None
+        logger.info(f"Opening the stream after cursor: {cursor}")
+        self._stream = iter(self.stream_status_rows(cursor))
+        self._stream_source_batch_id = source_batch_id
+        return self._stream
+
 
 class ExampleDataProvider(DataProvider):
     def __init__(self, config, status_handler: StatusHandler, unit_test: bool = False):
         super(ExampleDataProvider, self).__init__(config, status_handler, unit_test)
 
         # either set dummy data OR data provided via self.config["DATA"]
-        self.data = [{"id": str(uuid4()), "url": f"https://{x}"} for x in range(0, 100)]
-        logger.info(self.config.get("DATA", None))
+        self.data: Sequence[dict] = [
+            {"id": str(uuid4()), "url": f"https://{x}"} for x in range(0, 100)
+        ]
+        logger.debug("%s", self.config.get("DATA", None))
         if self.config.get("DATA", None) is not None:
             logger.info(f"Setting {len(self.config['DATA'])} of custom items")
             self.data = self.config["DATA"]
@@ -187,6 +439,50 @@ class ExampleDataProvider(DataProvider):
         return batch_data
 
 
+# streams the same (dummy) data as the ExampleDataProvider, using the index as cursor
+class ExampleStreamingDataProvider(StreamingDataProvider):
+    def __init__(self, config, status_handler: StatusHandler, unit_test: bool = False):
+        super(ExampleStreamingDataProvider, self).__init__(
+            config, status_handler, unit_test
+        )
+        self.data = self.config.get(
+            "DATA", [{"id": str(uuid4()), "url": f"https://{x}"} for x in range(0, 100)]
+        )
+
+    def _validate_config(self) -> bool:
+        logger.info(f"Validating {self.__class__.__name__} config")
+        try:
+            assert check_setting(
+                self.config.get("DATA", None), list, True
+            ), "ExampleStreamingDataProvider.DATA"
+        except AssertionError as e:
+            logger.error(f"Configuration error: {str(e)}")
+            return False
+        return True
+
+    def _to_semantic_source_batch_id(self, source_batch_id: int) -> str:
+        return f"ExStream__{source_batch_id}"
+
+    def stream_status_rows(
+        self, cursor: Optional[str]
+    ) -> Iterator[Tuple[StatusRow, str]]:
+        start = int(cursor) + 1 if cursor is not None else 0
+        for i in range(start, len(self.data)):
+            item = self.data[i]
+            yield StatusRow(
+                target_id=item["id"],
+                target_url=item["url"],
+                status=ProcessingStatus.NEW,
+                source_batch_id=-1,  # assigned by get_next_batch()
+                source_batch_name=None,
+                source_extra_info=None,
+                proc_batch_id=None,
+                proc_id=None,
+                proc_status_msg=None,
+                proc_error_code=None,
+            ), str(i)
+
+
 # Test your DataProvider in isolation
 if __name__ == "__main__":
     from dane_workflows.status import SQLiteStatusHandler
@@ -1,6 +1,6 @@
 import sys
 from abc import ABC, abstractmethod
-from typing import List
+from typing import Iterable, List
 import logging
 from dane_workflows.data_processing import ProcessingResult
 from dane_workflows.status import StatusHandler, ProcessingStatus
@@ -38,6 +38,16 @@ class Exporter(ABC):
     def export_results(self, results: List[ProcessingResult]) -> bool:
         raise NotImplementedError("Implement to export results")
 
+    # exports the chunks of results one by one (see TASK_SCHEDULER.EXPORT_CHUNK_SIZE),
+    # override in case the export target supports e.g. bulk/streaming uploads
+    def export_results_stream(self, chunks: Iterable[List[ProcessingResult]]) -> bool:
+        exported_any = False
+        for results in chunks:
+            if not self.export_results(results):
+                return False
+            exported_any = True
+        return exported_any
+
 
 class ExampleExporter(Exporter):
     def __init__(self, config, status_handler: StatusHandler, unit_test: bool = False):
@@ -52,8 +62,7 @@ class ExampleExporter(Exporter):
             return False
         logger.info(f"Received {len(results)} results to be exported")
         status_rows = [result.status_row for result in results]
-        logger.info("Status rows taken from results:")
-        logger.info(status_rows)
+        logger.debug("Status rows taken from results: %s", status_rows)
         self.status_handler.persist(  # everything is exported properly
             self.status_handler.update_status_rows(
                 status_rows, status=ProcessingStatus.FINISHED
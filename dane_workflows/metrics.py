@@ -0,0 +1,256 @@
+import os
+import sys
+import socket
+import logging
+import threading
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from time import perf_counter
+from typing import Dict, Iterator, Optional, Tuple
+from dane_workflows.util.base_util import check_setting
+
+
+"""
+The Metrics record where the (wall-clock) time of a workflow goes:
+
+- the duration & outcome of each step of TaskScheduler._run_proc_batch
+- the duration of StatusHandler.persist and the number of persisted rows
+- the latency of the ES queries & DANE API calls of the DANEEnvironment
+- the number of items per ProcessingStatus
+
+Since these measurements are taken all over the place, the configured implementation
+is registered module-wide (see set_metrics/get_metrics). By default nothing is recorded.
+
+Configure it (optionally) via the METRICS section of the config, e.g.:
+
+METRICS:
+  TYPE: dane_workflows.metrics.PrometheusMetrics
+  CONFIG:
+    OUTPUT_FILE: ./proc_stats/metrics.prom  # e.g. for the node_exporter textfile collector
+"""
+
+
+logger = logging.getLogger(__name__)
+
+Labels = Optional[Dict[str, str]]
+
+
+class Metrics(ABC):
+    enabled = True  # False means callers can skip gathering (costly) measurements
+
+    def __init__(self, config: dict):
+        self.config = config.get("METRICS", {}).get("CONFIG", {})
+        self.PREFIX = self.config.get("PREFIX", "dane_workflows")
+
+        # enforce config validation
+        if not self._validate_config():
+            logger.critical("Malconfigured, quitting...")
+            sys.exit()
+
+    def _validate_config(self) -> bool:
+        logger.info(f"Validating {self.__class__.__name__} config")
+        try:
+            assert check_setting(
+                self.config.get("PREFIX", None), str, True
+            ), "Metrics.PREFIX"
+        except AssertionError as e:
+            logger.error(f"Configuration error: {str(e)}")
+            return False
+        return True
+
+    """ ------------------------------------ ABSTRACT FUNCTIONS -------------------------------- """
+
+    @abstractmethod
+    def observe(self, name: str, seconds: float, labels: Labels = None):
+        """Records a duration (in seconds)"""
+        raise NotImplementedError("Requires implementation")
+
+    @abstractmethod
+    def increment(self, name: str, value: float = 1, labels: Labels = None):
+        """Adds value to a counter"""
+        raise NotImplementedError("Requires implementation")
+
+    @abstractmethod
+    def set_gauge(self, name: str, value: float, labels: Labels = None):
+        """Sets a value that can go up and down, e.g. the number of items per status"""
+        raise NotImplementedError("Requires implementation")
+
+    """ ------------------------------------ PUBLIC FUNCTIONS -------------------------------- """
+
+    # measures the duration of the with block
+    @contextmanager
+    def timer(self, name: str, labels: Labels = None) -> Iterator[None]:
+        start = perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, perf_counter() - start, labels)
+
+    # called after each proc_batch, e.g. to write the metrics to disk
+    def flush(self):
+        pass
+
+
+# the default: records nothing
+class NoopMetrics(Metrics):
+    enabled = False
+
+    def observe(self, name: str, seconds: float, labels: Labels = None):
+        pass
+
+    def increment(self, name: str, value: float = 1, labels: Labels = None):
+        pass
+
+    def set_gauge(self, name: str, value: float, labels: Labels = None):
+        pass
+
+
+# keeps the metrics in memory and renders them in the Prometheus text format, which is
+# (optionally) written to OUTPUT_FILE on flush(), so no server is required
+class PrometheusMetrics(Metrics):
+    def __init__(self, config: dict):
+        super().__init__(config)
+        self.OUTPUT_FILE: Optional[str] = self.config.get("OUTPUT_FILE", None)
+        self._lock = threading.Lock()
+        self._types: Dict[str, str] = {}  # per metric name: summary, counter or gauge
+        self._values: Dict[Tuple[str, Tuple], float] = {}  # per name & labels
+
+    def _validate_config(self) -> bool:
+        if not super()._validate_config():
+            return False
+        try:
+            assert check_setting(
+                self.config.get("OUTPUT_FILE", None), str, True
+            ), "PrometheusMetrics.OUTPUT_FILE"
+        except AssertionError as e:
+            logger.error(f"Configuration error: {str(e)}")
+            return False
+        return True
+
+    def observe(self, name: str, seconds: float, labels: Labels = None):
+        with self._lock:
+            self._add(f"{name}_seconds", "summary", 0, labels)  # registers the type
+            self._add(f"{name}_seconds_sum", None, seconds, labels)
+            self._add(f"{name}_seconds_count", None, 1, labels)
+
+    def increment(self, name: str, value: float = 1, labels: Labels = None):
+        with self._lock:
+            self._add(f"{name}_total", "counter", value, labels)
+
+    def set_gauge(self, name: str, value: float, labels: Labels = None):
+        with self._lock:
+            self._types[self._full_name(name)] = "gauge"
+            self._values[(self._full_name(name), self._to_key(labels))] = value
+
+    def _add(self, name: str, metric_type: Optional[str], value: float, labels: Labels):
+        full_name = self._full_name(name)
+        if metric_type:
+            self._types[full_name] = metric_type
+            if metric_type == "summary":
+                return  # the summary itself has no value, only its _sum and _count
+        key = (full_name, self._to_key(labels))
+        self._values[key] = self._values.get(key, 0) + value
+
+    def _full_name(self, name: str) -> str:
+        return f"{self.PREFIX}_{name}" if self.PREFIX else name
+
+    def _to_key(self, labels: Labels) -> Tuple:
+        return tuple(sorted(labels.items())) if labels else ()
+
+    # renders all metrics in the Prometheus text exposition format
+    def to_text(self) -> str:
+        lines = []
+        with self._lock:
+            for metric_name, metric_type in sorted(self._types.items()):
+                lines.append(f"# TYPE {metric_name} {metric_type}")
+                for (name, labels), value in sorted(self._values.items()):
+                    if name == metric_name or (
+                        metric_type == "summary"
+                        and name in [f"{metric_name}_sum", f"{metric_name}_count"]
+                    ):
+                        lines.append(f"{name}{_format_labels(labels)} {value}")
+        return "\n".join(lines) + "\n"
+
+    def flush(self):
+        if not self.OUTPUT_FILE:
+            return
+        try:
+            # write to a temp file first, so a collector never reads a partial file
+            tmp_file = f"{self.OUTPUT_FILE}.tmp"
+            with open(tmp_file, "w") as f:
+                f.write(self.to_text())
+            os.replace(tmp_file, self.OUTPUT_FILE)
+        except OSError:
+            logger.exception(f"Could not write the metrics to {self.OUTPUT_FILE}")
+
+
+# sends each measurement to a StatsD daemon over UDP (labels become DogStatsD tags).
+# UDP is fire-and-forget: when no daemon is listening, nothing is recorded
+class StatsDMetrics(Metrics):
+    def __init__(self, config: dict):
+        super().__init__(config)
+        self.HOST: str = self.config.get("HOST", "localhost")
+        self.PORT: int = self.config.get("PORT", 8125)
+        self._socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+
+    def _validate_config(self) -> bool:
+        if not super()._validate_config():
+            return False
+        try:
+            assert check_setting(
+                self.config.get("HOST", None), str, True
+            ), "StatsDMetrics.HOST"
+            assert check_setting(
+                self.config.get("PORT", None), int, True
+            ), "StatsDMetrics.PORT"
+        except AssertionError as e:
+            logger.error(f"Configuration error: {str(e)}")
+            return False
+        return True
+
+    def observe(self, name: str, seconds: float, labels: Labels = None):
+        self._send(name, f"{seconds * 1000:.3f}", "ms", labels)
+
+    def increment(self, name: str, value: float = 1, labels: Labels = None):
+        self._send(name, str(value), "c", labels)
+
+    def set_gauge(self, name: str, value: float, labels: Labels = None):
+        self._send(name, str(value), "g", labels)
+
+    def _send(self, name: str, value: str, metric_type: str, labels: Labels):
+        full_name = f"{self.PREFIX}.{name}" if self.PREFIX else name
+        tags = (
+            "|#" + ",".join(f"{k}:{v}" for k, v in sorted(labels.items()))
+            if labels
+            else ""
+        )
+        try:
+            self._socket.sendto(
+                f"{full_name}:{value}|{metric_type}{tags}".encode("utf-8"),
+                (self.HOST, self.PORT),
+            )
+        except OSError:
+            logger.debug(f"Could not send {full_name} to StatsD")
+
+
+def _format_labels(labels: Tuple) -> str:
+    if not labels:
+        return ""
+    escaped = [
+        (k, str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n"))
+        for k, v in labels
+    ]
+    return "{" + ",".join(f'{k}="{v}"' for k, v in escaped) + "}"
+
+
+_metrics: Metrics = NoopMetrics({})
+
+
+# the Metrics used throughout the workflow (NoopMetrics unless configured)
+def get_metrics() -> Metrics:
+    return _metrics
+
+
+def set_metrics(metrics: Metrics):
+    global _metrics
+    _metrics = metrics
@@ -19,4 +19,7 @@ def construct_task_scheduler(config) -> TaskScheduler:
         import_dane_workflow_class(config["STATUS_MONITOR"]["TYPE"])
         if "STATUS_MONITOR" in config
         else None,
+        metrics=import_dane_workflow_class(config["METRICS"]["TYPE"])
+        if "METRICS" in config
+        else None,
     )
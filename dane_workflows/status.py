@@ -1,17 +1,25 @@
 from abc import ABC, abstractmethod
+from contextlib import contextmanager
+import os
 import sys
+import json
 import logging
-from dataclasses import dataclass
+import threading
+from dataclasses import dataclass, replace
 from enum import IntEnum, unique
-from typing import List, Optional, Tuple
+from collections import Counter
+from operator import itemgetter
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
 from pathlib import Path
 from dane_workflows.util.base_util import (
     check_setting,
     load_config_or_die,
     auto_create_dir,
 )
+from dane_workflows.metrics import get_metrics
 import sqlite3
 from datetime import datetime
+from time import time
 from sqlite3 import Error  # superclass of all sqlite3 Exceptions
 
 """
@@ -85,7 +93,9 @@ class ErrorCode(IntEnum):  # TODO assign this to each StatusRow
     IMPOSSIBLE = 8  # this item is impossible to process
 
 
-@dataclass
+# NOTE: __init__ is written out, so date_created & date_modified can still be passed as
+# datetime (also positionally), while they are stored as the *_ts epoch seconds
+@dataclass(slots=True, init=False)
 class StatusRow:
     target_id: str  # Use this to reconcile results with source catalog (DANE.Document.target.id)
     target_url: str  # So DataProcessingEnvironment can get to the content (DANE.Document.target.url)
@@ -103,8 +113,61 @@ class StatusRow:
     proc_error_code: Optional[
         ErrorCode
     ]  # in case of status == ERROR, learn more about why
-    date_created: datetime = datetime.now()  # YYYY-MM-DD HH:MM:SS.SSS
-    date_modified: datetime = datetime.now()  # YYYY-MM-DD HH:MM:SS.SSS
+    date_created_ts: float  # seconds since epoch
+    date_modified_ts: float  # seconds since epoch
+
+    def __init__(
+        self,
+        target_id: str,
+        target_url: str,
+        status: ProcessingStatus,
+        source_batch_id: int,
+        source_batch_name: Optional[str],
+        source_extra_info: Optional[str],
+        proc_batch_id: Optional[int],
+        proc_id: Optional[str],
+        proc_status_msg: Optional[str],
+        proc_error_code: Optional[ErrorCode],
+        date_created: Optional[datetime] = None,
+        date_modified: Optional[datetime] = None,
+        *,
+        date_created_ts: Optional[float] = None,
+        date_modified_ts: Optional[float] = None,
+    ):
+        self.target_id = target_id
+        self.target_url = target_url
+        self.status = status
+        self.source_batch_id = source_batch_id
+        self.source_batch_name = source_batch_name
+        self.source_extra_info = source_extra_info
+        self.proc_batch_id = proc_batch_id
+        self.proc_id = proc_id
+        self.proc_status_msg = proc_status_msg
+        self.proc_error_code = proc_error_code
+        now = time()
+        if date_created_ts is None:
+            date_created_ts = date_created.timestamp() if date_created else now
+        if date_modified_ts is None:
+            date_modified_ts = date_modified.timestamp() if date_modified else now
+        self.date_created_ts = date_created_ts
+        self.date_modified_ts = date_modified_ts
+
+    # the timestamps are only converted to datetime when asked for
+    @property
+    def date_created(self) -> datetime:
+        return datetime.fromtimestamp(self.date_created_ts)
+
+    @date_created.setter
+    def date_created(self, dt: datetime):
+        self.date_created_ts = dt.timestamp()
+
+    @property
+    def date_modified(self) -> datetime:
+        return datetime.fromtimestamp(self.date_modified_ts)
+
+    @date_modified.setter
+    def date_modified(self, dt: datetime):
+        self.date_modified_ts = dt.timestamp()
 
     def __hash__(self):
         return hash(f"{self.target_id}{self.target_url}")
@@ -113,11 +176,44 @@ class StatusRow:
         return other.target_id == self.target_id and other.target_url == self.target_url
 
 
+# everything the StatusMonitor reports on, taken at once (see get_status_snapshot).
+# The counts are dicts of ProcessingStatus/ErrorCode values and their counts
+@dataclass
+class StatusSnapshot:
+    last_proc_batch_id: int
+    last_source_batch_id: int
+    current_semantic_source_batch_id: str
+    status_counts: dict
+    error_code_counts: dict
+    status_counts_of_last_proc_batch: dict
+    error_code_counts_of_last_proc_batch: dict
+    status_counts_of_last_source_batch: dict
+    error_code_counts_of_last_source_batch: dict
+    completed_semantic_source_batch_ids: Optional[List[str]]
+    uncompleted_semantic_source_batch_ids: Optional[List[str]]
+    status_counts_per_extra_info_value: Optional[dict] = None  # only if asked for
+
+
 class StatusHandler(ABC):
     def __init__(self, config):
 
-        # only used so the data provider knows which source_batch it was at
-        self.cur_source_batch: List[StatusRow] = None  # call recover to fill it
+        # guards the in-memory source batch, as proc_batches may run in parallel threads
+        self._lock = threading.RLock()
+
+        # only used so the data provider knows which source_batch it was at (None until
+        # recover fills it)
+        self.cur_source_batch: Optional[List[StatusRow]] = None
+
+        # maps each (target_id, target_url) to its position in cur_source_batch
+        self._cur_source_batch_index: Dict[Tuple[str, str], int] = {}
+
+        # per ProcessingStatus an (insertion ordered) set of the cur_source_batch rows
+        self._cur_source_batch_by_status: Dict[
+            ProcessingStatus, Dict[Tuple[str, str], StatusRow]
+        ] = {}
+
+        # per source_batch_id the cursor to resume a stream after it (see StreamingDataProvider)
+        self._source_batch_cursors: Dict[int, str] = {}
         self.config = (
             config["STATUS_HANDLER"]["CONFIG"]
             if "CONFIG" in config["STATUS_HANDLER"]
@@ -251,34 +347,136 @@ class StatusHandler(ABC):
             uncompleted batches"""
         raise NotImplementedError("Requires implementation")
 
+    # gathers all status information of the StatusMonitor. Subclasses should override this
+    # to compute it in a single pass, rather than calling each of these functions
+    def get_status_snapshot(self, include_extra_info: bool = False) -> StatusSnapshot:
+        last_proc_batch_id = self.get_last_proc_batch_id()
+        last_source_batch_id = self.get_last_source_batch_id()
+        (
+            completed_batch_ids,
+            uncompleted_batch_ids,
+        ) = self.get_completed_semantic_source_batch_ids()
+        # the count functions may return None, the snapshot always holds a dict
+        status_counts = self.get_status_counts() or {}
+        error_code_counts = self.get_error_code_counts() or {}
+        proc_batch_status_counts = (
+            self.get_status_counts_for_proc_batch_id(last_proc_batch_id) or {}
+        )
+        source_batch_status_counts = (
+            self.get_status_counts_for_source_batch_id(last_source_batch_id) or {}
+        )
+        return StatusSnapshot(
+            last_proc_batch_id=last_proc_batch_id,
+            last_source_batch_id=last_source_batch_id,
+            current_semantic_source_batch_id=self.get_name_of_source_batch_id(
+                self.get_cur_source_batch_id()
+            ),
+            status_counts=status_counts,
+            error_code_counts=error_code_counts,
+            status_counts_of_last_proc_batch=proc_batch_status_counts,
+            error_code_counts_of_last_proc_batch=self.get_error_code_counts_for_proc_batch_id(
+                last_proc_batch_id
+            ),
+            status_counts_of_last_source_batch=source_batch_status_counts,
+            error_code_counts_of_last_source_batch=self.get_error_code_counts_for_source_batch_id(
+                last_source_batch_id
+            ),
+            completed_semantic_source_batch_ids=completed_batch_ids,
+            uncompleted_semantic_source_batch_ids=uncompleted_batch_ids,
+            status_counts_per_extra_info_value=self.get_status_counts_per_extra_info_value()
+            if include_extra_info
+            else None,
+        )
+
     """ --------------------- SOURCE BATCH SPECIFIC FUNCTIONS ------------------ """
 
     def get_current_source_batch(self):
         return self.cur_source_batch
 
-    # called by the data provider to start keeping track of the latest source batch
-    def set_current_source_batch(self, status_rows: List[StatusRow]):
+    # called by the data provider to start keeping track of the latest source batch.
+    # A streaming data provider also passes the cursor to resume its stream after this batch
+    def set_current_source_batch(
+        self, status_rows: List[StatusRow], cursor: Optional[str] = None
+    ):
         logger.info(
             f"Setting new source_batch of {len(status_rows) if status_rows else 0} items"
         )
-        self.cur_source_batch = status_rows  # set the new source batch data
-        return self._persist(status_rows)
+        with self._lock:
+            self._load_current_source_batch(status_rows)  # set the new source batch
+            if cursor is None or not status_rows:
+                return self._persist(status_rows)
+            return self._persist_source_batch(status_rows, cursor)
+
+    # persists the rows of a source batch along with its cursor. Override this to store
+    # both in a single transaction, so a crash never leaves rows without their cursor
+    def _persist_source_batch(self, status_rows: List[StatusRow], cursor: str) -> bool:
+        if not self._persist(status_rows):
+            return False
+        self._source_batch_cursors[status_rows[0].source_batch_id] = cursor
+        return True
+
+    # returns the cursor to resume the stream after the source batch (None if unknown)
+    def get_source_batch_cursor(self, source_batch_id: int) -> Optional[str]:
+        return self._source_batch_cursors.get(source_batch_id)
+
+    # (re)sets the in-memory source batch and its lookup index
+    def _load_current_source_batch(self, status_rows: Optional[List[StatusRow]]):
+        with self._lock:
+            self.cur_source_batch = status_rows
+            self._cur_source_batch_index = {}
+            self._cur_source_batch_by_status = {}
+            for i, row in enumerate(status_rows or []):
+                key = (row.target_id, row.target_url)
+                self._cur_source_batch_index[key] = i
+                self._cur_source_batch_by_status.setdefault(row.status, {})[key] = row
+
+    # applies freshly persisted status_rows to the in-memory source batch, so there is
+    # no need to reload the whole source batch from the DB after each persist
+    def _sync_current_source_batch(self, status_rows: List[StatusRow]):
+        if not self.cur_source_batch:
+            return
+        cur_source_batch_id = self.get_cur_source_batch_id()
+        for row in status_rows:
+            if row.source_batch_id != cur_source_batch_id:
+                continue  # not part of the current source batch
+            key = (row.target_id, row.target_url)
+            i = self._cur_source_batch_index.get(key)
+            if i is None:
+                self._cur_source_batch_index[key] = len(self.cur_source_batch)
+                self.cur_source_batch.append(row)
+            else:
+                self.cur_source_batch[i] = row
+            self._move_to_status_bucket(key, row)
+
+    # makes sure the row is only listed under its current status
+    def _move_to_status_bucket(self, key: Tuple[str, str], row: StatusRow):
+        for bucket in self._cur_source_batch_by_status.values():
+            bucket.pop(key, None)
+        self._cur_source_batch_by_status.setdefault(row.status, {})[key] = row
 
     # Get a list of IDs for a certain ProcessingStatus
     def get_sb_status_rows_of_type(
         self, proc_status: ProcessingStatus, batch_size: int
     ) -> Optional[List[StatusRow]]:
-        status_rows = list(
-            filter(lambda x: x.status == proc_status, self.cur_source_batch)
-        )
-        status_rows = (
-            status_rows[0:batch_size] if len(status_rows) >= batch_size else status_rows
-        )
+        with self._lock:
+            bucket = self._cur_source_batch_by_status.get(proc_status, {})
+            status_rows = []
+            outdated = []
+            for key, row in bucket.items():
+                if row.status != proc_status:  # status was changed without being synced
+                    outdated.append((key, row))
+                    continue
+                status_rows.append(row)
+                if len(status_rows) == batch_size:
+                    break
+            for key, row in outdated:
+                self._move_to_status_bucket(key, row)
         return status_rows if len(status_rows) > 0 else None
 
     def get_cur_source_batch_id(self) -> int:
-        if self.cur_source_batch and len(self.cur_source_batch) > 0:
-            return self.cur_source_batch[0].source_batch_id
+        cur_source_batch = self.cur_source_batch
+        if cur_source_batch and len(cur_source_batch) > 0:
+            return cur_source_batch[0].source_batch_id
         return -1
 
     """ --------------------- ALL STATUS ROWS FUNCTIONS ------------------ """
@@ -300,8 +498,20 @@ class StatusHandler(ABC):
                 row.proc_batch_id = proc_batch_id
             if proc_error_code is not None:
                 row.proc_error_code = proc_error_code
+            if status is not None:
+                self._update_status_bucket(row)
         return status_rows
 
+    # keeps the status buckets up to date for rows of the in-memory source batch
+    def _update_status_bucket(self, row: StatusRow):
+        key = (row.target_id, row.target_url)
+        with self._lock:
+            i = self._cur_source_batch_index.get(key)
+            if i is None or self.cur_source_batch is None:
+                return  # not part of the in-memory source batch
+            if self.cur_source_batch[i] is row:
+                self._move_to_status_bucket(key, row)
+
     def persist_or_die(self, status_rows: Optional[List[StatusRow]]):
         logger.info(f"Persist or die; status_rows are ok: {status_rows is not None}")
         if self.persist(status_rows) is False:
@@ -318,13 +528,19 @@ class StatusHandler(ABC):
             return False
 
         # make sure to update the date_modified before persisting
-        if self._persist(self._update_status_rows_modification_date(status_rows)):
-            logger.info(
-                "persisted updated status_rows, now syncing with current source batch"
-            )
-            return (
-                self._recover_source_batch()
-            )  # make sure the source batch is also updated
+        metrics = get_metrics()
+        with self._lock:  # keeps the in-memory source batch in line with the DB
+            with metrics.timer("persist"):
+                persisted = self._persist(
+                    self._update_status_rows_modification_date(status_rows)
+                )
+            if persisted:
+                metrics.increment("persisted_rows", len(status_rows))
+                logger.info(
+                    "persisted updated status_rows, now syncing with current source batch"
+                )
+                self._sync_current_source_batch(status_rows)
+                return True
         logger.error("Could not persist status rows!")
         return False
 
@@ -332,8 +548,9 @@ class StatusHandler(ABC):
         self, status_rows: List[StatusRow]
     ) -> List[StatusRow]:
         logger.info("Updating modification date before persisting to DB")
+        now = time()
         for row in status_rows:
-            row.date_modified = datetime.now()
+            row.date_modified_ts = now
         return status_rows
 
     def recover(
@@ -362,6 +579,13 @@ class StatusHandler(ABC):
             cur_proc_batch,
         )  # TaskScheduler should sync this with the proc env last status
 
+    # returns the IDs (from min_proc_batch_id onwards) of the proc_batches that were not
+    # fully exported yet, so the TaskScheduler can recover them. By default only the last
+    # proc_batch is assumed to be unfinished
+    def get_unfinished_proc_batch_ids(self, min_proc_batch_id: int = 0) -> List[int]:
+        last_proc_id = self.get_last_proc_batch_id()
+        return [last_proc_id] if last_proc_id >= max(min_proc_batch_id, 0) else []
+
     def _recover_proc_batch(self) -> Optional[List[StatusRow]]:
         last_proc_id = self.get_last_proc_batch_id()
         return (
@@ -382,7 +606,7 @@ class ExampleStatusHandler(StatusHandler):
     # called on start-up of the TaskScheduler
     def _recover_source_batch(self) -> bool:
         logger.info(f"{self.__class__.__name__} simply mocks source_batch recovery")
-        self.cur_source_batch: List[StatusRow] = []
+        self._load_current_source_batch([])
         return True  # just return true, so super.persist() will work in unit tests
 
     # NOTE: does not persist anything. TODO implement in-memory storage
@@ -438,22 +662,413 @@ class ExampleStatusHandler(StatusHandler):
         return ([], [])  # TODO implement
 
 
+# keeps all status rows in memory (with indexes and counters for all queries), e.g. for
+# throw-away runs, unit tests and benchmarks. Optionally the rows are snapshotted to
+# SNAPSHOT_FILE (at most every SNAPSHOT_INTERVAL seconds on persist, and on close), from
+# which they are loaded again on start-up
+class InMemoryStatusHandler(StatusHandler):
+    def __init__(self, config):
+        super().__init__(config)
+        self.SNAPSHOT_FILE: Optional[str] = self.config.get("SNAPSHOT_FILE", None)
+        self.SNAPSHOT_INTERVAL: int = self.config.get("SNAPSHOT_INTERVAL", 60)
+
+        self._rows: Dict[Tuple[str, str], StatusRow] = {}
+        # (insertion ordered) sets of row keys per target_id, proc_batch & source_batch
+        self._by_target_id: Dict[str, Dict[Tuple[str, str], None]] = {}
+        self._by_proc_batch: Dict[Optional[int], Dict[Tuple[str, str], None]] = {}
+        self._by_source_batch: Dict[int, Dict[Tuple[str, str], None]] = {}
+        # the same counts as the status count tables of the SQLiteStatusHandler
+        self._source_batch_counts: Counter = Counter()
+        self._proc_batch_counts: Counter = Counter()
+        self._extra_info_counts: Counter = Counter()
+        self._last_snapshot = time()
+
+        if self.SNAPSHOT_FILE and os.path.exists(self.SNAPSHOT_FILE):
+            if self._load_snapshot(self.SNAPSHOT_FILE) is False:
+                logger.critical(f"Could not load the snapshot: {self.SNAPSHOT_FILE}")
+                sys.exit()
+
+    def _validate_config(self) -> bool:
+        logger.info(f"Validating {self.__class__.__name__} config")
+        try:
+            assert check_setting(
+                self.config.get("SNAPSHOT_FILE", None), str, True
+            ), "InMemoryStatusHandler.SNAPSHOT_FILE"
+            assert check_setting(
+                self.config.get("SNAPSHOT_INTERVAL", None), int, True
+            ), "InMemoryStatusHandler.SNAPSHOT_INTERVAL"
+
+            # auto create the parent dir of the snapshot file
+            if self.config.get("SNAPSHOT_FILE", None):
+                snapshot_par_dir = str(Path(self.config["SNAPSHOT_FILE"]).parent)
+                assert (
+                    auto_create_dir(snapshot_par_dir) is True
+                ), f"SNAPSHOT_FILE: {snapshot_par_dir} auto creation failed"
+        except AssertionError as e:
+            logger.error(f"Configuration error: {str(e)}")
+            return False
+        return True
+
+    # writes a final snapshot (if configured)
+    def close(self):
+        if self.SNAPSHOT_FILE:
+            self.save_snapshot()
+
+    # called on start-up of the TaskScheduler
+    def _recover_source_batch(self) -> bool:
+        source_batch_id = self.get_last_source_batch_id()
+        if source_batch_id == -1:
+            logger.info("No source batch ID found in memory, nothing to recover")
+            return False
+        self._load_current_source_batch(
+            self.get_status_rows_of_source_batch(source_batch_id)
+        )
+        return True
+
+    # stores a copy of each row, so later changes to the rows are only kept on persist
+    def _persist(self, status_rows: List[StatusRow]) -> bool:
+        with self._lock:
+            for row in status_rows:
+                self._remove_row((row.target_id, row.target_url))
+                self._add_row(replace(row))
+            snapshot_due = time() - self._last_snapshot >= self.SNAPSHOT_INTERVAL
+            if self.SNAPSHOT_FILE and snapshot_due:
+                self.save_snapshot()
+        return True
+
+    # the cursor is set first, so a snapshot taken on persist already includes it
+    def _persist_source_batch(self, status_rows: List[StatusRow], cursor: str) -> bool:
+        with self._lock:
+            self._source_batch_cursors[status_rows[0].source_batch_id] = cursor
+            return self._persist(status_rows)
+
+    def _add_row(self, row: StatusRow):
+        key = (row.target_id, row.target_url)
+        self._rows[key] = row
+        self._by_target_id.setdefault(row.target_id, {})[key] = None
+        self._by_proc_batch.setdefault(row.proc_batch_id, {})[key] = None
+        self._by_source_batch.setdefault(row.source_batch_id, {})[key] = None
+        self._count(row, 1)
+
+    def _remove_row(self, key: Tuple[str, str]):
+        row = self._rows.pop(key, None)
+        if row is None:
+            return
+        self._remove_from_index(self._by_target_id, row.target_id, key)
+        self._remove_from_index(self._by_proc_batch, row.proc_batch_id, key)
+        self._remove_from_index(self._by_source_batch, row.source_batch_id, key)
+        self._count(row, -1)
+
+    # the entries of the index are dropped once empty, e.g. for get_last_proc_batch_id
+    def _remove_from_index(
+        self,
+        index: Dict[Any, Dict[Tuple[str, str], None]],
+        index_key,
+        key: Tuple[str, str],
+    ):
+        index[index_key].pop(key)
+        if not index[index_key]:
+            del index[index_key]
+
+    def _count(self, row: StatusRow, delta: int):
+        status = row.status.value
+        error_code = (
+            row.proc_error_code.value if row.proc_error_code is not None else None
+        )
+        for counter, key in [
+            (
+                self._source_batch_counts,
+                (row.source_batch_id, row.source_batch_name, status, error_code),
+            ),
+            (self._proc_batch_counts, (row.proc_batch_id, status, error_code)),
+            (self._extra_info_counts, (row.source_extra_info, status)),
+        ]:
+            counter[key] += delta
+            if counter[key] == 0:
+                del counter[key]
+
+    # returns copies of the rows, like a DB would
+    def _get_rows(self, keys) -> List[StatusRow]:
+        return [replace(self._rows[key]) for key in keys]
+
+    def get_status_row_by_target_id(self, target_id: str) -> Optional[StatusRow]:
+        with self._lock:
+            keys = self._by_target_id.get(target_id, {})
+            return self._get_rows(keys)[0] if len(keys) == 1 else None
+
+    def get_status_rows_of_proc_batch(
+        self, proc_batch_id: int
+    ) -> Optional[List[StatusRow]]:
+        with self._lock:
+            return self._get_rows(self._by_proc_batch.get(proc_batch_id, {})) or None
+
+    def get_status_rows_of_source_batch(
+        self, source_batch_id: int
+    ) -> Optional[List[StatusRow]]:
+        with self._lock:
+            return (
+                self._get_rows(self._by_source_batch.get(source_batch_id, {})) or None
+            )
+
+    def get_last_proc_batch_id(self) -> int:
+        with self._lock:
+            return max((i for i in self._by_proc_batch if i is not None), default=-1)
+
+    def get_last_source_batch_id(self) -> int:
+        with self._lock:
+            return max(self._by_source_batch, default=-1)
+
+    # proc_batches with items somewhere between BATCH_ASSIGNED and RESULTS_FETCHED
+    def get_unfinished_proc_batch_ids(self, min_proc_batch_id: int = 0) -> List[int]:
+        running_statuses = {
+            status.value
+            for status in ProcessingStatus.running_statuses()
+            if status != ProcessingStatus.NEW
+        }
+        with self._lock:
+            unfinished_proc_batch_ids = {
+                proc_batch_id
+                for proc_batch_id, status, _ in self._proc_batch_counts
+                if proc_batch_id is not None and status in running_statuses
+            }
+        return sorted(i for i in unfinished_proc_batch_ids if i >= min_proc_batch_id)
+
+    def get_name_of_source_batch_id(self, source_batch_id: int) -> str:
+        with self._lock:
+            names = {
+                name
+                for batch_id, name, _, _ in self._source_batch_counts
+                if batch_id == source_batch_id
+            }
+        name = names.pop() if len(names) == 1 else None
+        return name if name is not None else "-1"
+
+    def get_status_counts(self) -> dict:
+        return self._sum_counts(self._source_batch_counts, lambda key: key[2])
+
+    # like COUNT(proc_error_code) in SQL: the rows without error code count as 0
+    def get_error_code_counts(self) -> dict:
+        return self._sum_error_code_counts(self._source_batch_counts, lambda key: True)
+
+    def get_status_counts_for_proc_batch_id(self, proc_batch_id: int) -> dict:
+        return self._sum_counts(
+            self._proc_batch_counts,
+            lambda key: key[1],
+            lambda key: key[0] == proc_batch_id,
+        )
+
+    def get_error_code_counts_for_proc_batch_id(self, proc_batch_id: int) -> dict:
+        return self._sum_error_code_counts(
+            self._proc_batch_counts, lambda key: key[0] == proc_batch_id
+        )
+
+    def get_status_counts_for_source_batch_id(self, source_batch_id: int) -> dict:
+        return self._sum_counts(
+            self._source_batch_counts,
+            lambda key: key[2],
+            lambda key: key[0] == source_batch_id,
+        )
+
+    def get_error_code_counts_for_source_batch_id(self, source_batch_id: int) -> dict:
+        return self._sum_error_code_counts(
+            self._source_batch_counts, lambda key: key[0] == source_batch_id
+        )
+
+    def get_status_counts_per_extra_info_value(self) -> Optional[dict]:
+        counts: dict = {}
+        with self._lock:
+            for (extra_info, status), count in self._extra_info_counts.items():
+                counts.setdefault(extra_info, {})[status] = count
+        return counts or None
+
+    def get_completed_semantic_source_batch_ids(
+        self,
+    ) -> Tuple[Optional[List[str]], Optional[List[str]]]:
+        running_statuses = {s.value for s in ProcessingStatus.running_statuses()}
+        running_per_batch: Dict[str, bool] = {}
+        with self._lock:
+            for _, name, status, _ in self._source_batch_counts:
+                if name is None:
+                    continue  # only the named (semantic) source batches
+                running_per_batch[name] = running_per_batch.get(name, False) or (
+                    status in running_statuses
+                )
+        if not running_per_batch:
+            return (None, None)
+
+        names = sorted(running_per_batch)
+        return (
+            [name for name in names if not running_per_batch[name]],
+            [name for name in names if running_per_batch[name]],
+        )
+
+    def _sum_counts(self, counter: Counter, group: Callable, match=None) -> dict:
+        counts: dict = {}
+        with self._lock:
+            for key, count in counter.items():
+                if match is None or match(key):
+                    counts[group(key)] = counts.get(group(key), 0) + count
+        return counts
+
+    # the error code is the last element of the keys of both batch counters
+    def _sum_error_code_counts(self, counter: Counter, match: Callable) -> dict:
+        counts: dict = {}
+        with self._lock:
+            for key, count in counter.items():
+                if match(key):
+                    error_code = key[-1]
+                    counts[error_code] = counts.get(error_code, 0) + (
+                        count if error_code is not None else 0
+                    )
+        return counts
+
+    """ ----------------------- SNAPSHOT FUNCTIONS -------------------------- """
+
+    # writes all rows (and the source batch cursors) to SNAPSHOT_FILE, via a temp file so
+    # a crash never leaves a partial snapshot
+    def save_snapshot(self) -> bool:
+        snapshot_file = self.SNAPSHOT_FILE
+        if not snapshot_file:
+            logger.error("No SNAPSHOT_FILE configured, cannot save a snapshot")
+            return False
+        with self._lock:
+            snapshot = {
+                "status_rows": [self._to_list(row) for row in self._rows.values()],
+                "source_batch_cursors": self._source_batch_cursors,
+            }
+            try:
+                tmp_file = f"{snapshot_file}.tmp"
+                with open(tmp_file, "w") as f:
+                    json.dump(snapshot, f)
+                os.replace(tmp_file, snapshot_file)
+                self._last_snapshot = time()
+                logger.debug("Saved a snapshot of %d status rows", len(self._rows))
+                return True
+            except (OSError, TypeError, ValueError):
+                logger.exception(f"Could not save the snapshot: {snapshot_file}")
+        return False
+
+    def _load_snapshot(self, snapshot_file: str) -> bool:
+        logger.info(f"Loading the snapshot: {snapshot_file}")
+        try:
+            with open(snapshot_file, "r") as f:
+                snapshot = json.load(f)
+            with self._lock:
+                for values in snapshot["status_rows"]:
+                    self._add_row(self._to_status_row(values))
+                self._source_batch_cursors = {
+                    int(source_batch_id): cursor
+                    for source_batch_id, cursor in snapshot[
+                        "source_batch_cursors"
+                    ].items()
+                }
+            return True
+        except (OSError, KeyError, TypeError, ValueError):
+            logger.exception(f"Could not load the snapshot: {snapshot_file}")
+        return False
+
+    def _to_list(self, row: StatusRow) -> list:
+        return [
+            row.target_id,
+            row.target_url,
+            row.status.value,
+            row.source_batch_id,
+            row.source_batch_name,
+            row.source_extra_info,
+            row.proc_batch_id,
+            row.proc_id,
+            row.proc_status_msg,
+            row.proc_error_code.value if row.proc_error_code is not None else None,
+            row.date_created_ts,
+            row.date_modified_ts,
+        ]
+
+    def _to_status_row(self, values: list) -> StatusRow:
+        return StatusRow(
+            target_id=values[0],
+            target_url=values[1],
+            status=ProcessingStatus(values[2]),
+            source_batch_id=values[3],
+            source_batch_name=values[4],
+            source_extra_info=values[5],
+            proc_batch_id=values[6],
+            proc_id=values[7],
+            proc_status_msg=values[8],
+            proc_error_code=ErrorCode(values[9]) if values[9] is not None else None,
+            date_created_ts=values[10],
+            date_modified_ts=values[11],
+        )
+
+
 class SQLiteStatusHandler(StatusHandler):
+    # the status count tables, with the columns of status_rows they count the rows by.
+    # They are kept up to date on each persist (see _update_status_counts), so none of
+    # the count functions has to scan status_rows
+    STATUS_COUNT_TABLES = {
+        "source_batch_counts": [
+            "source_batch_id",
+            "source_batch_name",
+            "status",
+            "proc_error_code",
+        ],
+        "proc_batch_counts": ["proc_batch_id", "status", "proc_error_code"],
+        "extra_info_counts": ["source_extra_info", "status"],
+    }
+
+    # the columns of status_rows, in the order of the tuples of _to_tuple
+    ROW_COLUMNS = [
+        "target_id",
+        "target_url",
+        "status",
+        "source_batch_id",
+        "source_batch_name",
+        "source_extra_info",
+        "proc_batch_id",
+        "proc_id",
+        "proc_status_msg",
+        "proc_error_code",
+        "date_created",
+        "date_modified",
+    ]
+
+    # like COUNT(proc_error_code) on status_rows: the rows without error code count as 0
+    ERROR_CODE_COUNT = "SUM(CASE WHEN proc_error_code IS NULL THEN 0 ELSE count END)"
+
     def __init__(self, config):
         super().__init__(config)
         self.DB_FILE: str = self.config["DB_FILE"]
+
+        # optional pragmas, e.g. JOURNAL_MODE: WAL, so readers don't block the writer
+        self.JOURNAL_MODE: Optional[str] = self.config.get("JOURNAL_MODE", None)
+        self.SYNCHRONOUS: Optional[str] = self.config.get("SYNCHRONOUS", None)
+        self.CACHE_SIZE: Optional[int] = self.config.get("CACHE_SIZE", None)
+        self.MMAP_SIZE: Optional[int] = self.config.get("MMAP_SIZE", None)
+
+        # read-only mode: e.g. for a dashboard/monitor running next to the TaskScheduler
+        self.READ_ONLY: bool = self.config.get("READ_ONLY", False)
+
+        # a single long-lived connection, guarded by a lock so it can be shared
+        self._conn: Optional[sqlite3.Connection] = None
+        self._conn_lock = threading.RLock()
         if self._init_database() is False:
             logger.critical(f"Could not initialize the DB: {self.DB_FILE}")
             sys.exit()
 
     def _init_database(self):
-        conn = self._create_connection(self.DB_FILE)
-        if conn is None:
+        if self._get_connection() is None:
             return False
-        with conn:
-            return self._create_table(conn, self._get_table_sql())
+        with self._conn_lock:
+            if self.READ_ONLY:
+                return self._check_schema_version(self._get_connection())
+            return self._migrate_database(self._get_connection())
         return False
 
+    def close(self):
+        with self._conn_lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
     def _validate_config(self) -> bool:
         logger.info(f"Validating {self.__class__.__name__} config")
         try:
@@ -461,12 +1076,42 @@ class SQLiteStatusHandler(StatusHandler):
             assert check_setting(
                 self.config["DB_FILE"], str
             ), "SQLiteStatusHandler.DB_FILE"
-
-            # auto create the parent dir of the db file
-            db_file_par_dir = str(Path(self.config["DB_FILE"]).parent)
-            assert (
-                auto_create_dir(db_file_par_dir) is True
-            ), f"DB_FILE: {db_file_par_dir} auto creation failed"
+            assert self.config.get("JOURNAL_MODE", None) in [
+                None,
+                "DELETE",
+                "TRUNCATE",
+                "PERSIST",
+                "MEMORY",
+                "WAL",
+                "OFF",
+            ], "SQLiteStatusHandler.JOURNAL_MODE"
+            assert self.config.get("SYNCHRONOUS", None) in [
+                None,
+                "OFF",
+                "NORMAL",
+                "FULL",
+                "EXTRA",
+            ], "SQLiteStatusHandler.SYNCHRONOUS"
+            assert check_setting(
+                self.config.get("CACHE_SIZE", None), int, True
+            ), "SQLiteStatusHandler.CACHE_SIZE"
+            assert check_setting(
+                self.config.get("MMAP_SIZE", None), int, True
+            ), "SQLiteStatusHandler.MMAP_SIZE"
+            assert check_setting(
+                self.config.get("READ_ONLY", None), bool, True
+            ), "SQLiteStatusHandler.READ_ONLY"
+
+            if self.config.get("READ_ONLY", False):
+                assert os.path.exists(
+                    self.config["DB_FILE"]
+                ), f"DB_FILE: {self.config['DB_FILE']} does not exist (READ_ONLY)"
+            else:
+                # auto create the parent dir of the db file
+                db_file_par_dir = str(Path(self.config["DB_FILE"]).parent)
+                assert (
+                    auto_create_dir(db_file_par_dir) is True
+                ), f"DB_FILE: {db_file_par_dir} auto creation failed"
         except AssertionError as e:
             logger.error(f"Configuration error: {str(e)}")
             return False
@@ -480,34 +1125,68 @@ class SQLiteStatusHandler(StatusHandler):
         if source_batch_id == -1:
             logger.info("No source batch ID found in DB, nothing to recover")
             return False
-        conn = self._create_connection(self.DB_FILE)
-        with conn:
-            db_rows = self._run_select_query(
-                conn,
-                "SELECT * FROM status_rows WHERE source_batch_id=?",
-                (source_batch_id,),
-            )
-            if db_rows:
-                logger.info("Recovered a source batch from the DB")
-                self.cur_source_batch = self._to_status_rows(db_rows)
-                return True
+        status_rows = self.get_status_rows_of_source_batch(source_batch_id)
+        if status_rows:
+            logger.info("Recovered a source batch from the DB")
+            self._load_current_source_batch(status_rows)
+            return True
         logger.info("Could not recover a source batch somehow")
         return False
 
+    # all rows are written in a single transaction: either all of them are saved or none
     def _persist(self, status_rows: List[StatusRow]) -> bool:
-        conn = self._create_connection(self.DB_FILE)
-        with conn:
-            for row in status_rows:
-                saved = self._save_status_row(conn, row) is not None
-                if not saved:
-                    return False
-            return True  # only success if all rows were saved
+        if self.READ_ONLY:
+            logger.error(f"Cannot save status rows, {self.DB_FILE} is opened read-only")
+            return False
+        row_tuples = [self._to_tuple(row) for row in status_rows]
+        try:
+            with self._connection() as conn:
+                self._save_status_rows(conn, row_tuples)
+            return True
+        except Error:  # the transaction was rolled back
+            logger.exception(f"Could not save {len(row_tuples)} status rows")
+        return False
+
+    # the rows and their cursor are written in a single transaction
+    def _persist_source_batch(self, status_rows: List[StatusRow], cursor: str) -> bool:
+        if self.READ_ONLY:
+            logger.error(f"Cannot save status rows, {self.DB_FILE} is opened read-only")
+            return False
+        row_tuples = [self._to_tuple(row) for row in status_rows]
+        try:
+            with self._connection() as conn:
+                self._save_status_rows(conn, row_tuples)
+                conn.execute(
+                    "INSERT OR REPLACE INTO source_batch_cursors(source_batch_id, cursor) "
+                    "VALUES(?,?)",
+                    (status_rows[0].source_batch_id, cursor),
+                )
+            return True
+        except Error:  # the transaction was rolled back
+            logger.exception(
+                f"Could not save the source batch of {len(row_tuples)} rows"
+            )
         return False
 
+    def get_source_batch_cursor(self, source_batch_id: int) -> Optional[str]:
+        logger.debug("Fetching the cursor of source batch %s from DB", source_batch_id)
+        try:
+            with self._connection() as conn:
+                db_rows = self._run_select_query(
+                    conn,
+                    "SELECT cursor FROM source_batch_cursors WHERE source_batch_id=?",
+                    (source_batch_id,),
+                )
+                return db_rows[0][0] if db_rows else None
+        except Error:
+            logger.exception(
+                f"Could not fetch the cursor of source batch {source_batch_id}"
+            )
+        return None
+
     def get_status_row_by_target_id(self, target_id: str) -> Optional[StatusRow]:
         logger.info("Fetching target_id from DB")
-        conn = self._create_connection(self.DB_FILE)
-        with conn:
+        with self._connection() as conn:
             db_rows = self._run_select_query(
                 conn,
                 "SELECT * FROM status_rows WHERE target_id=?",
@@ -522,8 +1201,7 @@ class SQLiteStatusHandler(StatusHandler):
         self, proc_batch_id: int
     ) -> Optional[List[StatusRow]]:
         logger.info("Fetching proc batch from DB")
-        conn = self._create_connection(self.DB_FILE)
-        with conn:
+        with self._connection() as conn:
             db_rows = self._run_select_query(
                 conn,
                 "SELECT * FROM status_rows WHERE proc_batch_id=?",
@@ -537,8 +1215,7 @@ class SQLiteStatusHandler(StatusHandler):
         self, source_batch_id: int
     ) -> Optional[List[StatusRow]]:
         logger.info("Fetching source batch from DB")
-        conn = self._create_connection(self.DB_FILE)
-        with conn:
+        with self._connection() as conn:
             db_rows = self._run_select_query(
                 conn,
                 "SELECT * FROM status_rows WHERE source_batch_id=?",
@@ -549,8 +1226,7 @@ class SQLiteStatusHandler(StatusHandler):
         return None
 
     def get_last_proc_batch_id(self) -> int:
-        conn = self._create_connection(self.DB_FILE)
-        with conn:
+        with self._connection() as conn:
             db_rows = self._run_select_query(
                 conn, "SELECT MAX(proc_batch_id) FROM status_rows", ()
             )
@@ -558,17 +1234,34 @@ class SQLiteStatusHandler(StatusHandler):
         return -1
 
     def get_last_source_batch_id(self) -> int:
-        conn = self._create_connection(self.DB_FILE)
-        with conn:
+        with self._connection() as conn:
             db_rows = self._run_select_query(
                 conn, "SELECT MAX(source_batch_id) FROM status_rows", ()
             )
             return self._get_single_int_from_db_rows(db_rows)
         return -1
 
+    # proc_batches with items somewhere between BATCH_ASSIGNED and RESULTS_FETCHED
+    def get_unfinished_proc_batch_ids(self, min_proc_batch_id: int = 0) -> List[int]:
+        with self._connection() as conn:
+            db_rows = self._run_select_query(
+                conn,
+                "SELECT DISTINCT proc_batch_id FROM status_rows WHERE status IN "
+                "(?, ?, ?, ?, ?) AND proc_batch_id >= ? ORDER BY proc_batch_id",
+                (
+                    *(
+                        status.value
+                        for status in ProcessingStatus.running_statuses()
+                        if status != ProcessingStatus.NEW
+                    ),
+                    min_proc_batch_id,
+                ),
+            )
+            return [row[0] for row in db_rows] if db_rows else []
+        return []
+
     def get_name_of_source_batch_id(self, source_batch_id: int) -> str:
-        conn = self._create_connection(self.DB_FILE)
-        with conn:
+        with self._connection() as conn:
             db_rows = self._run_select_query(
                 conn,
                 "SELECT source_batch_name FROM status_rows WHERE source_batch_id = ? "
@@ -583,11 +1276,11 @@ class SQLiteStatusHandler(StatusHandler):
         Returns:
              - a dict with the various statuses as keys, and the counts of the statuses
                 as values"""
-        conn = self._create_connection(self.DB_FILE)
-        with conn:
+        with self._connection() as conn:
             db_rows = self._run_select_query(
                 conn,
-                "SELECT status, count(status) FROM status_rows " "GROUP BY status",
+                "SELECT status, SUM(count) FROM source_batch_counts "
+                "GROUP BY status HAVING SUM(count) > 0",
                 (),
             )
             return self._get_groups_and_counts_from_db_rows(db_rows)
@@ -598,12 +1291,12 @@ class SQLiteStatusHandler(StatusHandler):
         Returns:
              - a dict with the various error codes as keys, and the counts of the error codes
                 as values"""
-        conn = self._create_connection(self.DB_FILE)
-        with conn:
+        with self._connection() as conn:
             db_rows = self._run_select_query(
                 conn,
-                "SELECT proc_error_code, count(proc_error_code) FROM status_rows "
-                "GROUP BY proc_error_code",
+                f"SELECT proc_error_code, {self.ERROR_CODE_COUNT} "
+                "FROM source_batch_counts "
+                "GROUP BY proc_error_code HAVING SUM(count) > 0",
                 (),
             )
             return self._get_groups_and_counts_from_db_rows(db_rows)
@@ -616,12 +1309,11 @@ class SQLiteStatusHandler(StatusHandler):
         Returns:
              - a dict with the various statuses as keys, and the counts of the statuses
                 as values"""
-        conn = self._create_connection(self.DB_FILE)
-        with conn:
+        with self._connection() as conn:
             db_rows = self._run_select_query(
                 conn,
-                "SELECT status, count(status) FROM status_rows WHERE proc_batch_id = ? "
-                "GROUP BY status",
+                "SELECT status, SUM(count) FROM proc_batch_counts WHERE proc_batch_id = ? "
+                "GROUP BY status HAVING SUM(count) > 0",
                 (proc_batch_id,),
             )
             return self._get_groups_and_counts_from_db_rows(db_rows)
@@ -634,13 +1326,12 @@ class SQLiteStatusHandler(StatusHandler):
         Returns:
              - a dict with the various error codes as keys, and the counts of the error codes
                 as values"""
-        conn = self._create_connection(self.DB_FILE)
-        with conn:
+        with self._connection() as conn:
             db_rows = self._run_select_query(
                 conn,
-                "SELECT proc_error_code, count(proc_error_code) FROM status_rows "
-                "WHERE proc_batch_id = ? "
-                "GROUP BY proc_error_code",
+                f"SELECT proc_error_code, {self.ERROR_CODE_COUNT} "
+                "FROM proc_batch_counts WHERE proc_batch_id = ? "
+                "GROUP BY proc_error_code HAVING SUM(count) > 0",
                 (proc_batch_id,),
             )
             return self._get_groups_and_counts_from_db_rows(db_rows)
@@ -655,12 +1346,11 @@ class SQLiteStatusHandler(StatusHandler):
         Returns:
              - a dict with the various statuses as keys, and the counts of the statuses
                 as values"""
-        conn = self._create_connection(self.DB_FILE)
-        with conn:
+        with self._connection() as conn:
             db_rows = self._run_select_query(
                 conn,
-                "SELECT status, count(status) FROM status_rows WHERE source_batch_id = ? "
-                "GROUP BY status",
+                "SELECT status, SUM(count) FROM source_batch_counts "
+                "WHERE source_batch_id = ? GROUP BY status HAVING SUM(count) > 0",
                 (source_batch_id,),
             )
             return self._get_groups_and_counts_from_db_rows(db_rows)
@@ -673,13 +1363,12 @@ class SQLiteStatusHandler(StatusHandler):
         Returns:
              - a dict with the various error codes as keys, and the counts of the error codes
                 as values"""
-        conn = self._create_connection(self.DB_FILE)
-        with conn:
+        with self._connection() as conn:
             db_rows = self._run_select_query(
                 conn,
-                "SELECT proc_error_code, count(proc_error_code) FROM status_rows "
-                "WHERE source_batch_id = ? "
-                "GROUP BY proc_error_code",
+                f"SELECT proc_error_code, {self.ERROR_CODE_COUNT} "
+                "FROM source_batch_counts WHERE source_batch_id = ? "
+                "GROUP BY proc_error_code HAVING SUM(count) > 0",
                 (source_batch_id,),
             )
             return self._get_groups_and_counts_from_db_rows(db_rows)
@@ -690,12 +1379,11 @@ class SQLiteStatusHandler(StatusHandler):
         Returns:
              - a dict with the various extra_info values as keys, with a dict as value that has
               the various statuses as keys, and the counts of the statuses within that extra_info group as values"""
-        conn = self._create_connection(self.DB_FILE)
-        with conn:
+        with self._connection() as conn:
             db_rows = self._run_select_query(
                 conn,
-                "SELECT source_extra_info, status, COUNT(status) FROM status_rows "
-                "GROUP BY source_extra_info, status",
+                "SELECT source_extra_info, status, count FROM extra_info_counts "
+                "WHERE count > 0",
                 (),
             )
             return self._get_nested_groups_and_counts_from_db_rows(db_rows)
@@ -710,39 +1398,126 @@ class SQLiteStatusHandler(StatusHandler):
             - completed_semantic_source_batch_ids - a list of the semantic_source_batch_ids for the completed batches
             - uncompleted_semantic_source_batch_ids - a list of the semantic_source_batch_ids for the
             uncompleted batches"""
-        completed_semantic_source_batch_ids = []
-        uncompleted_semantic_source_batch_ids = []
-
-        conn = self._create_connection(self.DB_FILE)
-        with conn:
+        running_statuses = [s.value for s in ProcessingStatus.running_statuses()]
+        with self._connection() as conn:
+            # per source batch: 1 if any of its rows is still running, otherwise 0
             db_rows = self._run_select_query(
                 conn,
-                "SELECT source_batch_name, GROUP_CONCAT(status) FROM status_rows "
+                "SELECT source_batch_name, "
+                f"MAX(status IN ({', '.join('?' * len(running_statuses))})) "
+                "FROM source_batch_counts "
+                "WHERE count > 0 AND source_batch_name IS NOT NULL "
                 "GROUP BY source_batch_name",
+                tuple(running_statuses),
+            )
+        if not db_rows:
+            return (None, None)
+
+        return (
+            [name for name, running in db_rows if not running],
+            [name for name, running in db_rows if running],
+        )
+
+    # all counts are taken from the status count tables (see _get_status_counts_sql) on
+    # the shared connection, so no persist can interleave
+    def get_status_snapshot(self, include_extra_info: bool = False) -> StatusSnapshot:
+        with self._connection() as conn:
+            source_batch_rows = self._run_select_query(
+                conn,
+                "SELECT source_batch_id, source_batch_name, status, proc_error_code, "
+                "count FROM source_batch_counts WHERE count > 0",
                 (),
             )
-            statuses_per_batch = self._get_groups_and_counts_from_db_rows(db_rows)
-
-        if statuses_per_batch:
-
-            for semantic_source_batch_id in statuses_per_batch:
-                if any(
-                    str(int(running_status))
-                    in str(statuses_per_batch[semantic_source_batch_id])
-                    for running_status in ProcessingStatus.running_statuses()
-                ):
-                    uncompleted_semantic_source_batch_ids.append(
-                        semantic_source_batch_id
-                    )
-                else:
-                    completed_semantic_source_batch_ids.append(semantic_source_batch_id)
+            last_proc_batch_id = self._get_single_int_from_db_rows(
+                self._run_select_query(
+                    conn,
+                    "SELECT MAX(proc_batch_id) FROM proc_batch_counts WHERE count > 0",
+                    (),
+                )
+            )
+            proc_batch_rows = self._run_select_query(
+                conn,
+                "SELECT status, proc_error_code, count FROM proc_batch_counts "
+                "WHERE proc_batch_id = ? AND count > 0",
+                (last_proc_batch_id,),
+            )
+            extra_info_counts = (
+                self.get_status_counts_per_extra_info_value()
+                if include_extra_info
+                else None
+            )
+        return self._to_status_snapshot(
+            source_batch_rows or [],
+            last_proc_batch_id,
+            proc_batch_rows or [],
+            extra_info_counts,
+        )
 
-            return (
-                completed_semantic_source_batch_ids,
-                uncompleted_semantic_source_batch_ids,
+    # aggregates the status count rows in the same way as the separate count functions
+    # do (e.g. COUNT(proc_error_code) is 0 for the NULL group)
+    def _to_status_snapshot(
+        self,
+        source_batch_rows: list,
+        last_proc_batch_id: int,
+        proc_batch_rows: list,
+        extra_info_counts: Optional[dict],
+    ) -> StatusSnapshot:
+        last_source_batch_id = max((row[0] for row in source_batch_rows), default=-1)
+        cur_source_batch_id = self.get_cur_source_batch_id()
+
+        status_counts: Dict[int, int] = {}
+        error_code_counts: Dict[Optional[int], int] = {}
+        source_batch_counts: Tuple[dict, dict] = ({}, {})
+        statuses_per_batch: Dict[Optional[str], set] = {}
+        source_batch_names: Dict[int, Optional[str]] = {}
+        for source_batch_id, name, status, error_code, count in source_batch_rows:
+            error_count = count if error_code is not None else 0
+            _add_count(status_counts, status, count)
+            _add_count(error_code_counts, error_code, error_count)
+            if source_batch_id == last_source_batch_id:
+                _add_count(source_batch_counts[0], status, count)
+                _add_count(source_batch_counts[1], error_code, error_count)
+            statuses_per_batch.setdefault(name, set()).add(status)
+            source_batch_names[source_batch_id] = name
+
+        proc_batch_counts: Tuple[dict, dict] = ({}, {})
+        for status, error_code, count in proc_batch_rows:
+            _add_count(proc_batch_counts[0], status, count)
+            _add_count(
+                proc_batch_counts[1], error_code, count if error_code is not None else 0
             )
 
-        return (None, None)
+        # like get_completed_semantic_source_batch_ids, only the named source batches
+        running_statuses = set(ProcessingStatus.running_statuses())
+        completed_batch_ids: List[str] = []
+        uncompleted_batch_ids: List[str] = []
+        for name in sorted(n for n in statuses_per_batch if n is not None):
+            if statuses_per_batch[name] & running_statuses:
+                uncompleted_batch_ids.append(name)
+            else:
+                completed_batch_ids.append(name)
+        cur_source_batch_name = source_batch_names.get(cur_source_batch_id)
+
+        return StatusSnapshot(
+            last_proc_batch_id=last_proc_batch_id,
+            last_source_batch_id=last_source_batch_id,
+            current_semantic_source_batch_id=cur_source_batch_name
+            if cur_source_batch_name is not None
+            else "-1",
+            status_counts=status_counts,
+            error_code_counts=error_code_counts,
+            status_counts_of_last_proc_batch=proc_batch_counts[0],
+            error_code_counts_of_last_proc_batch=proc_batch_counts[1],
+            status_counts_of_last_source_batch=source_batch_counts[0],
+            error_code_counts_of_last_source_batch=source_batch_counts[1],
+            completed_semantic_source_batch_ids=completed_batch_ids
+            if completed_batch_ids or uncompleted_batch_ids
+            else None,
+            uncompleted_semantic_source_batch_ids=uncompleted_batch_ids
+            if completed_batch_ids or uncompleted_batch_ids
+            else None,
+            status_counts_per_extra_info_value=extra_info_counts,
+        )
 
     def _get_single_int_from_db_rows(self, db_rows):
         if db_rows and type(db_rows) == list and len(db_rows) == 1:
@@ -793,32 +1568,116 @@ class SQLiteStatusHandler(StatusHandler):
     def _create_connection(self, db_file):
         conn = None
         try:
-            conn = sqlite3.connect(db_file)
+            # access to the connection is serialised via self._conn_lock
+            if self.READ_ONLY:
+                conn = sqlite3.connect(
+                    f"{Path(db_file).absolute().as_uri()}?mode=ro",
+                    uri=True,
+                    check_same_thread=False,
+                )
+            else:
+                conn = sqlite3.connect(db_file, check_same_thread=False)
+            self._apply_pragmas(conn)
         except Error:
             logger.exception(f"Could not connect to DB: {db_file}")
+            if conn is not None:
+                conn.close()
+                conn = None
         return conn
 
-    def _create_table(self, conn, create_table_sql) -> bool:
+    # applies the configured pragmas (the journal mode is stored in the DB file itself,
+    # so it cannot be changed in read-only mode)
+    def _apply_pragmas(self, conn):
+        pragmas = {
+            "journal_mode": None if self.READ_ONLY else self.JOURNAL_MODE,
+            "synchronous": self.SYNCHRONOUS,
+            "cache_size": self.CACHE_SIZE,
+            "mmap_size": self.MMAP_SIZE,
+        }
+        for pragma, value in pragmas.items():
+            if value is not None:
+                conn.execute(f"PRAGMA {pragma} = {value}")
+                logger.debug(
+                    "PRAGMA %s: %s",
+                    pragma,
+                    conn.execute(f"PRAGMA {pragma}").fetchone()[0],
+                )
+
+    # (re)uses the long-lived connection, so it's only opened once
+    def _get_connection(self) -> Optional[sqlite3.Connection]:
+        with self._conn_lock:
+            if self._conn is None:
+                self._conn = self._create_connection(self.DB_FILE)
+            return self._conn
+
+    # yields the shared connection within a transaction that is committed on success
+    # and rolled back on any exception
+    @contextmanager
+    def _connection(self) -> Iterator[sqlite3.Connection]:
+        with self._conn_lock:
+            conn = self._get_connection()
+            if conn is None:
+                raise Error(f"No connection to DB: {self.DB_FILE}")
+            with conn:
+                yield conn
+
+    # brings the schema up to date, by applying all migrations the DB file has not seen yet
+    # (PRAGMA user_version holds the number of migrations that were already applied)
+    def _migrate_database(self, conn) -> bool:
         try:
-            c = conn.cursor()
-            c.execute(create_table_sql)
+            schema_version = conn.execute("PRAGMA user_version").fetchone()[0]
+            migrations = self._get_migrations()
+            for version in range(schema_version, len(migrations)):
+                logger.info(f"Migrating DB schema to version {version + 1}")
+                conn.execute("BEGIN")
+                for sql in migrations[version]:
+                    conn.execute(sql)
+                conn.execute(f"PRAGMA user_version = {version + 1}")
+                conn.commit()
             return True
         except Error:
-            logger.exception("Could not create status_rows table")
+            logger.exception("Could not migrate the DB schema")
+            conn.rollback()
         return False
 
+    # in read-only mode the DB cannot be migrated, so it must already be up to date
+    def _check_schema_version(self, conn) -> bool:
+        try:
+            schema_version = conn.execute("PRAGMA user_version").fetchone()[0]
+        except Error:
+            logger.exception("Could not read the DB schema version")
+            return False
+        if schema_version < len(self._get_migrations()):
+            logger.error(
+                f"The schema of {self.DB_FILE} is outdated (version {schema_version}), "
+                "open it once without READ_ONLY to migrate it"
+            )
+            return False
+        return True
+
+    # NOTE: only ever append to this list, since each index is a schema version
+    def _get_migrations(self) -> List[List[str]]:
+        return [
+            [self._get_table_sql(date_type="text")],  # 1: the initial status_rows table
+            self._get_index_sql(),  # 2: indexes for the proc/source batch queries
+            self._get_epoch_dates_migration_sql(),  # 3: dates as seconds since epoch
+            [self._get_source_batch_cursors_table_sql()],  # 4: for streaming providers
+            self._get_status_counts_sql(),  # 5: status count tables, kept up to date
+        ]
+
     def _delete_all_rows(self):
         try:
-            conn = self._create_connection(self.DB_FILE)
-            conn.execute("DELETE FROM status_rows")
-            conn.commit()
+            with self._connection() as conn:
+                conn.execute("DELETE FROM status_rows")
+                for table in self.STATUS_COUNT_TABLES:
+                    conn.execute(f"DELETE FROM {table}")
             return True
         except Error:
             logger.exception("Could not delete all status_rows from table")
         return False
 
-    def _get_table_sql(self):
-        return """CREATE TABLE IF NOT EXISTS status_rows (
+    def _get_table_sql(self, table_name: str = "status_rows", date_type: str = "real"):
+        return f"""CREATE TABLE IF NOT EXISTS {table_name} (
             target_id text NOT NULL,
             target_url text NOT NULL,
             status integer NOT NULL,
@@ -829,16 +1688,118 @@ class SQLiteStatusHandler(StatusHandler):
             proc_id integer,
             proc_status_msg text,
             proc_error_code integer,
-            date_created text,
-            date_modified text,
+            date_created {date_type},
+            date_modified {date_type},
             PRIMARY KEY (target_id, target_url)
         );"""
 
-    def _to_sqlite_date(self, dt: datetime) -> str:
-        return dt.strftime("%Y-%m-%d %H:%M:%S.%f")[0:-3]
+    # the cursors to resume a stream after each source batch (see StreamingDataProvider)
+    def _get_source_batch_cursors_table_sql(self) -> str:
+        return """CREATE TABLE IF NOT EXISTS source_batch_cursors (
+            source_batch_id integer PRIMARY KEY,
+            cursor text NOT NULL
+        );"""
+
+    # creates & fills the status count tables. Afterwards each persist applies its
+    # changes to them, in the same transaction (see _update_status_counts)
+    def _get_status_counts_sql(self) -> List[str]:
+        sql = []
+        for table, columns in self.STATUS_COUNT_TABLES.items():
+            column_list = ", ".join(columns)
+            sql += [
+                # the columns get the same type (affinity) as those of status_rows
+                f"CREATE TABLE IF NOT EXISTS {table} AS SELECT {column_list}, "
+                f"COUNT(*) AS count FROM status_rows GROUP BY {column_list}",
+                f"CREATE INDEX IF NOT EXISTS idx_{table} ON {table} ({column_list})",
+            ]
+        return sql
+
+    # applies the difference between the stored and the new version of the rows to the
+    # status count tables. NOTE: call this before the rows are saved
+    def _update_status_counts(self, conn, row_tuples: List[tuple]):
+        new_rows = {(t[0], t[1]): t for t in row_tuples}  # the last version of each row
+        stored_rows = self._get_stored_rows(conn, new_rows)
+        deltas: Dict[str, Counter] = {}
+        for table, columns in self.STATUS_COUNT_TABLES.items():
+            get_key = itemgetter(*[self.ROW_COLUMNS.index(c) for c in columns])
+            deltas[table] = Counter(map(get_key, new_rows.values()))
+            deltas[table].subtract(map(get_key, stored_rows.values()))
+
+        for table, counter in deltas.items():
+            columns = self.STATUS_COUNT_TABLES[table]
+            # the columns may be NULL, so they are matched with IS (which uses the index)
+            match = " AND ".join(f"{c} IS ?" for c in columns)
+            for key, delta in counter.items():
+                if delta == 0:
+                    continue
+                cur = conn.execute(
+                    f"UPDATE {table} SET count = count + ? WHERE {match}",
+                    (delta,) + key,
+                )
+                if cur.rowcount == 0:
+                    conn.execute(
+                        f"INSERT INTO {table} VALUES({', '.join('?' * len(columns))}, ?)",
+                        key + (delta,),
+                    )
 
-    def _to_datetime(self, sqlite_date_string: str) -> datetime:
-        return datetime.strptime(sqlite_date_string, "%Y-%m-%d %H:%M:%S.%f")
+    # returns the stored version of the rows (by primary key), in chunks of target_ids.
+    # Only the counted columns are read, the others are NULL
+    def _get_stored_rows(self, conn, rows: Dict[Tuple[str, str], tuple]) -> dict:
+        counted_columns = {
+            c for columns in self.STATUS_COUNT_TABLES.values() for c in columns
+        }
+        select_list = ", ".join(
+            c if c in counted_columns or c in ["target_id", "target_url"] else "NULL"
+            for c in self.ROW_COLUMNS
+        )
+        stored_rows = {}
+        target_ids = list({target_id for target_id, _ in rows})
+        for i in range(0, len(target_ids), 500):
+            chunk = target_ids[i : i + 500]
+            for row in conn.execute(
+                f"SELECT {select_list} FROM status_rows WHERE target_id IN "
+                f"({', '.join('?' * len(chunk))})",
+                chunk,
+            ):
+                if (row[0], row[1]) in rows:
+                    stored_rows[(row[0], row[1])] = row
+        return stored_rows
+
+    # rebuilds status_rows with real date columns, converting the old (local time) text
+    # dates, formatted as YYYY-MM-DD HH:MM:SS.SSS, to seconds since epoch
+    def _get_epoch_dates_migration_sql(self) -> List[str]:
+        to_epoch = (
+            "CASE WHEN typeof({0}) = 'text' "
+            "THEN strftime('%s', {0}, 'utc') - strftime('%S', {0}, 'utc') "
+            "+ strftime('%f', {0}, 'utc') ELSE {0} END"
+        )
+        return [
+            self._get_table_sql(table_name="status_rows_epoch_dates"),
+            "INSERT INTO status_rows_epoch_dates SELECT "
+            "target_id, target_url, status, source_batch_id, source_batch_name, "
+            "source_extra_info, proc_batch_id, proc_id, proc_status_msg, "
+            f"proc_error_code, {to_epoch.format('date_created')}, "
+            f"{to_epoch.format('date_modified')} FROM status_rows",
+            "DROP TABLE status_rows",
+            "ALTER TABLE status_rows_epoch_dates RENAME TO status_rows",
+        ] + self._get_index_sql()
+
+    # (covering) indexes for all queries that filter or group on something else than the PK
+    def _get_index_sql(self) -> List[str]:
+        return [
+            "CREATE INDEX IF NOT EXISTS idx_status_rows_proc_batch "
+            "ON status_rows (proc_batch_id, status, proc_error_code)",
+            "CREATE INDEX IF NOT EXISTS idx_status_rows_source_batch "
+            "ON status_rows (source_batch_id, status, proc_error_code)",
+            "CREATE INDEX IF NOT EXISTS idx_status_rows_status "
+            "ON status_rows (status)",
+            "CREATE INDEX IF NOT EXISTS idx_status_rows_error_code "
+            "ON status_rows (proc_error_code)",
+            "CREATE INDEX IF NOT EXISTS idx_status_rows_source_batch_name "
+            "ON status_rows (source_batch_name, status)",
+            "CREATE INDEX IF NOT EXISTS idx_status_rows_extra_info "
+            "ON status_rows (source_extra_info, status)",
+        ]
 
     def _to_tuple(self, row: StatusRow):
         t = (
@@ -852,8 +1813,8 @@ class SQLiteStatusHandler(StatusHandler):
             row.proc_id,
             row.proc_status_msg,
             row.proc_error_code.value if row.proc_error_code is not None else None,
-            self._to_sqlite_date(row.date_created),
-            self._to_sqlite_date(row.date_modified),
+            row.date_created_ts,
+            row.date_modified_ts,
         )
         return t
 
@@ -870,16 +1831,15 @@ class SQLiteStatusHandler(StatusHandler):
                 row[7],
                 row[8],
                 ErrorCode(row[9]) if row[9] else None,
-                self._to_datetime(row[10]),
-                self._to_datetime(row[11]),
+                date_created_ts=row[10],
+                date_modified_ts=row[11],
             )
             for row in db_rows
         ]
 
-    def _save_status_row(self, conn, status_row: StatusRow):
-        row_tuple = self._to_tuple(status_row)
-        logger.info("Creating/updating status row")
-        logger.info(row_tuple)
+    # NOTE: does not commit, this is up to the caller (see _connection())
+    def _save_status_rows(self, conn, row_tuples: List[tuple]):
+        logger.info(f"Creating/updating {len(row_tuples)} status rows")
         sql = """
             INSERT OR REPLACE INTO status_rows(
                 target_id,
@@ -897,24 +1857,21 @@ class SQLiteStatusHandler(StatusHandler):
             )
             VALUES(?,?,?,?,?,?,?,?,?,?,?,?)
         """
-        try:
-            cur = conn.cursor()
-            cur.execute(sql, row_tuple)
-            conn.commit()
-            return cur.lastrowid
-        except Error:  # TODO check if this prints a meaningful sqlite3 error message
-            logger.exception("Could not save status row")
-        return None
+        self._update_status_counts(conn, row_tuples)
+        conn.executemany(sql, row_tuples)
 
     def _run_select_query(self, conn, query, params):
-        logger.info(query)
-        logger.info(params)
+        logger.debug("%s %s", query, params)
         cur = conn.cursor()
         cur.execute(query, params)
         rows = cur.fetchall()
         return rows
 
 
+def _add_count(counts: dict, key, count: int):
+    counts[key] = counts.get(key, 0) + count
+
+
 # test your StatusHandler in isolation
 if __name__ == "__main__":
 
@@ -7,6 +7,7 @@ from slack_sdk.errors import SlackApiError
 from typing import Optional
 from dane_workflows.status import (
     StatusHandler,
+    StatusSnapshot,
     ExampleStatusHandler,
     ProcessingStatus,
     ErrorCode,
@@ -50,10 +51,14 @@ class StatusMonitor(ABC):
         """Retrieves the status and error information and communicates this via the
         chosen method (implemented in _send_status())
         """
-        status_info = self._check_status()
-        satus_report = self._get_detailed_status_report(
+        # all information is taken from a single snapshot of the StatusHandler
+        snapshot = self.status_handler.get_status_snapshot(
             include_extra_info=self.config["INCLUDE_EXTRA_INFO"]
         )
+        status_info = self._check_status(snapshot)
+        satus_report = self._get_detailed_status_report(
+            include_extra_info=self.config["INCLUDE_EXTRA_INFO"], snapshot=snapshot
+        )
         formatted_status_info = self._format_status_info(status_info)
         formatted_status_report = self._format_status_report(satus_report)
         self._send_status(formatted_status_info, formatted_status_report)
@@ -77,8 +82,10 @@ class StatusMonitor(ABC):
 
         return True
 
-    def _check_status(self):
+    def _check_status(self, snapshot: Optional[StatusSnapshot] = None):
         """Collects status information about the tasks stored in the status_handler and returns it in a dict
+        Args:
+            - snapshot - the StatusSnapshot to report on (taken from the status_handler if not provided)
         Returns: dict with status information
 
         "Last batch processed:" - processing batch ID of the last batch processed
@@ -92,8 +99,10 @@ class StatusMonitor(ABC):
         retrieved from the data provider
         """
 
-        last_proc_batch_id = self.status_handler.get_last_proc_batch_id()
-        last_source_batch_id = self.status_handler.get_last_source_batch_id()
+        if snapshot is None:
+            snapshot = self.status_handler.get_status_snapshot()
+        last_proc_batch_id = snapshot.last_proc_batch_id
+        last_source_batch_id = snapshot.last_source_batch_id
 
         logger.info(f"LAST PROC BATCH {last_proc_batch_id}")
         logger.info(f"LAST SOURCE BATCH {last_source_batch_id}")
@@ -106,40 +115,35 @@ class StatusMonitor(ABC):
             # get status and error code information for last batch retrieved
             "Last src batch retrieved :information_source: Status info": {
                 f"{ProcessingStatus(status).name}": count
-                for status, count in self.status_handler.get_status_counts_for_source_batch_id(
-                    last_source_batch_id
-                ).items()
+                for status, count in snapshot.status_counts_of_last_source_batch.items()
             },
             # get status and error code information for last batch processed
             "Last batch processed :information_source: Status info": {
                 f"{ProcessingStatus(status).name}": count
-                for status, count in self.status_handler.get_status_counts_for_proc_batch_id(
-                    last_proc_batch_id
-                ).items()
+                for status, count in snapshot.status_counts_of_last_proc_batch.items()
             },
             "Last src batch retrieved :warning: Error info": {
                 (f"{ErrorCode(error_code).name}" if error_code else "N/A"): count
-                for error_code, count in self.status_handler.get_error_code_counts_for_source_batch_id(
-                    last_source_batch_id
-                ).items()
+                for error_code, count in snapshot.error_code_counts_of_last_source_batch.items()
                 if error_code
             },
             "Last batch processed :warning: Error info": (
                 {
                     f"{ErrorCode(error_code).name}" if error_code else "N/A": count
-                    for error_code, count in self.status_handler.get_error_code_counts_for_proc_batch_id(
-                        last_proc_batch_id
-                    ).items()
+                    for error_code, count in snapshot.error_code_counts_of_last_proc_batch.items()
                     if error_code
                 }
             ),
         }
 
-    def _get_detailed_status_report(self, include_extra_info):
+    def _get_detailed_status_report(
+        self, include_extra_info, snapshot: Optional[StatusSnapshot] = None
+    ):
         """Gets a detailed status report on all batches whose status is stored in the status_handler
         Args:
             - include_extra_info - if this is true, then an overview of statuses per value of the extra_info
             field in the StatusRow is returned
+            - snapshot - the StatusSnapshot to report on (taken from the status_handler if not provided)
         Returns a dict of information:
         - "Completed semantic source batch IDs" - a list of all completed semantic source batch IDs
         - "Uncompleted semantic source batch IDs" - a list of all uncompleted semantic source batch IDs
@@ -148,25 +152,21 @@ class StatusMonitor(ABC):
         - "Error overview" - a dict with the error codes and their counts over all batches
         - "Status overview per extra info" - optional, if include_extra_info is true. A dict with status overview
         per value of the extra info field"""
-        (
-            completed_batch_ids,
-            uncompleted_batch_ids,
-        ) = self.status_handler.get_completed_semantic_source_batch_ids()
+        if snapshot is None:
+            snapshot = self.status_handler.get_status_snapshot(include_extra_info)
 
         status_report = {
-            "Completed semantic source batch IDs": completed_batch_ids,
-            "Uncompleted semantic source batch IDs": uncompleted_batch_ids,
-            "Current semantic source batch ID": self.status_handler.get_name_of_source_batch_id(
-                self.status_handler.get_cur_source_batch_id()
-            ),
-            "Status overview": self.status_handler.get_status_counts(),
-            "Error overview": self.status_handler.get_error_code_counts(),
+            "Completed semantic source batch IDs": snapshot.completed_semantic_source_batch_ids,
+            "Uncompleted semantic source batch IDs": snapshot.uncompleted_semantic_source_batch_ids,
+            "Current semantic source batch ID": snapshot.current_semantic_source_batch_id,
+            "Status overview": snapshot.status_counts,
+            "Error overview": snapshot.error_code_counts,
         }
 
         if include_extra_info:
             status_report[
                 "Status overview per extra info"
-            ] = self.status_handler.get_status_counts_per_extra_info_value()
+            ] = snapshot.status_counts_per_extra_info_value
 
         return status_report
 
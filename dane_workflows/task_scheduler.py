@@ -1,10 +1,12 @@
 import sys
 import logging
-from typing import List, Type, Tuple, Optional
+from concurrent.futures import Future, ThreadPoolExecutor, FIRST_COMPLETED, wait
+from typing import Callable, Dict, List, Type, Tuple, Optional
 from dane_workflows.util import base_util
 from dane_workflows.data_provider import DataProvider, ProcessingStatus
 from dane_workflows.data_processing import DataProcessingEnvironment, ProcessingResult
 from dane_workflows.exporter import Exporter
+from dane_workflows.metrics import Metrics, get_metrics, set_metrics
 from dane_workflows.status import StatusHandler, StatusRow
 from dane_workflows.status_monitor import StatusMonitor
 
@@ -16,6 +18,7 @@ The TaskScheduler is the main process that interprets & runs a workflow comprise
 - implementation of an Exporter
 - implementation of a StatusHandler
 - Optional: implementation of a StatusMonitor
+- Optional: implementation of Metrics
 
 The constructor takes a config and a class type for each of the aforementioned components
 to be able to instantiate the correct implementions. The config should make sure to provide
@@ -36,6 +39,7 @@ class TaskScheduler(object):
         exporter: Type[Exporter],
         status_monitor: Optional[Type[StatusMonitor]] = None,
         unit_test: bool = False,
+        metrics: Optional[Type[Metrics]] = None,
     ):
         self.config = config
 
@@ -59,6 +63,18 @@ class TaskScheduler(object):
             else -1
         )  # optional monitoring frequency
 
+        # export the results in chunks of this size, instead of all at once
+        self.EXPORT_CHUNK_SIZE = config["TASK_SCHEDULER"].get("EXPORT_CHUNK_SIZE", -1)
+
+        # number of proc_batches that may be processed (in different stages) at once
+        self.MAX_IN_FLIGHT_BATCHES = config["TASK_SCHEDULER"].get(
+            "MAX_IN_FLIGHT_BATCHES", 1
+        )
+
+        # optionally record metrics throughout the workflow (before anything is measured)
+        if metrics:
+            set_metrics(metrics(config))
+
         # first initialize the status handler and pass it to the data provider and processing env
         self.status_handler: StatusHandler = status_handler(config)
         self.data_provider = data_provider(
@@ -95,6 +111,17 @@ class TaskScheduler(object):
                 assert base_util.check_setting(
                     self.config["TASK_SCHEDULER"]["MONITOR_FREQ"], int
                 ), "TASK_SCHEDULER.MONITOR_FREQ"
+            if "EXPORT_CHUNK_SIZE" in self.config["TASK_SCHEDULER"]:
+                assert base_util.check_setting(
+                    self.config["TASK_SCHEDULER"]["EXPORT_CHUNK_SIZE"], int
+                ), "TASK_SCHEDULER.EXPORT_CHUNK_SIZE"
+            if "MAX_IN_FLIGHT_BATCHES" in self.config["TASK_SCHEDULER"]:
+                assert (
+                    base_util.check_setting(
+                        self.config["TASK_SCHEDULER"]["MAX_IN_FLIGHT_BATCHES"], int
+                    )
+                    and self.config["TASK_SCHEDULER"]["MAX_IN_FLIGHT_BATCHES"] > 0
+                ), "TASK_SCHEDULER.MAX_IN_FLIGHT_BATCHES"
         except AssertionError as e:
             logger.error(f"Configuration error: {str(e)}")
             return False
@@ -103,11 +130,15 @@ class TaskScheduler(object):
 
     # Calls the StatusHandler to load the status_handler.cur_source_batch into memory.
     #
-    # Subsequently the StatusHandler is called to recover the last proc_batch.
+    # Subsequently the StatusHandler is called to recover the unfinished proc_batches
+    # (more than one in case MAX_IN_FLIGHT_BATCHES > 1).
+    #
+    # Based on the last ProcessingStatus in each proc_batch the number of steps to skip
+    # within _run_proc_batch() is determined to resume processing from.
     #
-    # Based on the last ProcessingStatus in this proc_batch the number of steps to skip
-    # within _run_proc_batch() is determined to resume processing from
-    def _recover(self) -> Tuple[Optional[List[StatusRow]], int, int]:
+    # Returns the (status_rows, proc_batch_id, skip_steps) of each proc_batch to finish
+    # and the proc_batch_id to continue with afterwards
+    def _recover(self) -> Tuple[List[Tuple[List[StatusRow], int, int]], int]:
         source_batch_recovered, last_proc_batch = self.status_handler.recover(
             self.data_provider
         )
@@ -117,71 +148,103 @@ class TaskScheduler(object):
             )
             sys.exit()
 
-        last_proc_batch_id = 0
-        skip_steps = 0
-
-        if last_proc_batch:
-            last_proc_batch_id = self.status_handler.get_last_proc_batch_id()
-            logger.info("Synchronizing last proc_batch with ProcessingEnvironment")
-
-            # determine where to resume processing by looking at the highest step in the chain
-            # TODO maybe it's better to use the LOWEST step of the batch
-            highest_proc_stat = 0
-            num_errors_in_last_proc_batch = 0
-            for row in last_proc_batch:
-                if row.status == ProcessingStatus.ERROR:  # skip errors
-                    num_errors_in_last_proc_batch += 1
-                    continue
-                if row.status.value > highest_proc_stat:
-                    highest_proc_stat = row.status.value
-
-            # ALL items of the last proc_batch failed
-            if num_errors_in_last_proc_batch == len(last_proc_batch):
+        if not last_proc_batch:
+            return [], 0
+
+        last_proc_batch_id = self.status_handler.get_last_proc_batch_id()
+        logger.info("Synchronizing unfinished proc_batches with ProcessingEnvironment")
+
+        # only the last MAX_IN_FLIGHT_BATCHES proc_batches (i.e. the last one when running
+        # sequentially) can still be in flight. Older ones may still have rows without a
+        # result (e.g. PROCESSED), but were already exported as far as possible
+        unfinished_proc_batches = []
+        for proc_batch_id in self.status_handler.get_unfinished_proc_batch_ids(
+            last_proc_batch_id - self.MAX_IN_FLIGHT_BATCHES + 1
+        ):
+            proc_batch = (
+                last_proc_batch
+                if proc_batch_id == last_proc_batch_id
+                else self.status_handler.get_status_rows_of_proc_batch(proc_batch_id)
+            )
+            if not proc_batch:
+                continue
+
+            skip_steps = self._get_skip_steps(proc_batch)
+            if skip_steps is None:  # ALL items of the proc_batch failed
                 logger.warning(
-                    "The last proc_batch failed completely, starting at the next batch"
-                )
-                return (
-                    None,
-                    last_proc_batch_id + 1,  # continue on from the NEXT proc_batch
-                    0,
+                    f"proc_batch {proc_batch_id} failed completely, not recovering it"
                 )
+                continue
+            unfinished_proc_batches.append((proc_batch, proc_batch_id, skip_steps))
+
+        # continue on from the NEXT proc_batch
+        return unfinished_proc_batches, last_proc_batch_id + 1
+
+    # determine where to resume processing by looking at the highest step in the chain.
+    # Returns None if all items in the proc_batch failed
+    def _get_skip_steps(self, proc_batch: List[StatusRow]) -> Optional[int]:
+        # TODO maybe it's better to use the LOWEST step of the batch
+        highest_proc_stat = 0
+        num_errors_in_proc_batch = 0
+        num_finished_in_proc_batch = 0
+        for row in proc_batch:
+            if row.status == ProcessingStatus.ERROR:  # skip errors
+                num_errors_in_proc_batch += 1
+                continue
+            if row.status == ProcessingStatus.FINISHED:  # e.g. partially exported
+                num_finished_in_proc_batch += 1
+                continue
+            if row.status.value > highest_proc_stat:
+                highest_proc_stat = row.status.value
+
+        if num_errors_in_proc_batch == len(proc_batch):
+            return None
 
-            # ProcessingStatus values are ordered, so we can simply subtract to find the steps to skip
-            skip_steps = highest_proc_stat - 2
+        if num_errors_in_proc_batch + num_finished_in_proc_batch == len(proc_batch):
+            highest_proc_stat = ProcessingStatus.FINISHED.value
 
-        return last_proc_batch, last_proc_batch_id, skip_steps
+        # ProcessingStatus values are ordered, so we can simply subtract to find the steps to skip
+        return highest_proc_stat - 2
 
     # Before starting the endless loop of processing everything the DataProvider has to offer,
     # _recover() is called to make sure:
     #
     # 1. The StatusHandler has loaded cur_source_batch in memory
-    # 2. The last proc_batch is retrieved (representing the batch last fed to the ProcessingEnvironment)
-    # 3. The last successful step within this batch is retrieved we know how many steps to
+    # 2. The unfinished proc_batches are retrieved (representing the batches last fed to
+    #    the ProcessingEnvironment)
+    # 3. The last successful step within these batches is retrieved we know how many steps to
     #    skip within _run_proc_batch()
     def run(self):
+        try:
+            self._run()
+        finally:
+            self.data_provider.close()  # e.g. stops prefetching source batches
 
+    def _run(self):
         # always try to recover (without StatusHandler data, the first source_batch will be created)
-        last_proc_batch, last_proc_batch_id, skip_steps = self._recover()
+        unfinished_proc_batches, proc_batch_id = self._recover()
+
+        # with multiple in-flight batches, the recovered ones are simply put in the pipeline
+        if self.MAX_IN_FLIGHT_BATCHES > 1:
+            self._run_in_flight_batches(unfinished_proc_batches, proc_batch_id)
+            return
 
         # if a proc_batch was recovered, make sure to finish it from the last ProcessingStatus
-        if last_proc_batch:
-            logger.info(f"Recovered proc_batch {last_proc_batch_id}, finishing it up")
+        for proc_batch, recovered_proc_batch_id, skip_steps in unfinished_proc_batches:
+            logger.info(
+                f"Recovered proc_batch {recovered_proc_batch_id}, finishing it up"
+            )
 
             # before doing the "recovery run", check if the batch limit was reached
-            self._check_batch_limit(last_proc_batch_id)
+            self._check_batch_limit(recovered_proc_batch_id)
 
             # run the recovered proc_batch from the highest ProcessingStatus
             if (
-                self._run_proc_batch(last_proc_batch, last_proc_batch_id, skip_steps)
-                is True
+                self._run_proc_batch(proc_batch, recovered_proc_batch_id, skip_steps)
+                is False
             ):
-                last_proc_batch_id += 1  # continue on
-            else:
                 logger.critical("Critical error whilst processing, quitting")
 
-        # ok now that the recovered proc_batch has completed, continue on from this proc_batch_id
-        proc_batch_id = last_proc_batch_id
-
         # continue until all is finished or something breaks
         while True:
             # first check if the BATCH_LIMIT was reached
@@ -203,13 +266,103 @@ class TaskScheduler(object):
             proc_batch_id += 1
 
             # optionally, monitor the status
-            if self.status_monitor:
+            self._monitor_status(proc_batch_id)
+
+    # Keeps up to MAX_IN_FLIGHT_BATCHES proc_batches running in worker threads, so the
+    # ProcessingEnvironment can already process the next batch, while the previous one
+    # is being monitored or exported. New proc_batches are only obtained (and assigned)
+    # by this (main) thread, each worker persists the status of its own proc_batch
+    def _run_in_flight_batches(
+        self,
+        unfinished_proc_batches: List[Tuple[List[StatusRow], int, int]],
+        proc_batch_id: int,
+    ):
+        logger.info(
+            f"Running up to {self.MAX_IN_FLIGHT_BATCHES} proc_batches at the same time"
+        )
+        in_flight: Dict[Future, int] = {}
+        with ThreadPoolExecutor(
+            max_workers=self.MAX_IN_FLIGHT_BATCHES, thread_name_prefix="proc_batch"
+        ) as executor:
+            for (
+                proc_batch,
+                recovered_proc_batch_id,
+                skip_steps,
+            ) in unfinished_proc_batches:
                 logger.info(
-                    f"check wether or not to monitor to slack: proc_batch_id: {proc_batch_id}, monitor_freq:{self.MONITOR_FREQ}, monitor: {proc_batch_id % self.MONITOR_FREQ}"
+                    f"Recovered proc_batch {recovered_proc_batch_id}, finishing it up"
                 )
-                if proc_batch_id % self.MONITOR_FREQ == 0:
-                    logger.info("monitoring_status")
-                    self.status_monitor.monitor_status()
+                self._check_batch_limit(recovered_proc_batch_id)
+                future = executor.submit(
+                    self._run_proc_batch,
+                    proc_batch,
+                    recovered_proc_batch_id,
+                    skip_steps,
+                )
+                in_flight[future] = recovered_proc_batch_id
+
+            source_exhausted = False
+            failed = False
+            while True:
+                # keep the pipeline filled with new proc_batches
+                while (
+                    not source_exhausted
+                    and not failed
+                    and len(in_flight) < self.MAX_IN_FLIGHT_BATCHES
+                ):
+                    # sys.exit() still waits for the in-flight batches to finish
+                    self._check_batch_limit(proc_batch_id)
+
+                    status_rows = self._get_next_proc_batch(
+                        proc_batch_id, self.BATCH_SIZE
+                    )
+                    if status_rows is None:
+                        logger.info("No source_batch remaining")
+                        source_exhausted = True
+                        break
+
+                    future = executor.submit(
+                        self._run_proc_batch, status_rows, proc_batch_id
+                    )
+                    in_flight[future] = proc_batch_id
+                    proc_batch_id += 1
+
+                if len(in_flight) == 0:
+                    logger.info("All in-flight proc_batches are done, quitting...")
+                    break
+
+                done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in done:
+                    finished_proc_batch_id = in_flight.pop(future)
+                    if future.result() is False:
+                        logger.critical(
+                            f"Critical error whilst processing proc_batch {finished_proc_batch_id}, finishing the in-flight proc_batches and quitting"
+                        )
+                        failed = True
+                        continue
+
+                    # optionally, monitor the status
+                    self._monitor_status(finished_proc_batch_id + 1)
+
+    # calls the StatusMonitor after each MONITOR_FREQ proc_batches
+    def _monitor_status(self, proc_batch_id: int):
+        self._record_status_metrics()
+        if self.status_monitor:
+            logger.info(
+                f"check wether or not to monitor to slack: proc_batch_id: {proc_batch_id}, monitor_freq:{self.MONITOR_FREQ}, monitor: {proc_batch_id % self.MONITOR_FREQ}"
+            )
+            if proc_batch_id % self.MONITOR_FREQ == 0:
+                logger.info("monitoring_status")
+                self.status_monitor.monitor_status()
+
+    # records the number of items per ProcessingStatus (only if metrics are enabled)
+    def _record_status_metrics(self):
+        metrics = get_metrics()
+        if not metrics.enabled:
+            return
+        for status, count in (self.status_handler.get_status_counts() or {}).items():
+            metrics.set_gauge("items", count, {"status": ProcessingStatus(status).name})
+        metrics.flush()
 
     # asks the DataProvider for a new proc_batch
     def _get_next_proc_batch(
@@ -255,15 +408,17 @@ class TaskScheduler(object):
             return True
 
         if skip_steps == 0:  # first register the batch in the proc env
-            if not self._register_proc_batch(proc_batch_id, status_rows):
+            if not self._run_step(
+                "register", self._register_proc_batch, proc_batch_id, status_rows
+            ):
                 return False
 
         if skip_steps < 2:  # Alright let's ask the proc env to start processing
-            if not self._process_proc_batch(proc_batch_id):
+            if not self._run_step("process", self._process_proc_batch, proc_batch_id):
                 return False
 
         if skip_steps < 3:  # monitor the processing, until it returns the results
-            if not self._monitor_proc_batch(proc_batch_id):
+            if not self._run_step("monitor", self._monitor_proc_batch, proc_batch_id):
                 return False
 
         if skip_steps < 5:
@@ -272,16 +427,36 @@ class TaskScheduler(object):
 
             # now fetch the results from the ProcessingEnvironment
             # even if this was already done, it's required again for the unfinished export
+            return self._fetch_and_export_proc_batch_output(proc_batch_id)
+
+        return True
+
+    # fetches & exports the results all at once or, with EXPORT_CHUNK_SIZE, chunk by chunk
+    def _fetch_and_export_proc_batch_output(self, proc_batch_id: int) -> bool:
+        if self.EXPORT_CHUNK_SIZE > 0:  # fetching & exporting are interleaved
+            return self._run_step(
+                "fetch_and_export", self._export_proc_batch_output_stream, proc_batch_id
+            )
+
+        with get_metrics().timer("step_duration", {"step": "fetch"}):
             processing_results = self._fetch_proc_batch_output(proc_batch_id)
 
-            if processing_results and self._export_proc_batch_output(
-                proc_batch_id, processing_results
-            ):
-                return True
-            else:
-                return False
+        if processing_results and self._run_step(
+            "export", self._export_proc_batch_output, proc_batch_id, processing_results
+        ):
+            return True
+        else:
+            return False
 
-        return True
+    # runs a step of _run_proc_batch, recording its duration & outcome in the metrics
+    def _run_step(self, step: str, step_func: Callable[..., bool], *args) -> bool:
+        metrics = get_metrics()
+        with metrics.timer("step_duration", {"step": step}):
+            success = step_func(*args)
+        metrics.increment(
+            "steps", labels={"step": step, "success": str(success).lower()}
+        )
+        return success
 
     # calls the ProcessingEnvironment to register the supplied proc_batch
     def _register_proc_batch(
@@ -347,6 +522,21 @@ class TaskScheduler(object):
         logger.info(f"Successfully exported proc_batch {proc_batch_id} output")
         return True
 
+    # lets the Exporter consume the processing output while it is being fetched
+    def _export_proc_batch_output_stream(self, proc_batch_id: int) -> bool:
+        logger.info(
+            f"Exporting proc_batch output in chunks of {self.EXPORT_CHUNK_SIZE}: {proc_batch_id}"
+        )
+        chunks = self.data_processing_env.fetch_results_of_batch_stream(
+            proc_batch_id, self.EXPORT_CHUNK_SIZE
+        )
+        if not self.exporter.export_results_stream(chunks):
+            logger.warning(f"Could not export proc_batch {proc_batch_id} output")
+            return False
+
+        logger.info(f"Successfully exported proc_batch {proc_batch_id} output")
+        return True
+
     """ ------------ FUNCTIONS TO TRIGGER PARTS OF THE WORKFLOW (WITHOUT KEEPING STATUS) -------------- """
 
     # use this to fetch a single processing result of a known target_id
@@ -372,10 +562,4 @@ class TaskScheduler(object):
 
     # use this to export a certain proc_batch (that already has been processed)
     def trigger_export_proc_batch_id(self, proc_batch_id: int) -> bool:
-        processing_results = self._fetch_proc_batch_output(proc_batch_id)
-        if processing_results and self._export_proc_batch_output(
-            proc_batch_id, processing_results
-        ):
-            return True
-        else:
-            return False
+        return self._fetch_and_export_proc_batch_output(proc_batch_id)
@@ -1,4 +1,5 @@
 import logging
+from typing import List, Optional
 
 
 logger = logging.getLogger(__name__)
@@ -71,8 +72,13 @@ def result_of_target_id_query(target_id: str, dane_task_id: str):
 
 
 # query for fetching all tasks for documents with a certain creator.id (used to record batches)
+# optionally only the tasks updated since a certain time (updated_at) are fetched
 def tasks_of_batch_query(
-    proc_batch_name: str, offset: int, size: int, dane_task_id: str, base_query=True
+    proc_batch_name: str,
+    size: int,
+    dane_task_id: str,
+    base_query=True,
+    updated_since: Optional[str] = None,
 ) -> dict:
     logger.debug("Generating tasks_of_batch_query")
     match_creator_query = {
@@ -87,7 +93,7 @@ def tasks_of_batch_query(
             ]
         }
     }
-    tasks_query = {
+    tasks_query: dict = {
         "bool": {
             "must": [
                 {
@@ -105,28 +111,112 @@ def tasks_of_batch_query(
             ]
         }
     }
+    if updated_since:
+        tasks_query["bool"]["must"].append(
+            {"range": {"updated_at": {"gte": updated_since}}}
+        )
     if base_query:
         query: dict = {}
         query["_source"] = ["task", "created_at", "updated_at", "role"]
-        query["from"] = offset
         query["size"] = size
+        query["sort"] = ["_doc"]  # cheapest order to scroll through
         query["query"] = tasks_query
         return query
     return tasks_query
 
 
+# query for fetching all tasks, but the leaf task, of a list of documents at once
+def tasks_of_documents_query(
+    doc_ids: List[str], size: int, leaf_task_to_omit: Optional[str]
+) -> dict:
+    logger.debug("Generating tasks_of_documents_query")
+    tasks_query: dict = {
+        "bool": {
+            "must": [
+                {
+                    "has_parent": {
+                        "parent_type": "document",
+                        "query": {"ids": {"values": doc_ids}},
+                    }
+                }
+            ]
+        }
+    }
+    if leaf_task_to_omit:
+        tasks_query["bool"]["must_not"] = [
+            {
+                "query_string": {
+                    "default_field": "task.key",
+                    "query": leaf_task_to_omit,
+                }
+            }
+        ]
+    return {
+        "_source": ["task", "created_at", "updated_at", "role"],
+        "size": size,
+        "sort": ["_doc"],  # cheapest order to scroll through
+        "query": tasks_query,
+    }
+
+
+# query for counting the tasks of a batch per task.state (without returning any tasks)
+def task_states_of_batch_query(proc_batch_name: str, dane_task_id: str) -> dict:
+    logger.debug("Generating task_states_of_batch_query")
+    return {
+        "size": 0,
+        "query": tasks_of_batch_query(proc_batch_name, 0, dane_task_id, False),
+        "aggs": {"task_states": {"terms": {"field": "task.state", "size": 100}}},
+    }
+
+
+# query for counting the tasks of several batches per batch (creator.id) and task.state
+def task_states_of_batches_query(
+    proc_batch_names: List[str], dane_task_id: str
+) -> dict:
+    logger.debug("Generating task_states_of_batches_query")
+    return {
+        "size": 0,
+        "query": {
+            "terms": {"creator.id": proc_batch_names}
+        },  # documents of the batches
+        "aggs": {
+            "batches": {
+                "terms": {"field": "creator.id", "size": len(proc_batch_names)},
+                "aggs": {
+                    "tasks": {
+                        "children": {"type": "task"},
+                        "aggs": {
+                            "dane_task": {
+                                "filter": {
+                                    "query_string": {
+                                        "default_field": "task.key",
+                                        "query": dane_task_id,
+                                    }
+                                },
+                                "aggs": {
+                                    "task_states": {
+                                        "terms": {"field": "task.state", "size": 100}
+                                    }
+                                },
+                            }
+                        },
+                    }
+                },
+            }
+        },
+    }
+
+
 # query for fetching all results for documents with a certain creator.id (used to record batches)
 # FIXME: in case the underlying tasks mentioned: "task already assigned", the results will
 # NOT be found this way
-def results_of_batch_query(
-    proc_batch_name: str, offset: int, size: int, dane_task_id: str
-):
+def results_of_batch_query(proc_batch_name: str, size: int, dane_task_id: str):
     logger.debug("Generating results_of_batch_query")
-    sub_query = tasks_of_batch_query(proc_batch_name, offset, size, dane_task_id, False)
+    sub_query = tasks_of_batch_query(proc_batch_name, size, dane_task_id, False)
     return {
         "_source": ["result", "created_at", "updated_at", "role"],
-        "from": offset,
         "size": size,
+        "sort": ["_doc"],
         "query": {
             "bool": {
                 "must": [
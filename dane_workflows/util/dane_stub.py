@@ -0,0 +1,614 @@
+import re
+import json
+import hashlib
+import logging
+import random
+import threading
+from argparse import ArgumentParser
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from time import time
+from typing import Any, Dict, List, Optional, Set, Tuple
+from urllib.parse import parse_qs, urlparse
+
+
+logger = logging.getLogger(__name__)
+
+
+"""
+In-process stand-in for a DANE server and its Elasticsearch index, so the DANEEnvironment
+(and therefore the TaskScheduler) can be tested and benchmarked without any DANE setup.
+
+A single HTTP server handles:
+- the DANE API calls of the DANEHandler: /DANE/documents/, /DANE/task/ and
+  /DANE/document/<id>/tasks
+- the ES calls of the DANEHandler: ping, search (incl. scroll) and the query shapes
+  generated by dane_query_util (bool, has_parent, parent_id, ids, query_string, terms,
+  range, exists) plus the terms/filter/children aggregations
+
+Tasks are simulated: a task without dependencies is QUEUED for task_latency seconds and
+then either succeeds (creating a result) or fails (with probability failure_rate). Tasks
+with dependencies (e.g. {"ASR": ["DOWNLOAD"]}) remain UNFINISHED_DEPENDENCY until all
+their dependencies succeeded, just like in DANE.
+
+Usage (e.g. in a unit test):
+
+    with DANEStub(task_latency=0.1, dependencies={"ASR": ["DOWNLOAD"]}) as stub:
+        config["PROC_ENV"]["CONFIG"].update(stub.get_config())
+        ...
+
+Or as a standalone server: python -m dane_workflows.util.dane_stub --port 5500
+"""
+
+TASK_MESSAGES = {
+    102: "Task queued",
+    200: "Success",
+    412: "Unfinished dependencies",
+    500: "Simulated failure",
+}
+
+
+# the simulation state of a task, which is not visible via the API or index
+@dataclass
+class _TaskSimulation:
+    dependencies: List[str] = field(default_factory=list)  # task IDs
+    due_at: Optional[float] = None  # when the (queued) task will be done
+    will_fail: bool = False
+
+
+class DANEStubError(Exception):
+    def __init__(self, status_code: int, message: str):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+class DANEStub:
+    def __init__(
+        self,
+        task_latency: float = 0.0,
+        failure_rate: float = 0.0,
+        dependencies: Optional[Dict[str, List[str]]] = None,
+        host: str = "127.0.0.1",
+        port: int = 0,  # any free port
+        seed: Optional[int] = None,
+    ):
+        self.task_latency = task_latency
+        self.failure_rate = failure_rate
+        self.dependencies = dependencies if dependencies else {}
+        self._random = random.Random(seed)
+        self._lock = threading.RLock()
+
+        # the ES index: the _source of all documents, tasks & results by _id (in order)
+        self._index: Dict[str, dict] = {}
+        self._simulations: Dict[str, _TaskSimulation] = {}
+        self._unfinished_tasks: Set[str] = set()
+        self._scrolls: Dict[str, Tuple[List[dict], int, int]] = {}  # hits,offset,size
+        self._scroll_count = 0
+
+        self._server = ThreadingHTTPServer((host, port), _StubRequestHandler)
+        self._server.stub = self  # type: ignore
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def host(self) -> str:
+        return str(self._server.server_address[0])
+
+    @property
+    def port(self) -> int:
+        return self._server.server_address[1]
+
+    # the DANEEnvironment settings required to talk to this stub
+    def get_config(self) -> dict:
+        return {
+            "DANE_HOST": f"{self.host}:{self.port}",
+            "DANE_SERVER_PROTOCOL": "http",
+            "DANE_ES_HOST": self.host,
+            "DANE_ES_PORT": self.port,
+            "DANE_ES_SCHEME": "http",
+        }
+
+    def start(self):
+        logger.info(f"Starting DANE stub on {self.host}:{self.port}")
+        self._thread = threading.Thread(
+            target=self._server.serve_forever, name="DANEStub", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self):
+        logger.info("Stopping DANE stub")
+        self._server.shutdown()
+        self._server.server_close()
+        if self._thread:
+            self._thread.join()
+            self._thread = None
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
+
+    """
+    ------------------------------- SIMULATION ---------------------------
+    """
+
+    # moves the simulated tasks forward to the current time
+    def _advance(self, now: float):
+        changed = True
+        while changed:  # a finished task may unblock the tasks depending on it
+            changed = False
+            for task_id in list(self._unfinished_tasks):
+                task = self._index[task_id]
+                simulation = self._simulations[task_id]
+                if task["task"]["state"] == 412:
+                    changed |= self._start_when_dependencies_met(task_id, simulation)
+                elif simulation.due_at is not None and now >= simulation.due_at:
+                    self._finish_task(task_id, simulation)
+                    changed = True
+
+    def _start_when_dependencies_met(
+        self, task_id: str, simulation: _TaskSimulation
+    ) -> bool:
+        dependencies = [self._index[dep_id] for dep_id in simulation.dependencies]
+        if any(dep["task"]["state"] != 200 for dep in dependencies):
+            return False  # failed dependencies block the task forever (like in DANE)
+        started_at = max(
+            self._simulations[dep_id].due_at or 0.0
+            for dep_id in simulation.dependencies
+        )
+        simulation.due_at = started_at + self.task_latency
+        self._set_task_state(task_id, 102, started_at)
+        return True
+
+    def _finish_task(self, task_id: str, simulation: _TaskSimulation):
+        if simulation.will_fail:
+            self._set_task_state(task_id, 500, simulation.due_at)
+        else:
+            self._set_task_state(task_id, 200, simulation.due_at)
+            self._add_result(task_id)
+        self._unfinished_tasks.discard(task_id)
+
+    def _set_task_state(self, task_id: str, state: int, timestamp: Optional[float]):
+        task = self._index[task_id]
+        task["task"]["state"] = state
+        task["task"]["msg"] = TASK_MESSAGES[state]
+        task["updated_at"] = _to_iso(timestamp if timestamp is not None else time())
+
+    def _add_result(self, task_id: str):
+        task = self._index[task_id]
+        self._index[_generate_id(task_id, "result")] = {
+            "result": {
+                "generator": {
+                    "id": f"stub_{task['task']['key'].lower()}",
+                    "name": task["task"]["key"],
+                    "homepage": "http://localhost",
+                    "type": "Software",
+                },
+                "payload": {
+                    "doc_id": task["role"]["parent"],
+                    "task_id": task_id,
+                },
+            },
+            "created_at": task["updated_at"],
+            "updated_at": task["updated_at"],
+            "role": {"name": "result", "parent": task_id},
+        }
+
+    """
+    ------------------------------- DANE API ---------------------------
+    """
+
+    def register_documents(self, docs: List) -> dict:
+        now = _to_iso(time())
+        response: dict = {"success": [], "failed": []}
+        with self._lock:
+            for doc in docs:
+                doc = json.loads(doc) if isinstance(doc, str) else doc
+                doc_id = _generate_id(doc["target"]["id"], doc["creator"]["id"])
+                if doc_id in self._index:
+                    response["failed"].append(
+                        {
+                            "document": self._to_api_document(doc_id),
+                            "error": f"Document with id `{doc_id}` already exists",
+                        }
+                    )
+                    continue
+                self._index[doc_id] = {
+                    "target": doc["target"],
+                    "creator": doc["creator"],
+                    "created_at": now,
+                    "updated_at": now,
+                    "role": {"name": "document"},
+                }
+                response["success"].append(self._to_api_document(doc_id))
+        return response
+
+    def assign_task(self, assignment: dict) -> dict:
+        doc_ids = assignment["document_id"]
+        doc_ids = doc_ids if isinstance(doc_ids, list) else [doc_ids]
+        response: dict = {"success": [], "failed": []}
+        with self._lock:
+            for doc_id in doc_ids:
+                if doc_id not in self._index:
+                    response["failed"].append(
+                        {
+                            "document_id": doc_id,
+                            "error": f"[404] 'No document with id `{doc_id}` found'",
+                        }
+                    )
+                elif _generate_id(doc_id, assignment["key"]) in self._index:
+                    response["failed"].append(
+                        {
+                            "document_id": doc_id,
+                            "error": f"Task `{assignment['key']}` already assigned to document `{doc_id}`",
+                        }
+                    )
+                else:
+                    task_id = self._create_task(doc_id, assignment["key"], time())
+                    response["success"].append(
+                        {"document_id": doc_id, "task_id": task_id}
+                    )
+        return response
+
+    # creates the task, and the tasks it depends on (if not there yet)
+    def _create_task(self, doc_id: str, key: str, now: float) -> str:
+        task_id = _generate_id(doc_id, key)
+        if task_id in self._index:
+            return task_id
+        simulation = _TaskSimulation(
+            [
+                self._create_task(doc_id, dep, now)
+                for dep in self.dependencies.get(key, [])
+            ],
+            None,
+            self._random.random() < self.failure_rate,
+        )
+        state = 412 if simulation.dependencies else 102
+        if state == 102:
+            simulation.due_at = now + self.task_latency
+        self._index[task_id] = {
+            "task": {
+                "key": key,
+                "state": state,
+                "msg": TASK_MESSAGES[state],
+                "priority": 1,
+                "args": {"*": None},
+            },
+            "created_at": _to_iso(now),
+            "updated_at": _to_iso(now),
+            "role": {"name": "task", "parent": doc_id},
+        }
+        self._simulations[task_id] = simulation
+        self._unfinished_tasks.add(task_id)
+        return task_id
+
+    def get_tasks_of_document(self, doc_id: str) -> List[dict]:
+        with self._lock:
+            if doc_id not in self._index:
+                raise DANEStubError(404, f"No document with id `{doc_id}` found")
+            self._advance(time())
+            return [
+                {
+                    "_id": _id,
+                    "key": source["task"]["key"],
+                    "state": str(source["task"]["state"]),
+                    "msg": source["task"]["msg"],
+                    "priority": source["task"]["priority"],
+                    "created_at": source["created_at"],
+                    "updated_at": source["updated_at"],
+                    "args": source["task"]["args"],
+                }
+                for _id, source in self._index.items()
+                if source["role"] == {"name": "task", "parent": doc_id}
+            ]
+
+    def _to_api_document(self, doc_id: str) -> dict:
+        source = self._index[doc_id]
+        return {
+            "_id": doc_id,
+            "target": source["target"],
+            "creator": source["creator"],
+            "created_at": source["created_at"],
+            "updated_at": source["updated_at"],
+        }
+
+    """
+    ------------------------------- ELASTICSEARCH ---------------------------
+    """
+
+    def search(self, query: dict, scroll: Optional[str] = None) -> dict:
+        with self._lock:
+            self._advance(time())
+            hits = [
+                {"_index": "dane-stub", "_id": _id, "_source": source}
+                for _id, source in self._index.items()
+                if self._matches(query.get("query", {"match_all": {}}), _id, source)
+            ]
+            response: dict = {
+                "took": 1,
+                "timed_out": False,
+                "hits": {"total": {"value": len(hits), "relation": "eq"}, "hits": []},
+            }
+            if "aggs" in query:
+                response["aggregations"] = self._aggregate(query["aggs"], hits)
+
+            offset = query.get("from", 0)
+            size = query.get("size", 10)
+            response["hits"]["hits"] = hits[offset : offset + size]
+            if scroll:
+                self._scroll_count += 1
+                scroll_id = f"stub_scroll_{self._scroll_count}"
+                self._scrolls[scroll_id] = (hits, offset + size, size)
+                response["_scroll_id"] = scroll_id
+        return response
+
+    def scroll(self, scroll_id: str) -> dict:
+        with self._lock:
+            if scroll_id not in self._scrolls:
+                raise DANEStubError(404, f"No search context found for {scroll_id}")
+            hits, offset, size = self._scrolls[scroll_id]
+            self._scrolls[scroll_id] = (hits, offset + size, size)
+        return {
+            "_scroll_id": scroll_id,
+            "took": 1,
+            "timed_out": False,
+            "hits": {
+                "total": {"value": len(hits), "relation": "eq"},
+                "hits": hits[offset : offset + size],
+            },
+        }
+
+    def clear_scroll(self, scroll_ids: List[str]):
+        with self._lock:
+            for scroll_id in scroll_ids:
+                self._scrolls.pop(scroll_id, None)
+
+    def _matches(self, query: dict, _id: str, source: dict) -> bool:
+        ((clause, args),) = query.items()
+        if clause == "match_all":
+            return True
+        if clause == "bool":
+            return all(
+                self._matches(q, _id, source)
+                for q in args.get("must", []) + args.get("filter", [])
+            ) and not any(
+                self._matches(q, _id, source) for q in args.get("must_not", [])
+            )
+        if clause == "ids":
+            return _id in args["values"]
+        if clause == "query_string":
+            value = _get_field(source, args["default_field"])
+            return value is not None and str(value) == args["query"].strip('"')
+        if clause == "terms":
+            ((field_name, values),) = args.items()
+            return _get_field(source, field_name) in values
+        if clause == "exists":
+            return _get_field(source, args["field"]) is not None
+        if clause == "range":
+            return self._in_range(source, args)
+        if clause == "has_parent":
+            parent_id = source["role"].get("parent")
+            parent = self._index.get(parent_id) if parent_id else None
+            return (
+                parent is not None
+                and parent["role"]["name"] == args["parent_type"]
+                and self._matches(args["query"], parent_id, parent)
+            )
+        if clause == "parent_id":
+            return source["role"] == {"name": args["type"], "parent": args["id"]}
+        raise DANEStubError(400, f"Query clause not supported by the stub: {clause}")
+
+    def _in_range(self, source: dict, args: dict) -> bool:
+        ((field_name, bounds),) = args.items()
+        value = _get_field(source, field_name)
+        if value is None:
+            return False
+        return all(
+            [
+                "gte" not in bounds or value >= bounds["gte"],
+                "gt" not in bounds or value > bounds["gt"],
+                "lte" not in bounds or value <= bounds["lte"],
+                "lt" not in bounds or value < bounds["lt"],
+            ]
+        )
+
+    def _aggregate(self, aggs: dict, hits: List[dict]) -> dict:
+        aggregations: Dict[str, dict] = {}
+        for name, agg in aggs.items():
+            sub_aggs = agg.get("aggs", {})
+            if "terms" in agg:
+                groups: Dict = {}
+                for hit in hits:
+                    key = _get_field(hit["_source"], agg["terms"]["field"])
+                    if key is not None:
+                        groups.setdefault(key, []).append(hit)
+                buckets = sorted(groups.items(), key=lambda g: len(g[1]), reverse=True)
+                aggregations[name] = {
+                    "buckets": [
+                        {
+                            "key": key,
+                            "doc_count": len(group),
+                            **self._aggregate(sub_aggs, group),
+                        }
+                        for key, group in buckets[: agg["terms"].get("size", 10)]
+                    ]
+                }
+            elif "filter" in agg:
+                matching = [
+                    hit
+                    for hit in hits
+                    if self._matches(agg["filter"], hit["_id"], hit["_source"])
+                ]
+                aggregations[name] = {
+                    "doc_count": len(matching),
+                    **self._aggregate(sub_aggs, matching),
+                }
+            elif "children" in agg:
+                parent_ids = {hit["_id"] for hit in hits}
+                children = [
+                    {"_id": _id, "_source": source}
+                    for _id, source in self._index.items()
+                    if source["role"]["name"] == agg["children"]["type"]
+                    and source["role"].get("parent") in parent_ids
+                ]
+                aggregations[name] = {
+                    "doc_count": len(children),
+                    **self._aggregate(sub_aggs, children),
+                }
+            else:
+                raise DANEStubError(
+                    400, f"Aggregation not supported by the stub: {agg}"
+                )
+        return aggregations
+
+    """
+    ------------------------------- HTTP ---------------------------
+    """
+
+    # returns the HTTP status code and the JSON response of the request
+    def handle_request(
+        self, method: str, path: str, params: dict, body
+    ) -> Tuple[int, Optional[object]]:
+        path = re.sub("/+", "/", path).rstrip("/")
+        if path.startswith("/DANE/"):
+            return self._handle_dane_request(method, path, body)
+        return self._handle_es_request(method, path, params, body)
+
+    def _handle_dane_request(
+        self, method: str, path: str, body
+    ) -> Tuple[int, Optional[object]]:
+        tasks_of_doc = re.fullmatch("/DANE/document/([^/]+)/tasks", path)
+        if method == "POST" and path == "/DANE/documents":
+            return 200, self.register_documents(body)
+        if method == "POST" and path == "/DANE/task":
+            return 200, self.assign_task(body)
+        if method == "GET" and tasks_of_doc:
+            return 200, self.get_tasks_of_document(tasks_of_doc.group(1))
+        raise DANEStubError(404, f"{method} {path} not supported by the stub")
+
+    def _handle_es_request(
+        self, method: str, path: str, params: dict, body
+    ) -> Tuple[int, Optional[object]]:
+        body = body if body else {}
+        if path == "":
+            return 200, {
+                "name": "dane-stub",
+                "version": {"number": "7.17.0", "build_flavor": "default"},
+                "tagline": "You Know, for Search",
+            }
+        if path == "/_search/scroll" and method == "DELETE":
+            scroll_ids = body.get("scroll_id", [])
+            self.clear_scroll(
+                scroll_ids if isinstance(scroll_ids, list) else [scroll_ids]
+            )
+            return 200, {"succeeded": True}
+        if path == "/_search/scroll":
+            scroll_id = body.get("scroll_id") or params.get("scroll_id")
+            if not scroll_id:
+                raise DANEStubError(400, "No scroll_id provided")
+            return 200, self.scroll(scroll_id)
+        if path.endswith("/_search"):
+            return 200, self.search(body, params.get("scroll"))
+        raise DANEStubError(404, f"{method} {path} not supported by the stub")
+
+
+class _StubRequestHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive, like DANE & ES
+
+    def do_HEAD(self):
+        self._handle("HEAD")
+
+    def do_GET(self):
+        self._handle("GET")
+
+    def do_POST(self):
+        self._handle("POST")
+
+    def do_PUT(self):
+        self._handle("PUT")
+
+    def do_DELETE(self):
+        self._handle("DELETE")
+
+    def log_message(self, format, *args):
+        logger.debug(format % args)
+
+    def _handle(self, method: str):
+        url = urlparse(self.path)
+        params = {k: v[0] for k, v in parse_qs(url.query).items()}
+        content_length = int(self.headers.get("Content-Length", 0))
+        body = self.rfile.read(content_length) if content_length else None
+        try:
+            status_code, response = self.server.stub.handle_request(  # type: ignore
+                method, url.path, params, json.loads(body) if body else None
+            )
+        except DANEStubError as e:
+            status_code, response = e.status_code, {"error": str(e)}
+        except Exception as e:
+            logger.exception(f"DANE stub failed to handle {method} {self.path}")
+            status_code, response = 500, {"error": str(e)}
+
+        data = json.dumps(response).encode("utf-8")
+        self.send_response(status_code)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.send_header("X-Elastic-Product", "Elasticsearch")
+        self.end_headers()
+        if method != "HEAD":
+            self.wfile.write(data)
+
+
+# like DANE, derive the IDs from the content, so registering twice is detected
+def _generate_id(*parts: str) -> str:
+    return hashlib.sha1(":".join(parts).encode("utf-8")).hexdigest()
+
+
+def _to_iso(timestamp: float) -> str:
+    return (
+        datetime.fromtimestamp(timestamp, timezone.utc)
+        .replace(tzinfo=None)
+        .isoformat(timespec="seconds")
+    )
+
+
+def _get_field(source: dict, field_name: str):
+    value: Any = source
+    for part in field_name.split("."):
+        if not isinstance(value, dict):
+            return None
+        value = value.get(part)
+    return value
+
+
+# Run the stub as a standalone server, e.g. to point a workflow or benchmark at
+if __name__ == "__main__":
+    parser = ArgumentParser(description="Local stub of a DANE server and its ES index")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=5500)
+    parser.add_argument("--latency", type=float, default=1.0, help="seconds per task")
+    parser.add_argument("--failure-rate", type=float, default=0.0)
+    parser.add_argument(
+        "--dependency",
+        action="append",
+        default=[],
+        help="TASK=DEP1,DEP2 e.g. ASR=DOWNLOAD (can be repeated)",
+    )
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    stub = DANEStub(
+        task_latency=args.latency,
+        failure_rate=args.failure_rate,
+        dependencies={
+            key: deps.split(",")
+            for key, deps in (dep.split("=", 1) for dep in args.dependency)
+        },
+        host=args.host,
+        port=args.port,
+        seed=args.seed,
+    )
+    logger.info(f"Add these settings to PROC_ENV.CONFIG: {stub.get_config()}")
+    stub._server.serve_forever()
@@ -3,15 +3,27 @@ import sys
 import json
 import requests
 import logging
+import random
+import threading
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
 from time import sleep, perf_counter
 from enum import Enum, IntEnum, unique
-from dataclasses import dataclass
-from typing import List, Optional, Tuple
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from typing import Dict, Iterator, List, Optional, Set, Tuple
+from urllib.parse import urlparse
 from elasticsearch7 import Elasticsearch
+from requests.adapters import HTTPAdapter
 from dane import Document
+from dane_workflows.metrics import get_metrics
+from dane_workflows.util.logging_util import LazyLogArg, lazy_json, log_aggregated
 from dane_workflows.status import StatusRow, ProcessingStatus
 from dane_workflows.util.dane_query_util import (
     tasks_of_batch_query,
+    tasks_of_documents_query,
+    task_states_of_batch_query,
+    task_states_of_batches_query,
     results_of_batch_query,
     result_of_target_id_query,
     task_of_target_id_query,
@@ -19,6 +31,12 @@ from dane_workflows.util.dane_query_util import (
 
 logger = logging.getLogger(__name__)
 
+# max number of documents to fetch the (dependant) tasks of in a single ES query
+DEPENDENCY_QUERY_CHUNK_SIZE = 500
+
+# how long ES should keep the search context alive in between fetching two pages
+ES_SCROLL_KEEP_ALIVE = "2m"
+
 
 @unique
 class DANEBatchState(Enum):
@@ -70,6 +88,12 @@ class Result:
     # provenance: Optional[dict] TODO fill this in _to_result()
 
 
+@dataclass
+class TaskTable:
+    tasks: Dict[str, Task] = field(default_factory=dict)  # latest state of each task
+    watermark: Optional[str] = None  # tasks updated before were already fetched
+
+
 class DANEHandler:
     def __init__(self, config: dict):
 
@@ -89,10 +113,28 @@ class DANEHandler:
         self.DANE_TASK_ENDPOINT = f"{self.DANE_API}/task/"
 
         self.STATUS_DIR = config["DANE_STATUS_DIR"]
-        self.MONITOR_INTERVAL = config["DANE_MONITOR_INTERVAL"]
+        self.MONITOR_INTERVAL = config["DANE_MONITOR_INTERVAL"]  # initial interval
+
+        # the monitor interval adapts to the progress of the batch within these bounds
+        self.MONITOR_INTERVAL_MIN = config.get(
+            "DANE_MONITOR_INTERVAL_MIN", self.MONITOR_INTERVAL
+        )
+        self.MONITOR_INTERVAL_MAX = config.get(
+            "DANE_MONITOR_INTERVAL_MAX", self.MONITOR_INTERVAL
+        )
+        self.MONITOR_BACKOFF = config.get("DANE_MONITOR_BACKOFF", 1.5)
+        self.MONITOR_JITTER = config.get("DANE_MONITOR_JITTER", 0.1)  # fraction
+        self.MONITOR_WATERMARK_OVERLAP = config.get(
+            "DANE_MONITOR_WATERMARK_OVERLAP", 30
+        )  # seconds
 
         self.BATCH_PREFIX = config["DANE_BATCH_PREFIX"]
 
+        # all DANE API calls share one session, so connections are pooled & kept alive.
+        # The pool size also bounds the number of concurrent calls to the DANE API
+        self.HTTP_POOL_SIZE = config.get("DANE_HTTP_POOL_SIZE", 10)
+        self.session = self._create_session(self.HTTP_POOL_SIZE)
+
         # TODO implement new endpoint in DANE-server API to avoid calling ES directly
         dane_es_user = config.get("DANE_ES_USER", None)
         dane_es_pw = config.get("DANE_ES_PW", None)
@@ -114,6 +156,7 @@ class DANEHandler:
 
         self.DANE_ES_INDEX = config["DANE_ES_INDEX"]
         self.DANE_ES_QUERY_TIMEOUT = config["DANE_ES_QUERY_TIMEOUT"]
+        self.DANE_ES_PAGE_SIZE = config.get("DANE_ES_PAGE_SIZE", 200)  # hits per page
 
         # finally create the ES instance and test the connection
         self.DANE_ES = Elasticsearch(**es_settings)
@@ -122,6 +165,27 @@ class DANEHandler:
         except AssertionError:
             logger.exception("Invalid Elasticsearch settings, cannot connect")
 
+    def _create_session(self, pool_size: int) -> requests.Session:
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+        session.hooks["response"].append(self._record_http_metrics)
+        return session
+
+    # records the latency of each DANE API call, per endpoint (e.g. documents, task)
+    def _record_http_metrics(self, response: requests.Response, *args, **kwargs):
+        path = [part for part in urlparse(response.url).path.split("/") if part]
+        labels = {
+            "method": response.request.method or "",
+            "endpoint": path[1] if len(path) > 1 else "",
+        }
+        metrics = get_metrics()
+        metrics.observe("dane_http", response.elapsed.total_seconds(), labels)
+        metrics.increment(
+            "dane_http_requests", labels={**labels, "status": str(response.status_code)}
+        )
+
     # NOTE: these files are never cleaned up
     def _get_batch_file_name(self, proc_batch_id: int) -> str:
         fn = os.path.join(
@@ -192,11 +256,11 @@ class DANEHandler:
     def _get_tasks_of_document(
         self, doc_id: str, leaf_task_to_omit: Optional[str] = None
     ) -> List[Task]:
-        logger.info(
-            f"Fetching tasks of document {doc_id}, filtering out {leaf_task_to_omit}"
+        logger.debug(
+            "Fetching tasks of document %s, filtering out %s", doc_id, leaf_task_to_omit
         )
         try:
-            resp = requests.get(f"{self.DANE_DOC_ENDPOINT}/{doc_id}/tasks")
+            resp = self.session.get(f"{self.DANE_DOC_ENDPOINT}/{doc_id}/tasks")
             if resp.status_code != 200:
                 logger.error(
                     f"Failed to fetch tasks for {doc_id}; status_code={resp.status_code}"
@@ -231,80 +295,183 @@ class DANEHandler:
             logger.exception(f"Failed to fetch tasks for doc ID: {doc_id}")
             return []
 
+    # fetches the tasks of multiple documents with (at most HTTP_POOL_SIZE) concurrent calls
+    def _get_tasks_of_documents(
+        self, doc_ids: List[str], leaf_task_to_omit: Optional[str] = None
+    ) -> Dict[str, List[Task]]:
+        logger.info(f"Fetching tasks of {len(doc_ids)} documents")
+        if not doc_ids:
+            return {}
+        with ThreadPoolExecutor(
+            max_workers=min(self.HTTP_POOL_SIZE, len(doc_ids))
+        ) as executor:
+            tasks_per_doc = executor.map(
+                lambda doc_id: self._get_tasks_of_document(doc_id, leaf_task_to_omit),
+                doc_ids,
+            )
+            return dict(zip(doc_ids, tasks_per_doc))
+
     """
     ------------------------------ ES FUNCTIONS (UNDESIRABLE, BUT REQUIRED) ----------------
     """
 
+    # iterates over all hits of the query using the scroll API, so large result sets are
+    # fetched page by page (DANE_ES_PAGE_SIZE hits) in linear time
+    def _iter_search_hits(self, query_type: str, query: dict) -> Iterator[dict]:
+        logger.debug("%s", lazy_json(query))
+        result = self._es_search(
+            query_type, query, scroll=ES_SCROLL_KEEP_ALIVE
+        )  # TODO better exception handling (OR fix by moving this to DANE-serve API)
+        scroll_id = result.get("_scroll_id")
+        try:
+            while True:
+                hits = result["hits"]["hits"]
+                yield from hits
+                if scroll_id is None or len(hits) < query["size"]:
+                    break  # this was the last page
+                with get_metrics().timer("es_scroll", {"query": query_type}):
+                    result = self.DANE_ES.scroll(
+                        scroll_id=scroll_id,
+                        scroll=ES_SCROLL_KEEP_ALIVE,
+                        request_timeout=self.DANE_ES_QUERY_TIMEOUT,
+                    )
+                scroll_id = result.get("_scroll_id", scroll_id)
+        finally:
+            if scroll_id is not None:
+                self._clear_scroll(scroll_id)
+
+    # all ES searches go through here, so their latency is recorded per type of query
+    def _es_search(self, query_type: str, query: dict, **kwargs) -> dict:
+        with get_metrics().timer("es_query", {"query": query_type}):
+            return self.DANE_ES.search(
+                index=self.DANE_ES_INDEX,
+                body=query,
+                request_timeout=self.DANE_ES_QUERY_TIMEOUT,  # timeout reached! (60 seconds)
+                **kwargs,
+            )
+
+    def _clear_scroll(self, scroll_id: str):
+        try:
+            self.DANE_ES.clear_scroll(scroll_id=scroll_id)
+        except Exception:
+            logger.warning("Could not clear scroll, it will expire by itself")
+
     # TODO this function needs to be put in the DANE API!
-    def get_tasks_of_batch(
-        self, proc_batch_id: int, all_tasks: List[Task], offset=0, size=200
-    ) -> List[Task]:
+    def iter_tasks_of_batch(
+        self, proc_batch_id: int, updated_since: Optional[str] = None
+    ) -> Iterator[Task]:
         logger.info(
-            f"Fetching tasks of proc_batch: {self._get_proc_batch_name(proc_batch_id)} from DANE index"
+            f"Fetching tasks of proc_batch: {self._get_proc_batch_name(proc_batch_id)} from DANE index (updated since: {updated_since})"
         )
         query = tasks_of_batch_query(
-            self._get_proc_batch_name(proc_batch_id), offset, size, self.DANE_TASK_ID
+            self._get_proc_batch_name(proc_batch_id),
+            self.DANE_ES_PAGE_SIZE,
+            self.DANE_TASK_ID,
+            updated_since=updated_since,
         )
-        logger.debug(json.dumps(query, indent=4, sort_keys=True))
-        result = self.DANE_ES.search(
-            index=self.DANE_ES_INDEX,
-            body=query,
-            request_timeout=self.DANE_ES_QUERY_TIMEOUT,  # timeout reached! (60 seconds)
-        )  # TODO better exception handling (OR fix by moving this to DANE-serve API)
-        if len(result["hits"]["hits"]) <= 0:
-            logger.info(
-                f"No (more) tasks for batch {self._get_proc_batch_name(proc_batch_id)}"
-            )
-            return all_tasks
-        else:
-            for hit in result["hits"]["hits"]:
-                all_tasks.append(self._to_task(hit))
-            logger.info(
-                f"Found {len(all_tasks)} tasks for batch {self._get_proc_batch_name(proc_batch_id)} trying to find some more"
-            )
-            return self.get_tasks_of_batch(
-                proc_batch_id, all_tasks, offset + size, size
+        for hit in self._iter_search_hits("tasks_of_batch", query):
+            yield self._to_task(hit)
+
+    # counts the tasks of the batch per state with a single aggregation, without fetching
+    # any of the tasks. Returns None if ES could not aggregate the task states
+    def get_task_state_counts_of_batch(self, proc_batch_id: int) -> Optional[Counter]:
+        query = task_states_of_batch_query(
+            self._get_proc_batch_name(proc_batch_id), self.DANE_TASK_ID
+        )
+        try:
+            result = self._es_search("task_states_of_batch", query)
+            return Counter(
+                {
+                    int(bucket["key"]): bucket["doc_count"]
+                    for bucket in result["aggregations"]["task_states"]["buckets"]
+                }
             )
+        except Exception:
+            logger.exception("Could not aggregate the task states of the batch")
+            return None
+
+    # counts the tasks per state of several batches at once (with a single aggregation).
+    # Returns None if ES could not aggregate the task states
+    def get_task_state_counts_of_batches(
+        self, proc_batch_ids: List[int]
+    ) -> Optional[Dict[int, Counter]]:
+        name_to_id = {self._get_proc_batch_name(pbid): pbid for pbid in proc_batch_ids}
+        query = task_states_of_batches_query(list(name_to_id.keys()), self.DANE_TASK_ID)
+        try:
+            result = self._es_search("task_states_of_batches", query)
+            state_counts: Dict[int, Counter] = {
+                pbid: Counter() for pbid in proc_batch_ids
+            }
+            for batch in result["aggregations"]["batches"]["buckets"]:
+                if batch["key"] not in name_to_id:
+                    continue
+                state_counts[name_to_id[batch["key"]]] = Counter(
+                    {
+                        int(bucket["key"]): bucket["doc_count"]
+                        for bucket in batch["tasks"]["dane_task"]["task_states"][
+                            "buckets"
+                        ]
+                    }
+                )
+            return state_counts
+        except Exception:
+            logger.exception("Could not aggregate the task states of the batches")
+            return None
 
-    def get_results_of_batch(
-        self, proc_batch_id: int, all_results: List[Result], offset=0, size=200
-    ) -> List[Result]:
+    def get_tasks_of_batch(self, proc_batch_id: int) -> List[Task]:
+        all_tasks = list(self.iter_tasks_of_batch(proc_batch_id))
+        logger.info(
+            f"Found {len(all_tasks)} tasks for batch {self._get_proc_batch_name(proc_batch_id)}"
+        )
+        return all_tasks
+
+    def iter_results_of_batch(self, proc_batch_id: int) -> Iterator[Result]:
         logger.info(
             f"Fetching results of proc_batch: {self._get_proc_batch_name(proc_batch_id)} from DANE index"
         )
         query = results_of_batch_query(
-            self._get_proc_batch_name(proc_batch_id), offset, size, self.DANE_TASK_ID
+            self._get_proc_batch_name(proc_batch_id),
+            self.DANE_ES_PAGE_SIZE,
+            self.DANE_TASK_ID,
         )
-        logger.debug(json.dumps(query, indent=4, sort_keys=True))
-        result = self.DANE_ES.search(
-            index=self.DANE_ES_INDEX,
-            body=query,
-            request_timeout=self.DANE_ES_QUERY_TIMEOUT,
+        for hit in self._iter_search_hits("results_of_batch", query):
+            yield self._to_result(hit)
+
+    def get_results_of_batch(self, proc_batch_id: int) -> List[Result]:
+        all_results = list(self.iter_results_of_batch(proc_batch_id))
+        logger.info(
+            f"Found {len(all_results)} results for batch {self._get_proc_batch_name(proc_batch_id)}"
         )
-        if len(result["hits"]["hits"]) <= 0:
-            logger.info(
-                f"No (more) results for batch {self._get_proc_batch_name(proc_batch_id)}"
-            )
-            return all_results
-        else:
-            for hit in result["hits"]["hits"]:
-                all_results.append(self._to_result(hit))
-            logger.info(
-                f"Found {len(all_results)} results for batch {self._get_proc_batch_name(proc_batch_id)} trying to find some more"
-            )
-            return self.get_results_of_batch(
-                proc_batch_id, all_results, offset + size, size
-            )
+        return all_results
+
+    # fetches the tasks of many documents with one query per DEPENDENCY_QUERY_CHUNK_SIZE
+    # documents, so the cost hardly grows with the size of the batch.
+    # Returns None if ES could not be queried
+    def _get_tasks_of_documents_from_index(
+        self, doc_ids: List[str], leaf_task_to_omit: Optional[str] = None
+    ) -> Optional[Dict[str, List[Task]]]:
+        logger.info(f"Fetching tasks of {len(doc_ids)} documents from DANE index")
+        tasks_per_doc: Dict[str, List[Task]] = {doc_id: [] for doc_id in doc_ids}
+        try:
+            for i in range(0, len(doc_ids), DEPENDENCY_QUERY_CHUNK_SIZE):
+                query = tasks_of_documents_query(
+                    doc_ids[i : i + DEPENDENCY_QUERY_CHUNK_SIZE],
+                    self.DANE_ES_PAGE_SIZE,
+                    leaf_task_to_omit,
+                )
+                for hit in self._iter_search_hits("tasks_of_documents", query):
+                    task = self._to_task(hit)
+                    tasks_per_doc.setdefault(task.doc_id, []).append(task)
+        except Exception:
+            logger.exception("Failed to fetch the tasks of documents from DANE index")
+            return None
+        return tasks_per_doc
 
     def get_result_of_target_id(self, target_id: str):
         logger.info(f"Getting result of target_id {target_id}")
         query = result_of_target_id_query(target_id, self.DANE_TASK_ID)
 
-        result = self.DANE_ES.search(
-            index=self.DANE_ES_INDEX,
-            body=query,
-            request_timeout=self.DANE_ES_QUERY_TIMEOUT,
-        )
+        result = self._es_search("result_of_target_id", query)
         logger.info(f"Found: {result['hits']['total']['value']} results")
         if len(result["hits"]["hits"]) == 1:
             data = result["hits"]["hits"][0]
@@ -318,11 +485,7 @@ class DANEHandler:
         logger.info(f"Getting task of target_id {target_id}")
         query = task_of_target_id_query(target_id, self.DANE_TASK_ID)
 
-        result = self.DANE_ES.search(
-            index=self.DANE_ES_INDEX,
-            body=query,
-            request_timeout=self.DANE_ES_QUERY_TIMEOUT,
-        )
+        result = self._es_search("task_of_target_id", query)
         logger.info(f"Found: {result['hits']['total']['value']} tasks")
         if len(result["hits"]["hits"]) == 1:
             data = result["hits"]["hits"][0]
@@ -334,7 +497,7 @@ class DANEHandler:
 
     # TODO check out if DANE.TASK.from_json also works well instead of this dataclass
     def _to_task(self, es_hit: dict) -> Task:
-        logger.info("Converting ES hit to Task")
+        logger.debug("Converting ES hit %s to Task", es_hit["_id"])
         return Task(
             es_hit["_id"],
             es_hit["_source"]["task"]["msg"],
@@ -348,7 +511,7 @@ class DANEHandler:
 
     # TODO check out if DANE.TASK.from_json also works well instead of this dataclass
     def _to_result(self, es_hit: dict) -> Result:
-        logger.info("Converting ES hit to Result")
+        logger.debug("Converting ES hit %s to Result", es_hit["_id"])
         return Result(
             es_hit["_id"],
             es_hit["_source"]["result"]["generator"],
@@ -369,9 +532,8 @@ class DANEHandler:
     ) -> Optional[List[StatusRow]]:
         logger.info(f"Trying to insert {len(batch)} documents")
         dane_docs = self._to_dane_docs(batch)
-        logger.debug(self.DANE_DOCS_ENDPOINT)
-        logger.debug(dane_docs)
-        r = requests.post(self.DANE_DOCS_ENDPOINT, data=json.dumps(dane_docs))
+        logger.debug("Posting to %s: %s", self.DANE_DOCS_ENDPOINT, dane_docs)
+        r = self.session.post(self.DANE_DOCS_ENDPOINT, data=json.dumps(dane_docs))
         if r.status_code == 200:
             # persist the response containing DANE.Document._id
             try:
@@ -402,7 +564,7 @@ class DANEHandler:
             return None
 
         # first extract all the DANE documents (failed or successful)
-        logger.debug(json.dumps(dane_resp, indent=4, sort_keys=True))
+        logger.debug("%s", lazy_json(dane_resp))
         dane_docs = self.__extract_docs_by_state(dane_resp, DANEBatchState.SUCCESS)
         dane_docs.extend(self.__extract_docs_by_state(dane_resp, DANEBatchState.FAILED))
 
@@ -433,7 +595,7 @@ class DANEHandler:
     # converts JSON data (part of DANE API response) into DANE Documents
     # TODO make sure to fix irregular JSON data in DANE core library
     def __to_dane_doc(self, json_data: dict) -> Optional[Document]:
-        logger.info(f"Converting JSON to DANE Document {json_data}")
+        logger.debug("Converting JSON to DANE Document %s", json_data)
         if json_data is None:
             logger.warning("No json_data supplied")
             return None
@@ -444,7 +606,7 @@ class DANEHandler:
 
     def _persist_registered_batch(self, proc_batch_id: int, dane_resp: dict) -> bool:
         logger.info("Persisting DANE API response to disk")
-        logger.info(dane_resp)
+        logger.debug("%s", dane_resp)
         try:
             with open(self._get_batch_file_name(proc_batch_id), "w") as f:
                 f.write(json.dumps(dane_resp, indent=4, sort_keys=True))
@@ -456,9 +618,11 @@ class DANEHandler:
     # called by DANEProcessingEnvironment.process_batch()
     def process_batch(self, proc_batch_id: int) -> Tuple[bool, int, str]:
         task_type = self.DANE_TASK_ID
-        logger.info(f"going to submit {task_type} for the following doc IDs")
         doc_ids = self._get_doc_ids_of_batch(proc_batch_id)
-        logger.info(doc_ids)
+        logger.info(
+            f"going to submit {task_type} for {len(doc_ids) if doc_ids else 0} doc IDs"
+        )
+        logger.debug("%s", doc_ids)
         if doc_ids is None:
             return (
                 False,
@@ -470,8 +634,8 @@ class DANEHandler:
             "key": task_type,  # e.g. ASR, DOWNLOAD
         }
         logger.info(f"Submitting task to {self.DANE_TASK_ENDPOINT}")
-        logger.debug(json.dumps(task))
-        r = requests.post(self.DANE_TASK_ENDPOINT, data=json.dumps(task))
+        logger.debug("%s", LazyLogArg(json.dumps, task))
+        r = self.session.post(self.DANE_TASK_ENDPOINT, data=json.dumps(task))
         return (
             r.status_code == 200,
             r.status_code,
@@ -481,12 +645,13 @@ class DANEHandler:
     # TODO avoid persisting this JSON response in StatusRow.proc_status_msg
     def __parse_dane_process_response(self, dane_resp: str) -> str:
         logger.info("Parsing DANE response (TODO)")
-        logger.info(dane_resp)
+        logger.debug("%s", dane_resp)
 
         # treat the errors as warnings, since some of them don't cause harm (see below)
         errors = self._extract_errors_from_dane_resp(dane_resp)
-        for e in errors:
-            logger.warning(e)
+        with log_aggregated(logger, logging.WARNING, "errors returned by DANE") as log:
+            for e in errors:
+                log.add(e)
 
         return dane_resp
 
@@ -530,59 +695,174 @@ class DANEHandler:
     def monitor_batch(self, proc_batch_id: int, verbose=False) -> List[Task]:
         logger.info(f"\t\tMonitoring DANE batch: {proc_batch_id}")
         start_time = perf_counter()
-        tasks_of_batch = []
+        interval = min(
+            max(self.MONITOR_INTERVAL, self.MONITOR_INTERVAL_MIN),
+            self.MONITOR_INTERVAL_MAX,
+        )
+        last_state_counts = None
+        task_table = TaskTable()
+        task_type = self.DANE_TASK_ID
         while True:  # infinite loop, until there are no more running tasks
-            tasks_of_batch = self.get_tasks_of_batch(proc_batch_id, [])
-            task_type = self.DANE_TASK_ID
-            logger.info(f"Found {len(tasks_of_batch)} tasks")
+            # the progress only requires the number of tasks per state, so the tasks
+            # themselves are only fetched in verbose mode (or if the aggregation fails)
+            state_counts = self.get_task_state_counts_of_batch(proc_batch_id)
+            if state_counts is None or verbose:
+                self._update_task_table(proc_batch_id, task_table)
+                if state_counts is None:
+                    state_counts = Counter(t.state for t in task_table.tasks.values())
+            logger.info(f"Found {sum(state_counts.values())} tasks")
             logger.info("*" * 50)
 
             # log the raw JSON status of ALL tasks (verbose only)
-            status_overview = self._generate_tasks_overview(tasks_of_batch)
             if verbose:
-                self._log_all_tasks_verbose(status_overview)
+                self._log_all_tasks_verbose(
+                    self._generate_tasks_overview(list(task_table.tasks.values()))
+                )
 
-            # log a status overview per (type of) dane_task (e.g. ASR, DOWNLOAD, etc)
+            # log a status overview of the (type of) dane_task (e.g. ASR, DOWNLOAD, etc)
             logger.info(f"Reporting on the {task_type} task")
-            self._log_status_of_dane_task_type(status_overview, task_type)
+            self._log_task_state_counts(state_counts, task_type)
 
             # TODO report and work on the dictionary with statusses to return
-            logger.info(f"Waiting for {self.MONITOR_INTERVAL} seconds")
-            sleep(self.MONITOR_INTERVAL)
             logger.info("-" * 50)
-            if not self._contains_running_tasks(tasks_of_batch):
-                logger.info(
-                    "There are no tasks QUEUED or CREATED, checking UNFINISHED DEPENDENCIES"
-                )
-                # no tasked are QUEUED or CREATED, now check if the UNFINISHED_DEPENDENCIES are ok
-                if not self._check_unfinished_dependencies_ok(
-                    tasks_of_batch, self.DANE_TASK_ID
-                ):  # now also check if we are not waiting for failed dependencies
-                    logger.info(
-                        f"There are no unifinished dependencies pending; monitoring proc_batch {proc_batch_id} stopped"
-                    )
-                    break
-                else:
-                    logger.info(
-                        "There are still unfinished dependencies, continuing..."
-                    )
+            if self._is_monitored_batch_done(proc_batch_id, state_counts, task_table):
+                break
 
             logger.info("Not done, continuing to monitor...")
 
+            # wait longer while nothing changes, shorter when the batch is nearly done
+            if last_state_counts is not None:
+                interval = self._next_monitor_interval(
+                    interval,
+                    state_counts != last_state_counts,
+                    self._get_fraction_done(state_counts),
+                )
+            last_state_counts = state_counts
+            wait_time = self._add_jitter(interval)
+            logger.info(f"Waiting for {wait_time:.1f} seconds")
+            sleep(wait_time)
+
+        # the batch is done, so fetch the final state of (all) its tasks
+        self._update_task_table(proc_batch_id, task_table)
+        tasks_of_batch = list(task_table.tasks.values())
         logger.info(
             f"Time it took to finish this batch {(perf_counter() - start_time)} seconds"
         )
         logger.debug(tasks_of_batch)
         return tasks_of_batch
 
+    # the batch is done when no tasks are QUEUED or CREATED and the tasks with unfinished
+    # dependencies (if any) are waiting for failed dependencies only
+    def _is_monitored_batch_done(
+        self, proc_batch_id: int, state_counts: Counter, task_table: "TaskTable"
+    ) -> bool:
+        if self._contains_running_states(state_counts):
+            return False
+
+        logger.info(
+            "There are no tasks QUEUED or CREATED, checking UNFINISHED DEPENDENCIES"
+        )
+        if state_counts[TaskState.UNFINISHED_DEPENDENCY.value] == 0:
+            logger.info(
+                f"There are no tasks with unfinished dependencies; monitoring proc_batch {proc_batch_id} stopped"
+            )
+            return True
+
+        # the tasks with unfinished dependencies are needed to check their dependencies
+        self._update_task_table(proc_batch_id, task_table)
+        if not self._check_unfinished_dependencies_ok(
+            list(task_table.tasks.values()), self.DANE_TASK_ID
+        ):  # now also check if we are not waiting for failed dependencies
+            logger.info(
+                f"There are no unifinished dependencies pending; monitoring proc_batch {proc_batch_id} stopped"
+            )
+            return True
+
+        logger.info("There are still unfinished dependencies, continuing...")
+        return False
+
+    # fetches only the tasks updated since the watermark (all tasks if None) into the
+    # task_table and moves up its watermark. As tasks may become searchable a little
+    # after their updated_at, the watermark lags DANE_MONITOR_WATERMARK_OVERLAP seconds
+    def _update_task_table(self, proc_batch_id: int, task_table: "TaskTable"):
+        last_updated_at = None
+        num_updated = 0
+        for task in self.iter_tasks_of_batch(
+            proc_batch_id, updated_since=task_table.watermark
+        ):
+            task_table.tasks[task.id] = task
+            num_updated += 1
+            if last_updated_at is None or task.updated_at > last_updated_at:
+                last_updated_at = task.updated_at
+        logger.info(f"{num_updated} tasks were updated since {task_table.watermark}")
+        if last_updated_at is None:
+            return  # nothing changed
+        try:
+            new_watermark = datetime.fromisoformat(last_updated_at) - timedelta(
+                seconds=self.MONITOR_WATERMARK_OVERLAP
+            )
+            task_table.watermark = max(
+                new_watermark.isoformat(timespec="seconds"), task_table.watermark or ""
+            )  # never move the watermark back
+        except ValueError:
+            logger.warning(f"Cannot parse updated_at: {last_updated_at}")
+            task_table.watermark = None  # just fetch all tasks the next time
+
+    # backs off while the task states do not change, otherwise polls more frequently.
+    # As the batch nears completion the max interval is lowered towards the min interval
+    def _next_monitor_interval(
+        self, interval: float, states_changed: bool, fraction_done: float
+    ) -> float:
+        if states_changed:
+            interval /= self.MONITOR_BACKOFF
+        else:
+            interval *= self.MONITOR_BACKOFF
+        max_interval = self.MONITOR_INTERVAL_MIN + (
+            self.MONITOR_INTERVAL_MAX - self.MONITOR_INTERVAL_MIN
+        ) * (1.0 - fraction_done)
+        return max(self.MONITOR_INTERVAL_MIN, min(interval, max_interval))
+
+    # spreads the polling of concurrently monitored batches
+    def _add_jitter(self, interval: float) -> float:
+        return max(
+            0.0,
+            interval
+            * (1.0 + random.uniform(-self.MONITOR_JITTER, self.MONITOR_JITTER)),
+        )
+
+    # the fraction of tasks (in the state_histogram) that are no longer running
+    def _get_fraction_done(self, state_histogram: Counter) -> float:
+        num_tasks = sum(state_histogram.values())
+        if num_tasks == 0:
+            return 0.0
+        num_running = sum(
+            state_histogram[state]
+            for state in [
+                TaskState.QUEUED.value,
+                TaskState.CREATED.value,
+                TaskState.UNFINISHED_DEPENDENCY.value,
+            ]
+        )
+        return (num_tasks - num_running) / num_tasks
+
     # Check if all tasks with proc_batch_id are done running
     def is_proc_batch_done(self, proc_batch_id: int) -> bool:
         logger.info("Entering function")
+        state_counts = self.get_task_state_counts_of_batch(proc_batch_id)
+        if state_counts is not None:
+            return self._contains_running_states(state_counts) is False
         return (
-            self._contains_running_tasks(self.get_tasks_of_batch(proc_batch_id, []))
+            self._contains_running_tasks(self.get_tasks_of_batch(proc_batch_id))
             is False
         )  # done if there are no running tasks remaining
 
+    # Check if the (aggregated) task states contain any running tasks
+    def _contains_running_states(self, state_counts: Counter) -> bool:
+        return (
+            state_counts[TaskState.QUEUED.value] + state_counts[TaskState.CREATED.value]
+            != 0
+        )
+
     # Check if all supplied tasks have (un)successfully run
     # A task is still running if it is: QUEUED, CREATED or has UNFINISHED_DEPENDENCY
     def _contains_running_tasks(self, tasks_of_batch: List[Task]) -> bool:
@@ -632,8 +912,14 @@ class DANEHandler:
             f"Checking {len(tasks_with_unfinished_deps)} tasks with unfinished dependencies"
         )
         failed_count = 0
+        doc_ids = [t.doc_id for t in tasks_with_unfinished_deps]
+        dependant_tasks_per_doc = self._get_tasks_of_documents_from_index(
+            doc_ids, leaf_task
+        )
+        if dependant_tasks_per_doc is None:  # fall back to the DANE API
+            dependant_tasks_per_doc = self._get_tasks_of_documents(doc_ids, leaf_task)
         for t in tasks_with_unfinished_deps:
-            dependant_tasks = self._get_tasks_of_document(t.doc_id, leaf_task)
+            dependant_tasks = dependant_tasks_per_doc.get(t.doc_id, [])
             failed_count += 1 if self._contains_failed_deps(dependant_tasks) else 0
 
         # else: as long as not all dependencies have failed, it's ok
@@ -710,16 +996,26 @@ class DANEHandler:
 
     def _log_all_tasks_verbose(self, status_overview: dict):
         logger.info("Entering function")
-        logger.debug(json.dumps(status_overview, indent=4, sort_keys=True))
+        logger.debug("%s", lazy_json(status_overview))
 
     def _log_status_of_dane_task_type(self, status_overview, dane_task: str):
+        states = status_overview.get(dane_task, {}).get("states", {})
+        self._log_task_state_counts(
+            Counter(
+                {
+                    int(state): len(states[state].get("tasks", []))
+                    for state in states.keys()
+                }
+            ),
+            dane_task,
+        )
+
+    def _log_task_state_counts(self, state_counts: Counter, dane_task: str):
         logger.info(
             f"Showing all processing states for current DANE batch for all tasks of type: {dane_task}"
         )
-        states = status_overview.get(dane_task, {}).get("states", {})
         c_unknown = 0
-        for state in states.keys():
-            state_count = len(states[state].get("tasks", []))
+        for state, state_count in state_counts.items():
             try:
                 ts = TaskState(int(state))
                 logger.info(f"Number of {ts.name} tasks: {state_count}")
@@ -758,3 +1054,132 @@ class DANEHandler:
 
     def _get_proc_batch_name(self, proc_batch_id):
         return f"{self.BATCH_PREFIX}_{proc_batch_id}"
+
+
+# Monitors all outstanding proc batches in a single background thread, using one ES query
+# per tick, and sets the completion event of each batch as soon as it is done
+class DANEBatchMonitor:
+    MAX_FAILED_TICKS = 10  # consecutive failed ticks before the pending batches fail
+
+    def __init__(self, dane_handler: DANEHandler):
+        self.dane_handler = dane_handler
+        self._lock = threading.Lock()
+        self._done_events: Dict[int, threading.Event] = {}  # of the pending batches
+        # per pending batch, so its tasks are fetched incrementally (see _update_task_table)
+        self._task_tables: Dict[int, TaskTable] = {}
+        self._failed_proc_batch_ids: Set[int] = set()  # released without being done
+        self._thread: Optional[threading.Thread] = None
+
+    # starts monitoring the batch (if not already) and returns its completion event
+    def watch(self, proc_batch_id: int) -> threading.Event:
+        with self._lock:
+            if proc_batch_id not in self._done_events:
+                logger.info(f"Adding proc_batch {proc_batch_id} to the monitor")
+                self._done_events[proc_batch_id] = threading.Event()
+                self._task_tables[proc_batch_id] = TaskTable()
+            if self._thread is None:  # the thread stops when there is nothing to do
+                self._thread = threading.Thread(
+                    target=self._run, name="DANEBatchMonitor", daemon=True
+                )
+                self._thread.start()
+            return self._done_events[proc_batch_id]
+
+    # blocks until the batch is done, returns False on timeout or if the monitor failed
+    def wait_until_done(
+        self, proc_batch_id: int, timeout: Optional[float] = None
+    ) -> bool:
+        done = self.watch(proc_batch_id).wait(timeout)
+        with self._lock:
+            if proc_batch_id in self._failed_proc_batch_ids:
+                self._failed_proc_batch_ids.discard(proc_batch_id)
+                return False
+        return done
+
+    def get_pending_proc_batch_ids(self) -> List[int]:
+        with self._lock:
+            return list(self._done_events.keys())
+
+    def _run(self):
+        try:
+            self._monitor_pending_batches()
+        except Exception:
+            logger.exception("The DANE batch monitor failed")
+        finally:
+            self._release_pending_batches()
+
+    def _monitor_pending_batches(self):
+        handler = self.dane_handler
+        interval = min(
+            max(handler.MONITOR_INTERVAL, handler.MONITOR_INTERVAL_MIN),
+            handler.MONITOR_INTERVAL_MAX,
+        )
+        last_state_counts = None
+        failed_ticks = 0
+        while True:
+            try:
+                state_counts = self.tick()
+            except Exception:  # e.g. ES is (temporarily) unavailable
+                logger.exception("Monitoring the DANE batches failed")
+                state_counts = None
+
+            # a failed query (None) counts as a failed tick as well
+            if state_counts is None:
+                failed_ticks += 1
+                if failed_ticks >= self.MAX_FAILED_TICKS:
+                    logger.error(f"Monitoring failed {failed_ticks}x, giving up")
+                    return  # the pending batches are released as failed
+                logger.warning(f"Monitoring failed ({failed_ticks}x), retrying")
+            else:
+                failed_ticks = 0
+            with self._lock:
+                if not self._done_events:
+                    logger.info("No more batches to monitor, stopping the monitor")
+                    self._thread = None
+                    return
+
+            # same adaptive interval as DANEHandler.monitor_batch, over all batches
+            if last_state_counts is not None and state_counts is not None:
+                interval = handler._next_monitor_interval(
+                    interval,
+                    state_counts != last_state_counts,
+                    handler._get_fraction_done(sum(state_counts.values(), Counter())),
+                )
+            last_state_counts = state_counts
+            sleep(handler._add_jitter(interval))
+
+    # if this thread stops with batches still pending (i.e. it failed), their waiters are
+    # released (see wait_until_done), and a next watch() starts a new thread
+    def _release_pending_batches(self):
+        with self._lock:
+            if self._thread is not threading.current_thread():
+                return  # stopped normally (and possibly replaced already)
+            self._thread = None
+            for proc_batch_id, done_event in self._done_events.items():
+                logger.error(f"Stopped monitoring proc_batch {proc_batch_id}")
+                self._failed_proc_batch_ids.add(proc_batch_id)
+                done_event.set()
+            self._done_events = {}
+            self._task_tables = {}
+
+    # checks all pending batches with one query and sets the events of the finished ones
+    def tick(self) -> Optional[Dict[int, Counter]]:
+        with self._lock:
+            task_tables = dict(self._task_tables)
+        proc_batch_ids = list(task_tables.keys())
+        if not proc_batch_ids:
+            return {}
+        logger.info(f"Monitoring DANE batches: {proc_batch_ids}")
+        state_counts = self.dane_handler.get_task_state_counts_of_batches(
+            proc_batch_ids
+        )
+        if state_counts is None:
+            return None  # try again next tick
+
+        for proc_batch_id in proc_batch_ids:
+            if self.dane_handler._is_monitored_batch_done(
+                proc_batch_id, state_counts[proc_batch_id], task_tables[proc_batch_id]
+            ):
+                with self._lock:
+                    del self._task_tables[proc_batch_id]
+                    self._done_events.pop(proc_batch_id).set()
+        return state_counts
@@ -0,0 +1,59 @@
+import json
+import logging
+from contextlib import contextmanager
+from typing import Callable, Iterator, List
+
+
+"""
+Helpers to keep logging cheap in the hot paths of a workflow:
+
+- LazyLogArg (e.g. via lazy_json) defers building an expensive log argument until the
+  message is actually emitted, so it costs nothing when its log level is disabled
+- log_aggregated collects per-item messages and logs them as a single message with a
+  count and a few examples, instead of one line per item
+"""
+
+
+# pass this as a %s argument to a logger: func is only called when the message is emitted
+class LazyLogArg(object):
+    def __init__(self, func: Callable, *args, **kwargs):
+        self.func = func
+        self.args = args
+        self.kwargs = kwargs
+
+    def __str__(self):
+        return str(self.func(*self.args, **self.kwargs))
+
+
+# e.g. logger.debug("Query: %s", lazy_json(query))
+def lazy_json(data) -> LazyLogArg:
+    return LazyLogArg(json.dumps, data, indent=4, sort_keys=True, default=str)
+
+
+class AggregatedLog(object):
+    def __init__(self, max_examples: int):
+        self.max_examples = max_examples
+        self.count = 0
+        self.examples: List[str] = []
+
+    def add(self, example):
+        self.count += 1
+        if len(self.examples) < self.max_examples:
+            self.examples.append(str(example))
+
+
+# logs "<count> <msg>, e.g.: <examples>" once, for all items added in the with block
+@contextmanager
+def log_aggregated(
+    logger: logging.Logger, level: int, msg: str, max_examples: int = 5
+) -> Iterator[AggregatedLog]:
+    aggregated_log = AggregatedLog(max_examples)
+    yield aggregated_log
+    if aggregated_log.count > 0 and logger.isEnabledFor(level):
+        logger.log(
+            level,
+            "%d %s, e.g.: %s",
+            aggregated_log.count,
+            msg,
+            ", ".join(aggregated_log.examples),
+        )
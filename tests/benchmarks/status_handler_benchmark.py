@@ -0,0 +1,219 @@
+import os
+import sys
+import json
+import logging
+import tempfile
+from argparse import ArgumentParser
+from time import perf_counter
+from typing import Callable, Dict, List
+from dane_workflows.status import (
+    SQLiteStatusHandler,
+    StatusRow,
+    ProcessingStatus,
+    ErrorCode,
+)
+
+
+"""
+Benchmarks the status queries of the SQLiteStatusHandler (as used by the StatusMonitor)
+on a generated DB, by default of 1M rows, e.g.
+
+    python tests/benchmarks/status_handler_benchmark.py --rows 1000000
+
+The completed source batches are also computed straight from status_rows, the way it
+was done before the status count tables existed (GROUP_CONCAT of the statuses plus a
+substring check), to compare against & to verify the results.
+"""
+
+
+# all but the last running_batches source batches are completed (FINISHED or ERROR)
+def generate_source_batch(
+    source_batch_id: int, source_batch_size: int, proc_batch_size: int, running: bool
+) -> List[StatusRow]:
+    status_rows = []
+    for i in range(
+        source_batch_id * source_batch_size, (source_batch_id + 1) * source_batch_size
+    ):
+        if running:
+            status = ProcessingStatus.NEW if i % 2 else ProcessingStatus.PROCESSING
+        else:
+            status = (
+                ProcessingStatus.ERROR if i % 20 == 0 else ProcessingStatus.FINISHED
+            )
+        status_rows.append(
+            StatusRow(
+                target_id=f"id_{i}",
+                target_url=f"https://item_{i}",
+                status=status,
+                source_batch_id=source_batch_id,
+                source_batch_name=f"source_batch_{source_batch_id}",
+                source_extra_info=f"genre_{i % 10}",
+                proc_batch_id=i // proc_batch_size,
+                proc_id=None,
+                proc_status_msg=None,
+                proc_error_code=ErrorCode.IMPOSSIBLE
+                if status == ProcessingStatus.ERROR
+                else None,
+            )
+        )
+    return status_rows
+
+
+def fill_db(
+    status_handler: SQLiteStatusHandler,
+    num_rows: int,
+    source_batch_size: int,
+    proc_batch_size: int,
+    running_batches: int,
+):
+    num_source_batches = num_rows // source_batch_size
+    for source_batch_id in range(num_source_batches):
+        running = source_batch_id >= num_source_batches - running_batches
+        status_handler.persist(
+            generate_source_batch(
+                source_batch_id, source_batch_size, proc_batch_size, running
+            )
+        )
+
+
+# how it was computed before: GROUP_CONCAT over all status_rows & substring matching
+def completed_source_batches_by_group_concat(status_handler: SQLiteStatusHandler):
+    with status_handler._connection() as conn:
+        db_rows = conn.execute(
+            "SELECT source_batch_name, GROUP_CONCAT(status) FROM status_rows "
+            "GROUP BY source_batch_name"
+        ).fetchall()
+    completed, uncompleted = [], []
+    for name, statuses in db_rows:
+        if any(
+            str(int(status)) in str(statuses)
+            for status in ProcessingStatus.running_statuses()
+        ):
+            uncompleted.append(name)
+        else:
+            completed.append(name)
+    return completed, uncompleted
+
+
+# the correct (set-based) result, computed from status_rows
+def completed_source_batches_by_scan(status_handler: SQLiteStatusHandler):
+    running_statuses = [s.value for s in ProcessingStatus.running_statuses()]
+    with status_handler._connection() as conn:
+        db_rows = conn.execute(
+            "SELECT source_batch_name, "
+            f"MAX(status IN ({', '.join('?' * len(running_statuses))})) "
+            "FROM status_rows GROUP BY source_batch_name",
+            running_statuses,
+        ).fetchall()
+    return (
+        [name for name, running in db_rows if not running],
+        [name for name, running in db_rows if running],
+    )
+
+
+# returns the best time (in seconds) of repeat calls & the result of the last one
+def time_call(func: Callable, repeat: int):
+    best = float("inf")
+    result = None
+    for _ in range(repeat):
+        start = perf_counter()
+        result = func()
+        best = min(best, perf_counter() - start)
+    return best, result
+
+
+def run_benchmark(
+    num_rows: int,
+    source_batch_size: int,
+    proc_batch_size: int,
+    running_batches: int,
+    repeat: int,
+) -> dict:
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        db_file = os.path.join(tmp_dir, "benchmark.db")
+        status_handler = SQLiteStatusHandler(
+            {"STATUS_HANDLER": {"CONFIG": {"DB_FILE": db_file}}}
+        )
+        start = perf_counter()
+        fill_db(
+            status_handler,
+            num_rows,
+            source_batch_size,
+            proc_batch_size,
+            running_batches,
+        )
+        fill_seconds = perf_counter() - start
+
+        last_source_batch_id = status_handler.get_last_source_batch_id()
+        last_proc_batch_id = status_handler.get_last_proc_batch_id()
+        queries: Dict[str, Callable] = {
+            "get_completed_semantic_source_batch_ids": status_handler.get_completed_semantic_source_batch_ids,
+            "completed (GROUP_CONCAT on status_rows)": lambda: completed_source_batches_by_group_concat(
+                status_handler
+            ),
+            "completed (set-based on status_rows)": lambda: completed_source_batches_by_scan(
+                status_handler
+            ),
+            "get_status_counts": status_handler.get_status_counts,
+            "get_error_code_counts": status_handler.get_error_code_counts,
+            "get_status_counts_for_source_batch_id": lambda: status_handler.get_status_counts_for_source_batch_id(
+                last_source_batch_id
+            ),
+            "get_status_counts_for_proc_batch_id": lambda: status_handler.get_status_counts_for_proc_batch_id(
+                last_proc_batch_id
+            ),
+            "get_status_counts_per_extra_info_value": status_handler.get_status_counts_per_extra_info_value,
+            "get_status_snapshot": lambda: status_handler.get_status_snapshot(True),
+        }
+        timings = {}
+        results = {}
+        for name, func in queries.items():
+            timings[name], results[name] = time_call(func, repeat)
+        status_handler.close()
+
+        completed = results["get_completed_semantic_source_batch_ids"]
+        return {
+            "rows": num_rows,
+            "fill_seconds": fill_seconds,
+            "query_seconds": timings,
+            "completed_source_batches": len(completed[0]),
+            "uncompleted_source_batches": len(completed[1]),
+            "matches_status_rows": completed
+            == results["completed (set-based on status_rows)"],
+        }
+
+
+def print_report(report: dict):
+    print(f"\n=== {report['rows']} rows (filled in {report['fill_seconds']:.1f}s) ===")
+    for name, seconds in report["query_seconds"].items():
+        print(f"  {name:<45} {1000 * seconds:>10.2f} ms")
+    print(
+        f"completed source batches: {report['completed_source_batches']}, "
+        f"uncompleted: {report['uncompleted_source_batches']}, "
+        f"matches status_rows: {report['matches_status_rows']}"
+    )
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser(description="Benchmark the SQLiteStatusHandler queries")
+    parser.add_argument("--rows", type=int, default=1000000)
+    parser.add_argument("--source-batch-size", type=int, default=10000)
+    parser.add_argument("--proc-batch-size", type=int, default=1000)
+    parser.add_argument("--running-batches", type=int, default=2)
+    parser.add_argument("--repeat", type=int, default=5, help="best of n calls")
+    parser.add_argument("--json", action="store_true", help="print a JSON report only")
+    parser.add_argument("--log", default="WARNING", help="log level")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=args.log.upper(), stream=sys.stderr)
+    report = run_benchmark(
+        args.rows,
+        args.source_batch_size,
+        args.proc_batch_size,
+        args.running_batches,
+        args.repeat,
+    )
+    if args.json:
+        print(json.dumps(report))
+    else:
+        print_report(report)
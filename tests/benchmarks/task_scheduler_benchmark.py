@@ -0,0 +1,256 @@
+import os
+import sys
+import json
+import logging
+import resource
+import subprocess
+import tempfile
+from argparse import ArgumentParser
+from collections import defaultdict
+from time import perf_counter
+from typing import Dict, List, Optional, Sequence, Type, cast
+from uuid import UUID
+from dane_workflows.data_processing import ExampleDataProcessingEnvironment
+from dane_workflows.data_provider import ExampleDataProvider
+from dane_workflows.exporter import ExampleExporter
+from dane_workflows.status import (
+    InMemoryStatusHandler,
+    SQLiteStatusHandler,
+    StatusHandler,
+    StatusRow,
+    ProcessingStatus,
+)
+from dane_workflows.task_scheduler import TaskScheduler
+
+
+"""
+Benchmarks the full TaskScheduler loop (ExampleDataProvider -> zero latency processing
+environment -> ExampleExporter) at increasing scale, e.g.
+
+    python tests/benchmarks/task_scheduler_benchmark.py --sizes 1000 100000 1000000
+
+By default the SQLiteStatusHandler is used; pass --status-handler memory to use the
+InMemoryStatusHandler instead, i.e. to measure the loop without any status storage I/O.
+
+Each size runs in a fresh process (so the peak RSS is not shared) and reports:
+- items/sec of the whole run
+- the total time spent in each stage of the TaskScheduler (persist is part of them)
+- the bytes written by the process (wchar: all writes, write_bytes: to the storage
+  layer) relative to the final size of the status DB, i.e. the write amplification
+- the peak RSS
+"""
+
+
+# the processing environment immediately reports the batch as processed
+class ZeroLatencyProcessingEnvironment(ExampleDataProcessingEnvironment):
+    def _monitor_batch(self, proc_batch_id: int) -> Optional[List[StatusRow]]:
+        status_rows = self.status_handler.get_status_rows_of_proc_batch(proc_batch_id)
+        if status_rows is not None:
+            for row in status_rows:
+                row.status = ProcessingStatus.PROCESSED
+        return status_rows
+
+
+# generates the items on the fly, so the benchmark data itself hardly takes memory
+class GeneratedItems(object):
+    def __init__(self, num_items: int):
+        self.num_items = num_items
+
+    def __len__(self):
+        return self.num_items
+
+    def __getitem__(self, i: int) -> dict:
+        return {"id": str(UUID(int=i)), "url": f"https://item_{i}"}
+
+
+class BenchmarkDataProvider(ExampleDataProvider):
+    def __init__(self, config, status_handler, unit_test: bool = False):
+        super().__init__(config, status_handler, unit_test)
+        # only len() and indexing are used, so this stands in for the list of items
+        self.data = cast(
+            Sequence[dict],
+            GeneratedItems(config["DATA_PROVIDER"]["CONFIG"]["NUM_ITEMS"]),
+        )
+
+
+# accumulates the time spent in (and the number of calls to) the methods of obj
+def time_stages(obj, method_names: List[str], stage_times: Dict[str, list]):
+    def timed(name, method):
+        def wrapper(*args, **kwargs):
+            start = perf_counter()
+            try:
+                return method(*args, **kwargs)
+            finally:
+                stage_times[name][0] += perf_counter() - start
+                stage_times[name][1] += 1
+
+        return wrapper
+
+    for name in method_names:
+        setattr(obj, name, timed(name, getattr(obj, name)))
+
+
+def read_proc_io() -> Dict[str, int]:
+    try:
+        with open("/proc/self/io") as f:
+            return {k: int(v) for k, v in (line.split(":") for line in f)}
+    except OSError:  # not on Linux
+        return {}
+
+
+def get_db_size(db_file: str) -> int:
+    return sum(
+        os.path.getsize(f)
+        for f in [db_file, f"{db_file}-wal", f"{db_file}-journal"]
+        if os.path.exists(f)
+    )
+
+
+STATUS_HANDLERS: Dict[str, Type[StatusHandler]] = {
+    "sqlite": SQLiteStatusHandler,
+    "memory": InMemoryStatusHandler,
+}
+
+
+def run_benchmark(
+    num_items: int, batch_size: int, source_batch_size: int, status_handler: str
+) -> dict:
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        db_file = os.path.join(tmp_dir, "benchmark.db")
+        status_handler_class = STATUS_HANDLERS[status_handler]
+        config = {
+            "TASK_SCHEDULER": {"BATCH_SIZE": batch_size, "BATCH_LIMIT": -1},
+            "STATUS_HANDLER": {
+                "TYPE": f"dane_workflows.status.{status_handler_class.__name__}",
+                "CONFIG": {"DB_FILE": db_file} if status_handler == "sqlite" else {},
+            },
+            "DATA_PROVIDER": {
+                "TYPE": f"{__name__}.BenchmarkDataProvider",
+                "CONFIG": {
+                    "SOURCE_BATCH_SIZE": source_batch_size,
+                    "NUM_ITEMS": num_items,
+                },
+            },
+            "PROC_ENV": {"TYPE": f"{__name__}.ZeroLatencyProcessingEnvironment"},
+            "EXPORTER": {"TYPE": "dane_workflows.exporter.ExampleExporter"},
+        }
+        task_scheduler = TaskScheduler(
+            config,
+            status_handler_class,
+            BenchmarkDataProvider,
+            ZeroLatencyProcessingEnvironment,
+            ExampleExporter,
+        )
+
+        stage_times: Dict[str, list] = defaultdict(lambda: [0.0, 0])
+        time_stages(task_scheduler.data_provider, ["get_next_batch"], stage_times)
+        time_stages(
+            task_scheduler.data_processing_env,
+            [
+                "register_batch",
+                "process_batch",
+                "monitor_batch",
+                "fetch_results_of_batch",
+            ],
+            stage_times,
+        )
+        time_stages(task_scheduler.exporter, ["export_results"], stage_times)
+        time_stages(task_scheduler.status_handler, ["persist"], stage_times)
+
+        io_before = read_proc_io()
+        start = perf_counter()
+        task_scheduler.run()
+        duration = perf_counter() - start
+        io_after = read_proc_io()
+
+        db_size = get_db_size(db_file)
+        status_counts = task_scheduler.status_handler.get_status_counts() or {}
+        written = {k: io_after[k] - io_before[k] for k in io_after}
+        return {
+            "status_handler": status_handler,
+            "items": num_items,
+            "items_finished": status_counts.get(ProcessingStatus.FINISHED.value, 0),
+            "seconds": duration,
+            "items_per_sec": num_items / duration if duration else 0.0,
+            "stages": {
+                name: {"seconds": t, "calls": c} for name, (t, c) in stage_times.items()
+            },
+            "db_size": db_size,
+            "wchar": written.get("wchar"),
+            "write_bytes": written.get("write_bytes"),
+            "write_amplification": written["wchar"] / db_size
+            if db_size and "wchar" in written
+            else None,
+            "peak_rss_kb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+        }
+
+
+def print_report(report: dict):
+    print(
+        f"\n=== {report['items']} items ({report['items_finished']} finished,"
+        f" {report['status_handler']} status handler) ==="
+    )
+    print(f"total: {report['seconds']:.2f}s, {report['items_per_sec']:.0f} items/sec")
+    for name, stage in report["stages"].items():
+        print(
+            f"  {name:<25} {stage['seconds']:>9.3f}s in {stage['calls']:>7} calls"
+            f" ({1000 * stage['seconds'] / max(stage['calls'], 1):.2f} ms/call)"
+        )
+    print(
+        f"DB size: {report['db_size']} bytes, written: {report['wchar']} bytes"
+        f" (storage: {report['write_bytes']}),"
+        f" write amplification: {report['write_amplification']}"
+    )
+    print(f"peak RSS: {report['peak_rss_kb'] / 1024:.1f} MB")
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser(description="Benchmark the TaskScheduler loop")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 100000, 1000000])
+    parser.add_argument("--batch-size", type=int, default=1000)
+    parser.add_argument("--source-batch-size", type=int, default=10000)
+    parser.add_argument(
+        "--status-handler", choices=list(STATUS_HANDLERS.keys()), default="sqlite"
+    )
+    parser.add_argument("--json", action="store_true", help="print JSON reports only")
+    parser.add_argument("--log", default="WARNING", help="log level")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=args.log.upper(), stream=sys.stderr)
+    if len(args.sizes) == 1:
+        report = run_benchmark(
+            args.sizes[0], args.batch_size, args.source_batch_size, args.status_handler
+        )
+        if args.json:
+            print(json.dumps(report))
+        else:
+            print_report(report)
+        sys.exit()
+
+    # run each size in a separate process, so each reports its own peak RSS
+    for size in args.sizes:
+        output = subprocess.run(
+            [
+                sys.executable,
+                __file__,
+                "--sizes",
+                str(size),
+                "--batch-size",
+                str(args.batch_size),
+                "--source-batch-size",
+                str(args.source_batch_size),
+                "--status-handler",
+                args.status_handler,
+                "--log",
+                args.log,
+                "--json",
+            ],
+            check=True,
+            capture_output=True,
+            text=True,
+        ).stdout
+        report = json.loads(output.strip().splitlines()[-1])
+        if args.json:
+            print(json.dumps(report))
+        else:
+            print_report(report)
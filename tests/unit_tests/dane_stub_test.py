@@ -0,0 +1,103 @@
+import pytest
+from mockito import when, unstub
+from dane_workflows.util import dane_util
+from dane_workflows.util.dane_stub import DANEStub, DANEStubError
+from dane_workflows.util.dane_util import DANEBatchMonitor, DANEHandler, TaskState
+from dane_workflows.status import ProcessingStatus
+from test_util import new_batch
+
+
+@pytest.fixture
+def dane_stub():
+    with DANEStub(dependencies={"ASR": ["DOWNLOAD"]}, seed=42) as stub:
+        yield stub
+
+
+def _dane_handler(dane_data_processing_config, dane_stub, tmp_path, task_id):
+    config = dane_data_processing_config["PROC_ENV"]["CONFIG"]
+    config.update(dane_stub.get_config())
+    config["DANE_STATUS_DIR"] = str(tmp_path)
+    config["DANE_TASK_ID"] = task_id
+    return DANEHandler(config)
+
+
+def _register_and_process_batch(dane_handler: DANEHandler, proc_batch_id: int):
+    batch = new_batch(proc_batch_id, ProcessingStatus.NEW, size=10)
+    for row in batch:
+        row.proc_batch_id = proc_batch_id
+    status_rows = dane_handler.register_batch(proc_batch_id, batch)
+    assert status_rows is not None
+    assert all(row.status == ProcessingStatus.BATCH_REGISTERED for row in status_rows)
+    success, status_code, _ = dane_handler.process_batch(proc_batch_id)
+    assert success and status_code == 200
+    return status_rows
+
+
+def test_process_batch(dane_data_processing_config, dane_stub, tmp_path):
+    dane_handler = _dane_handler(
+        dane_data_processing_config, dane_stub, tmp_path, "ASR"
+    )
+    status_rows = _register_and_process_batch(dane_handler, 1)
+    with when(dane_util).sleep(...).thenReturn(None):
+        tasks = dane_handler.monitor_batch(1)
+    unstub()
+
+    assert len(tasks) == 10
+    assert all(task.state == TaskState.SUCCESS.value for task in tasks)
+    assert {task.doc_id for task in tasks} == {row.proc_id for row in status_rows}
+    results = dane_handler.get_results_of_batch(1)
+    assert {result.task_id for result in results} == {task.id for task in tasks}
+
+    # the dependencies were created & finished as well
+    doc_tasks = dane_handler._get_tasks_of_document(status_rows[0].proc_id)
+    assert sorted(task.key for task in doc_tasks) == ["ASR", "DOWNLOAD"]
+    assert all(task.state == TaskState.SUCCESS.value for task in doc_tasks)
+
+    # registering the same documents to the same batch again fails
+    success, _, response = dane_handler.process_batch(1)
+    assert success and "already assigned" in response
+
+
+def test_process_batch__failed_dependencies(
+    dane_data_processing_config, dane_stub, tmp_path
+):
+    dane_stub.failure_rate = 1.0
+    dane_handler = _dane_handler(
+        dane_data_processing_config, dane_stub, tmp_path, "ASR"
+    )
+    _register_and_process_batch(dane_handler, 1)
+    with when(dane_util).sleep(...).thenReturn(None):
+        tasks = dane_handler.monitor_batch(1)  # should not wait forever
+    unstub()
+
+    assert all(task.state == TaskState.UNFINISHED_DEPENDENCY.value for task in tasks)
+    assert dane_handler.get_results_of_batch(1) == []
+    assert dane_handler.is_proc_batch_done(1)
+
+
+def test_batch_monitor(dane_data_processing_config, dane_stub, tmp_path):
+    dane_stub.task_latency = 0.2
+    dane_handler = _dane_handler(
+        dane_data_processing_config, dane_stub, tmp_path, "DOWNLOAD"
+    )
+    dane_handler.MONITOR_INTERVAL = 0.05  # type: ignore
+    dane_handler.MONITOR_INTERVAL_MIN = 0.05  # type: ignore
+    dane_handler.MONITOR_INTERVAL_MAX = 0.05  # type: ignore
+    for proc_batch_id in [1, 2]:
+        _register_and_process_batch(dane_handler, proc_batch_id)
+
+    batch_monitor = DANEBatchMonitor(dane_handler)
+    done_2 = batch_monitor.watch(2)
+    assert not dane_handler.is_proc_batch_done(1)
+    assert batch_monitor.wait_until_done(1, timeout=10)
+    assert done_2.wait(timeout=10)
+    assert dane_handler.get_task_state_counts_of_batches([1, 2]) == {
+        1: {TaskState.SUCCESS.value: 10},
+        2: {TaskState.SUCCESS.value: 10},
+    }
+
+
+def test_scroll__requires_scroll_id(dane_stub):
+    with pytest.raises(DANEStubError) as e:
+        dane_stub.handle_request("POST", "/_search/scroll", {}, {"scroll": "1m"})
+    assert e.value.status_code == 400
@@ -0,0 +1,514 @@
+import json
+from collections import Counter
+import pytest
+import requests
+from mockito import when, verify, ANY, unstub
+from elasticsearch7 import Elasticsearch
+from dane_workflows.util import dane_util
+from dane_workflows.util.dane_util import DANEHandler, Task, TaskState
+from dane_workflows.util.dane_query_util import tasks_of_batch_query
+
+
+class ResponseMock(object):
+    def __init__(self, status_code: int, data):
+        self.status_code = status_code
+        self.text = json.dumps(data)
+
+
+@pytest.fixture
+def dane_handler(dane_data_processing_config):
+    with when(Elasticsearch).ping().thenReturn(True):
+        yield DANEHandler(dane_data_processing_config["PROC_ENV"]["CONFIG"])
+    unstub()
+
+
+def _dane_api_task(task_id: str, key: str, state: TaskState) -> dict:
+    return {
+        "_id": task_id,
+        "key": key,
+        "state": str(state.value),
+        "msg": state.name,
+        "priority": 1,
+        "created_at": "2022-10-26T10:26:35",
+        "updated_at": "2022-10-26T10:26:35",
+    }
+
+
+def _task(doc_id: str, state: TaskState) -> Task:
+    return Task(
+        f"task_{doc_id}",
+        state.name,
+        state.value,
+        1,
+        "DOWNLOAD",
+        "2022-10-26T10:26:35",
+        "2022-10-26T10:26:35",
+        doc_id,
+    )
+
+
+def test_session__pooled_connections(dane_data_processing_config):
+    dane_data_processing_config["PROC_ENV"]["CONFIG"]["DANE_HTTP_POOL_SIZE"] = 4
+    with when(Elasticsearch).ping().thenReturn(True):
+        dane_handler = DANEHandler(dane_data_processing_config["PROC_ENV"]["CONFIG"])
+    adapter = dane_handler.session.get_adapter(dane_handler.DANE_API)
+    assert adapter._pool_maxsize == 4
+    assert adapter is dane_handler.session.get_adapter("http://another-host")
+
+
+def test_get_tasks_of_documents(dane_handler):
+    doc_ids = [f"doc_{i}" for i in range(25)]
+
+    def get_tasks(url):
+        doc_id = url.split("/")[-2]
+        return ResponseMock(
+            200,
+            [
+                _dane_api_task(f"{doc_id}_asr", "ASR", TaskState.UNFINISHED_DEPENDENCY),
+                _dane_api_task(f"{doc_id}_dl", "BG_DOWNLOAD", TaskState.SUCCESS),
+            ],
+        )
+
+    with when(dane_handler.session).get(ANY).thenAnswer(get_tasks), when(requests).get(
+        ANY
+    ).thenReturn(None):
+        tasks_per_doc = dane_handler._get_tasks_of_documents(doc_ids, "ASR")
+        verify(dane_handler.session, times=len(doc_ids)).get(ANY)
+        verify(requests, times=0).get(ANY)  # only the pooled session is used
+
+    assert list(tasks_per_doc.keys()) == doc_ids
+    for doc_id, tasks in tasks_per_doc.items():
+        assert [t.id for t in tasks] == [f"{doc_id}_dl"]
+        assert tasks[0].doc_id == doc_id
+
+
+def _es_task_hit(doc_id: str, key: str, state: TaskState) -> dict:
+    return {
+        "_id": f"{doc_id}_{key}",
+        "_source": {
+            "task": {
+                "msg": state.name,
+                "state": state.value,
+                "priority": 1,
+                "key": key,
+            },
+            "created_at": "2022-10-26T10:26:35",
+            "updated_at": "2022-10-26T10:26:35",
+            "role": {"name": "task", "parent": doc_id},
+        },
+    }
+
+
+# serves the hits returned by get_hits(query) page by page, like the ES scroll API
+class ScrollMock(object):
+    def __init__(self, get_hits):
+        self.get_hits = get_hits
+        self.scrolls: dict = {}
+        self.cleared: list = []
+
+    def search(self, index, body, scroll, request_timeout):
+        scroll_id = f"scroll_{len(self.scrolls)}"
+        self.scrolls[scroll_id] = (self.get_hits(body), body["size"], 0)
+        return self.scroll(scroll_id, scroll, request_timeout)
+
+    def scroll(self, scroll_id, scroll, request_timeout):
+        hits, size, offset = self.scrolls[scroll_id]
+        self.scrolls[scroll_id] = (hits, size, offset + size)
+        return {"_scroll_id": scroll_id, "hits": {"hits": hits[offset : offset + size]}}
+
+    def clear_scroll(self, scroll_id):
+        self.cleared.append(scroll_id)
+
+
+def _mock_scroll(dane_handler: DANEHandler, scroll_mock: ScrollMock):
+    when(dane_handler.DANE_ES, strict=False).search(
+        index=ANY, body=ANY, scroll=ANY, request_timeout=ANY
+    ).thenAnswer(scroll_mock.search)
+    when(dane_handler.DANE_ES, strict=False).scroll(
+        scroll_id=ANY, scroll=ANY, request_timeout=ANY
+    ).thenAnswer(scroll_mock.scroll)
+    when(dane_handler.DANE_ES, strict=False).clear_scroll(scroll_id=ANY).thenAnswer(
+        scroll_mock.clear_scroll
+    )
+
+
+@pytest.mark.parametrize(
+    ("num_tasks", "page_size", "num_scrolls"),
+    [(0, 200, 0), (199, 200, 0), (200, 200, 1), (450, 200, 2), (1000, 10, 100)],
+)
+def test_get_tasks_of_batch(dane_handler, num_tasks, page_size, num_scrolls):
+    dane_handler.DANE_ES_PAGE_SIZE = page_size
+    scroll_mock = ScrollMock(
+        lambda query: [
+            _es_task_hit(f"doc_{i}", "DOWNLOAD", TaskState.SUCCESS)
+            for i in range(num_tasks)
+        ]
+    )
+    _mock_scroll(dane_handler, scroll_mock)
+
+    tasks_of_batch = dane_handler.get_tasks_of_batch(0)
+
+    assert [t.doc_id for t in tasks_of_batch] == [f"doc_{i}" for i in range(num_tasks)]
+    verify(dane_handler.DANE_ES, times=1).search(
+        index=ANY, body=ANY, scroll=ANY, request_timeout=ANY
+    )
+    verify(dane_handler.DANE_ES, times=num_scrolls).scroll(
+        scroll_id=ANY, scroll=ANY, request_timeout=ANY
+    )
+    assert scroll_mock.cleared == ["scroll_0"]
+
+
+def test_get_tasks_of_documents_from_index(dane_handler):
+    doc_ids = [f"doc_{i}" for i in range(1200)]
+
+    # each document has a single dependency (the leaf task is omitted by the query)
+    def get_hits(query):
+        parent_query = query["query"]["bool"]["must"][0]["has_parent"]["query"]
+        return [
+            _es_task_hit(doc_id, "BG_DOWNLOAD", TaskState.SUCCESS)
+            for doc_id in parent_query["ids"]["values"]
+        ]
+
+    _mock_scroll(dane_handler, ScrollMock(get_hits))
+    tasks_per_doc = dane_handler._get_tasks_of_documents_from_index(doc_ids, "ASR")
+
+    # one query per chunk of (at most 500) documents
+    verify(dane_handler.DANE_ES, times=3).search(
+        index=ANY, body=ANY, scroll=ANY, request_timeout=ANY
+    )
+    assert len(tasks_per_doc) == len(doc_ids)
+    assert all(
+        [t.doc_id for t in tasks] == [doc_id] for doc_id, tasks in tasks_per_doc.items()
+    )
+
+
+@pytest.mark.parametrize(
+    ("dependency_states", "deps_ok"),
+    [
+        ([TaskState.QUEUED, TaskState.QUEUED], True),
+        ([TaskState.ERROR, TaskState.QUEUED], True),
+        ([TaskState.ERROR, TaskState.NOT_FOUND], False),
+    ],
+)
+@pytest.mark.parametrize("index_available", [True, False])
+def test_check_unfinished_dependencies_ok(
+    dane_handler, dependency_states, deps_ok, index_available
+):
+    tasks_of_batch = [
+        _task(f"doc_{i}", TaskState.UNFINISHED_DEPENDENCY)
+        for i in range(len(dependency_states))
+    ]
+    tasks_per_doc = {
+        t.doc_id: [_task(t.doc_id, dependency_states[i])]
+        for i, t in enumerate(tasks_of_batch)
+    }
+    with when(dane_handler)._get_tasks_of_documents_from_index(
+        ANY, "DOWNLOAD"
+    ).thenReturn(tasks_per_doc if index_available else None), when(
+        dane_handler
+    )._get_tasks_of_documents(
+        ANY, "DOWNLOAD"
+    ).thenReturn(
+        tasks_per_doc
+    ):
+        assert (
+            dane_handler._check_unfinished_dependencies_ok(tasks_of_batch, "DOWNLOAD")
+            is deps_ok
+        )
+        verify(dane_handler, times=1)._get_tasks_of_documents_from_index(
+            ANY, "DOWNLOAD"
+        )
+        # only fall back to calling the DANE API per document when ES fails
+        verify(dane_handler, times=0 if index_available else 1)._get_tasks_of_documents(
+            ANY, "DOWNLOAD"
+        )
+
+
+@pytest.mark.parametrize(
+    ("interval", "states_changed", "fraction_done", "next_interval"),
+    [
+        (10, False, 0.0, 15),  # nothing happened: back off
+        (10, True, 0.0, 10 / 1.5),  # progress: poll more often
+        (50, False, 0.0, 60),  # never longer than the max
+        (2, True, 0.0, 2),  # never shorter than the min
+        (50, False, 0.5, 31),  # nearing completion lowers the max
+        (50, False, 1.0, 2),
+    ],
+)
+def test_next_monitor_interval(
+    dane_handler, interval, states_changed, fraction_done, next_interval
+):
+    dane_handler.MONITOR_INTERVAL_MIN = 2
+    dane_handler.MONITOR_INTERVAL_MAX = 60
+    dane_handler.MONITOR_BACKOFF = 1.5
+    assert dane_handler._next_monitor_interval(
+        interval, states_changed, fraction_done
+    ) == pytest.approx(next_interval)
+
+
+def test_monitor_batch__adaptive_interval(dane_handler):
+    dane_handler.MONITOR_INTERVAL = 4
+    dane_handler.MONITOR_INTERVAL_MIN = 1
+    dane_handler.MONITOR_INTERVAL_MAX = 100
+    dane_handler.MONITOR_BACKOFF = 2
+    dane_handler.MONITOR_JITTER = 0
+    polls = [
+        [TaskState.QUEUED] * 4,
+        [TaskState.QUEUED] * 4,  # unchanged: back off to 8s
+        [TaskState.QUEUED] * 4,  # unchanged: back off to 16s
+        [TaskState.SUCCESS] * 3 + [TaskState.QUEUED],  # changed & nearly done: 8s
+        [TaskState.SUCCESS] * 4,  # done, so no more waiting
+    ]
+    waits = []
+    with when(dane_handler).get_task_state_counts_of_batch(0).thenReturn(
+        None  # the aggregation failed, so the tasks are counted instead
+    ), when(dane_handler).iter_tasks_of_batch(0, updated_since=ANY).thenReturn(
+        *[
+            iter([_task(f"doc_{i}", s) for i, s in enumerate(states)])
+            for states in polls
+        ]
+    ), when(
+        dane_util
+    ).sleep(
+        ANY
+    ).thenAnswer(
+        waits.append
+    ):
+        tasks_of_batch = dane_handler.monitor_batch(0)
+
+    assert waits == [4, 8, 16, 8]
+    assert all(t.state == TaskState.SUCCESS for t in tasks_of_batch)
+
+
+def test_monitor_batch__only_fetches_updated_tasks(dane_handler):
+    dane_handler.MONITOR_JITTER = 0
+    dane_handler.MONITOR_WATERMARK_OVERLAP = 30
+    tasks = [_task(f"doc_{i}", TaskState.QUEUED) for i in range(3)]
+
+    def updated(task: Task, state: TaskState, updated_at: str) -> Task:
+        return Task(task.id, "", state.value, 1, task.key, "", updated_at, task.doc_id)
+
+    with when(dane_handler).get_task_state_counts_of_batch(0).thenReturn(None), when(
+        dane_handler
+    ).iter_tasks_of_batch(0, updated_since=None).thenReturn(iter(tasks)), when(
+        dane_handler
+    ).iter_tasks_of_batch(
+        0, updated_since="2022-10-26T10:30:30"
+    ).thenReturn(
+        iter([])  # the final fetch once the batch is done
+    ), when(
+        dane_handler
+    ).iter_tasks_of_batch(
+        0, updated_since="2022-10-26T10:26:05"
+    ).thenReturn(
+        iter([updated(tasks[0], TaskState.SUCCESS, "2022-10-26T10:30:00")])
+    ), when(
+        dane_handler
+    ).iter_tasks_of_batch(
+        0, updated_since="2022-10-26T10:29:30"
+    ).thenReturn(
+        # the watermark is never moved back
+        iter([updated(tasks[1], TaskState.ERROR, "2022-10-26T10:29:50")]),
+        iter([updated(tasks[2], TaskState.SUCCESS, "2022-10-26T10:31:00")]),
+    ), when(
+        dane_util
+    ).sleep(
+        ANY
+    ).thenReturn(
+        None
+    ):
+        tasks_of_batch = dane_handler.monitor_batch(0)
+        verify(dane_handler, times=1).iter_tasks_of_batch(0, updated_since=None)
+
+    assert {t.doc_id: t.state for t in tasks_of_batch} == {
+        "doc_0": TaskState.SUCCESS.value,
+        "doc_1": TaskState.ERROR.value,
+        "doc_2": TaskState.SUCCESS.value,
+    }
+
+
+def test_tasks_of_batch_query__updated_since():
+    query = tasks_of_batch_query("batch_0", 200, "ASR", updated_since="2022-10-26")
+    assert {"range": {"updated_at": {"gte": "2022-10-26"}}} in query["query"]["bool"][
+        "must"
+    ]
+    query = tasks_of_batch_query("batch_0", 200, "ASR")
+    assert len(query["query"]["bool"]["must"]) == 2
+
+
+def test_get_task_state_counts_of_batch(dane_handler):
+    with when(dane_handler.DANE_ES, strict=False).search(
+        index=ANY, body=ANY, request_timeout=ANY
+    ).thenReturn(
+        {
+            "hits": {"hits": []},
+            "aggregations": {
+                "task_states": {
+                    "buckets": [
+                        {"key": "200", "doc_count": 3},
+                        {"key": 102, "doc_count": 2},
+                    ]
+                }
+            },
+        }
+    ):
+        state_counts = dane_handler.get_task_state_counts_of_batch(0)
+    assert state_counts == {200: 3, 102: 2}
+    assert state_counts[TaskState.CREATED.value] == 0
+
+    with when(dane_handler.DANE_ES, strict=False).search(
+        index=ANY, body=ANY, request_timeout=ANY
+    ).thenRaise(Exception("ES is down")):
+        assert dane_handler.get_task_state_counts_of_batch(0) is None
+
+
+def test_monitor_batch__only_counts_task_states(dane_handler):
+    dane_handler.MONITOR_JITTER = 0
+    tasks = [_task(f"doc_{i}", TaskState.SUCCESS) for i in range(4)]
+    with when(dane_handler).get_task_state_counts_of_batch(0).thenReturn(
+        Counter({TaskState.QUEUED.value: 4}),
+        Counter({TaskState.SUCCESS.value: 3, TaskState.CREATED.value: 1}),
+        Counter({TaskState.SUCCESS.value: 4}),
+    ), when(dane_handler).iter_tasks_of_batch(0, updated_since=None).thenReturn(
+        iter(tasks)
+    ), when(
+        dane_util
+    ).sleep(
+        ANY
+    ).thenReturn(
+        None
+    ):
+        tasks_of_batch = dane_handler.monitor_batch(0)
+        # the tasks themselves are only fetched once the batch is done
+        verify(dane_handler, times=1).iter_tasks_of_batch(0, updated_since=None)
+        verify(dane_util, times=2).sleep(ANY)
+
+    assert tasks_of_batch == tasks
+
+
+def test_monitor_batch__unfinished_dependencies(dane_handler):
+    tasks = [_task("doc_0", TaskState.SUCCESS)] + [
+        _task("doc_1", TaskState.UNFINISHED_DEPENDENCY)
+    ]
+    with when(dane_handler).get_task_state_counts_of_batch(0).thenReturn(
+        Counter(t.state for t in tasks)
+    ), when(dane_handler).iter_tasks_of_batch(0, updated_since=ANY).thenReturn(
+        iter(tasks), iter([])
+    ), when(
+        dane_handler
+    )._check_unfinished_dependencies_ok(
+        tasks, dane_handler.DANE_TASK_ID
+    ).thenReturn(
+        False  # i.e. only waiting for failed dependencies
+    ):
+        tasks_of_batch = dane_handler.monitor_batch(0)
+
+    assert tasks_of_batch == tasks
+
+
+def _es_batch_bucket(proc_batch_name: str, state_counts: dict) -> dict:
+    return {
+        "key": proc_batch_name,
+        "tasks": {
+            "dane_task": {
+                "task_states": {
+                    "buckets": [
+                        {"key": state, "doc_count": count}
+                        for state, count in state_counts.items()
+                    ]
+                }
+            }
+        },
+    }
+
+
+def test_get_task_state_counts_of_batches(dane_handler):
+    with when(dane_handler.DANE_ES, strict=False).search(
+        index=ANY, body=ANY, request_timeout=ANY
+    ).thenReturn(
+        {
+            "aggregations": {
+                "batches": {
+                    "buckets": [
+                        _es_batch_bucket("dummy_1", {200: 3, 102: 1}),
+                        _es_batch_bucket("dummy_2", {500: 4}),
+                    ]
+                }
+            }
+        }
+    ):
+        state_counts = dane_handler.get_task_state_counts_of_batches([1, 2, 3])
+    assert state_counts == {1: {200: 3, 102: 1}, 2: {500: 4}, 3: {}}
+
+
+def test_batch_monitor(dane_handler):
+    batch_monitor = dane_util.DANEBatchMonitor(dane_handler)
+    with when(dane_handler).get_task_state_counts_of_batches(ANY).thenReturn(
+        {1: Counter({TaskState.QUEUED.value: 4}), 2: Counter({200: 4})},
+        {1: Counter({200: 4})},
+    ), when(dane_util).sleep(ANY).thenReturn(None):
+        done_2 = batch_monitor.watch(2)
+        assert batch_monitor.wait_until_done(1, timeout=5) is True
+        assert done_2.is_set()
+        # one query per tick for all batches
+        verify(dane_handler, times=2).get_task_state_counts_of_batches(ANY)
+        assert batch_monitor.get_pending_proc_batch_ids() == []
+
+
+# each batch keeps its TaskTable between ticks, so its tasks are fetched incrementally
+def test_batch_monitor__keeps_task_table_per_batch(dane_handler):
+    batch_monitor = dane_util.DANEBatchMonitor(dane_handler)
+    task_tables = []
+
+    def is_monitored_batch_done(proc_batch_id, state_counts, task_table):
+        task_tables.append(task_table)
+        return len(task_tables) == 2
+
+    when(dane_handler)._is_monitored_batch_done(1, ANY, ANY).thenAnswer(
+        is_monitored_batch_done
+    )
+    with when(dane_handler).get_task_state_counts_of_batches(ANY).thenReturn(
+        {1: Counter({TaskState.UNFINISHED_DEPENDENCY.value: 4})}
+    ), when(dane_util).sleep(ANY).thenReturn(None):
+        assert batch_monitor.wait_until_done(1, timeout=5) is True
+    assert len(task_tables) == 2 and task_tables[0] is task_tables[1]
+    assert batch_monitor._task_tables == {}
+
+
+# a failing tick (e.g. ES is briefly unavailable) is retried on the next interval
+def test_batch_monitor__retries_failed_tick(dane_handler):
+    batch_monitor = dane_util.DANEBatchMonitor(dane_handler)
+    when(dane_handler)._is_monitored_batch_done(1, ANY, ANY).thenRaise(
+        ConnectionError("ES is down")
+    ).thenReturn(True)
+    with when(dane_handler).get_task_state_counts_of_batches(ANY).thenReturn(
+        {1: Counter({200: 4})}
+    ), when(dane_util).sleep(ANY).thenReturn(None):
+        assert batch_monitor.wait_until_done(1, timeout=5) is True
+        verify(dane_handler, times=2).get_task_state_counts_of_batches(ANY)
+
+
+# if the monitor keeps failing, its waiters are released instead of hanging forever
+def test_batch_monitor__releases_waiters_on_failure(dane_handler):
+    batch_monitor = dane_util.DANEBatchMonitor(dane_handler)
+    batch_monitor.MAX_FAILED_TICKS = 3
+    with when(dane_handler).get_task_state_counts_of_batches(ANY).thenRaise(
+        ConnectionError("ES is down")
+    ), when(dane_util).sleep(ANY).thenReturn(None):
+        assert batch_monitor.wait_until_done(1, timeout=5) is False
+        verify(dane_handler, times=3).get_task_state_counts_of_batches(ANY)
+        assert batch_monitor.get_pending_proc_batch_ids() == []
+        assert batch_monitor._thread is None
+
+
+# the aggregation query catches its own errors, a failed (None) result counts as well
+def test_batch_monitor__releases_waiters_on_failed_query(dane_handler):
+    batch_monitor = dane_util.DANEBatchMonitor(dane_handler)
+    batch_monitor.MAX_FAILED_TICKS = 3
+    with when(dane_handler).get_task_state_counts_of_batches(ANY).thenReturn(
+        None
+    ), when(dane_util).sleep(ANY).thenReturn(None):
+        assert batch_monitor.wait_until_done(1, timeout=5) is False
+        verify(dane_handler, times=3).get_task_state_counts_of_batches(ANY)
+        assert batch_monitor.get_pending_proc_batch_ids() == []
+        assert batch_monitor._thread is None
@@ -2,9 +2,14 @@ from mockito import unstub, when, ANY, verify, spy2
 import pytest
 import sys
 
-from dane_workflows.data_processing import ExampleDataProcessingEnvironment
+from elasticsearch7 import Elasticsearch
+from dane_workflows.data_processing import (
+    DANEEnvironment,
+    ExampleDataProcessingEnvironment,
+)
 from dane_workflows.status import ExampleStatusHandler, ProcessingStatus, ErrorCode
 from dane_workflows.util.base_util import import_dane_workflow_class
+from dane_workflows.util.dane_util import Result, Task
 
 from test_util import new_batch
 
@@ -96,6 +101,74 @@ def test_monitor_batch(config, proc_batch_id):
         unstub()
 
 
+@pytest.mark.parametrize(
+    ("num_rows", "chunk_size", "expected_chunk_sizes"),
+    [(5, 2, [2, 2, 1]), (5, 5, [5]), (5, 10, [5]), (0, 2, [])],
+)
+def test_fetch_results_of_batch_stream(
+    config, num_rows, chunk_size, expected_chunk_sizes
+):
+    status_handler = ExampleStatusHandler(config)
+    dpe = ExampleDataProcessingEnvironment(config, status_handler)
+    with when(status_handler).get_status_rows_of_proc_batch(0).thenReturn(
+        new_batch(0, ProcessingStatus.PROCESSED, None, num_rows) if num_rows else None
+    ), when(status_handler).persist_or_die(ANY).thenReturn():
+        chunks = list(dpe.fetch_results_of_batch_stream(0, chunk_size))
+
+        assert [len(chunk) for chunk in chunks] == expected_chunk_sizes
+        assert all(
+            r.status_row.status == ProcessingStatus.RESULTS_FETCHED
+            for chunk in chunks
+            for r in chunk
+        )
+        # the status of each chunk is persisted before it is handed over
+        verify(status_handler, times=len(expected_chunk_sizes)).persist_or_die(ANY)
+
+
+def test_fetch_results_of_batch_stream__dane(dane_data_processing_config):
+    status_handler = ExampleStatusHandler(dane_data_processing_config)
+    with when(Elasticsearch).ping().thenReturn(True):
+        dpe = DANEEnvironment(dane_data_processing_config, status_handler)
+
+    status_rows = new_batch(0, ProcessingStatus.PROCESSED, None, 5)
+    for row in status_rows:
+        row.proc_id = f"doc_{row.target_id}"
+    tasks = [
+        Task(f"task_{row.proc_id}", "", 200, 1, "DOWNLOAD", "", "", row.proc_id)
+        for row in status_rows
+    ]
+    results = [  # no result for the last document, one for an unknown task
+        Result(f"result_{t.id}", {}, {"doc": t.doc_id}, "", "", t.id, None)
+        for t in tasks[:-1]
+    ] + [Result("result_x", {}, {}, "", "", "task_unknown", None)]
+
+    with when(status_handler).get_status_rows_of_proc_batch(0).thenReturn(
+        status_rows
+    ), when(status_handler).persist_or_die(ANY).thenReturn(), when(
+        dpe.dane_handler
+    ).iter_tasks_of_batch(
+        0
+    ).thenReturn(
+        iter(tasks)
+    ), when(
+        dpe.dane_handler
+    ).iter_results_of_batch(
+        0
+    ).thenReturn(
+        iter(results)
+    ):
+        chunks = list(dpe.fetch_results_of_batch_stream(0, 3))
+
+    assert [len(chunk) for chunk in chunks] == [3, 1]
+    for chunk in chunks:
+        for processing_result in chunk:
+            row = processing_result.status_row
+            assert processing_result.result_data == {"doc": row.proc_id}
+            assert row.status == ProcessingStatus.RESULTS_FETCHED
+    assert status_rows[-1].status == ProcessingStatus.PROCESSED
+    unstub()
+
+
 @pytest.mark.parametrize(
     ("conf_number", "output"),
     (
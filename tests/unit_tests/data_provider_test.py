@@ -1,9 +1,15 @@
+import time
 import pytest
 from mockito import unstub, when, verify, ARGS
-from dane_workflows.data_provider import ExampleDataProvider
+from dane_workflows.data_provider import (
+    ExampleDataProvider,
+    ExampleStreamingDataProvider,
+    SourceBatchPrefetcher,
+)
 from dane_workflows.status import (
     ExampleStatusHandler,
     ProcessingStatus,
+    SQLiteStatusHandler,
 )
 from test_util import new_batch
 
@@ -57,3 +63,129 @@ def test_get_next_batch(config, status_rows, proc_batch_id, batch_size, success)
         # verify(dp, times=2).get_next_batch(proc_batch_id, batch_size, True)
     finally:
         unstub()
+
+
+@pytest.mark.parametrize("prefetch_source_batches", [1, 3])
+def test_get_next_batch_prefetched(config, prefetch_source_batches):
+    try:
+        config["DATA_PROVIDER"]["CONFIG"][
+            "PREFETCH_SOURCE_BATCHES"
+        ] = prefetch_source_batches
+        status_handler = ExampleStatusHandler(config)
+        status_handler.set_current_source_batch(
+            new_batch(0, ProcessingStatus.NEW, size=10)
+        )
+        when(status_handler).persist(*ARGS).thenReturn(True)
+
+        dp = ExampleDataProvider(config, status_handler)
+        dp.data = [{"id": f"id_{i}", "url": f"https://{i}"} for i in range(25)]
+        dp.SOURCE_BATCH_SIZE = 10
+
+        # the first proc_batch (of source batch 0) starts prefetching source batch 1
+        assert len(dp.get_next_batch(0, 10)) == 10
+        status_handler.update_status_rows(
+            status_handler.get_current_source_batch(), status=ProcessingStatus.FINISHED
+        )
+
+        # then source batch 1 & 2 are taken from the prefetcher
+        rows = dp.get_next_batch(1, 10)
+        assert [row.target_id for row in rows] == [f"id_{i}" for i in range(10, 20)]
+        assert status_handler.get_cur_source_batch_id() == 1
+        status_handler.update_status_rows(rows, status=ProcessingStatus.FINISHED)
+
+        rows = dp.get_next_batch(2, 10)
+        assert [row.target_id for row in rows] == [f"id_{i}" for i in range(20, 25)]
+        status_handler.update_status_rows(rows, status=ProcessingStatus.FINISHED)
+
+        assert dp.get_next_batch(3, 10) is None  # no more data
+        dp.close()
+    finally:
+        unstub()
+
+
+def test_prefetcher_holds_max_ahead():
+    fetched = []
+
+    def fetch(source_batch_id):
+        fetched.append(source_batch_id)
+        return new_batch(source_batch_id, ProcessingStatus.NEW, size=1)
+
+    prefetcher = SourceBatchPrefetcher(fetch, 2)
+    prefetcher.prefetch(1)
+    for _ in range(100):  # the thread blocks on the full queue
+        if len(fetched) == 3:  # 2 in the queue, 1 waiting for space
+            break
+        time.sleep(0.01)
+    time.sleep(0.05)
+    assert fetched == [1, 2, 3]
+
+    assert prefetcher.get(1)[0].target_id == "1"  # new_batch uses the id as offset
+    assert prefetcher.get(2)[0].target_id == "2"
+
+    # asking for another source batch restarts the prefetching from there
+    assert prefetcher.get(7)[0].target_id == "7"
+    prefetcher.stop()
+
+
+def test_prefetcher_falls_back_on_error():
+    calls = []
+
+    def fetch(source_batch_id):
+        calls.append(source_batch_id)
+        if len(calls) == 1:
+            raise ConnectionError("source catalogue unavailable")
+        return new_batch(source_batch_id, ProcessingStatus.NEW, size=1)
+
+    prefetcher = SourceBatchPrefetcher(fetch, 1)
+    assert prefetcher.get(1)[0].target_id == "1"  # fetched again synchronously
+    assert calls == [1, 1]
+    prefetcher.stop()
+
+
+def _streaming_data_provider(config, db_file, num_items):
+    config["STATUS_HANDLER"]["CONFIG"] = {"DB_FILE": str(db_file)}
+    config["DATA_PROVIDER"]["CONFIG"]["DATA"] = [
+        {"id": f"id_{i}", "url": f"https://{i}"} for i in range(num_items)
+    ]
+    status_handler = SQLiteStatusHandler(config)
+    dp = ExampleStreamingDataProvider(config, status_handler)
+    status_handler.recover(dp)
+    return dp, status_handler
+
+
+def test_streaming_get_next_batch(config, tmp_path):
+    dp, status_handler = _streaming_data_provider(config, tmp_path / "stream.db", 25)
+    try:
+        for proc_batch_id, expected in enumerate([range(0, 10), range(10, 20)]):
+            rows = dp.get_next_batch(proc_batch_id, 10)
+            assert [row.target_id for row in rows] == [f"id_{i}" for i in expected]
+            assert all(row.source_batch_id == proc_batch_id for row in rows)
+            assert all(row.status == ProcessingStatus.BATCH_ASSIGNED for row in rows)
+            assert status_handler.get_source_batch_cursor(proc_batch_id) == str(
+                expected[-1]
+            )
+
+        rows = dp.get_next_batch(2, 10)  # the rest of the stream
+        assert [row.target_id for row in rows] == [f"id_{i}" for i in range(20, 25)]
+        assert dp.get_next_batch(3, 10) is None
+        assert len(status_handler.get_status_rows_of_source_batch(1)) == 10
+    finally:
+        status_handler.close()
+
+
+def test_streaming_resumes_from_persisted_cursor(config, tmp_path):
+    db_file = tmp_path / "stream.db"
+    dp, status_handler = _streaming_data_provider(config, db_file, 25)
+    dp.get_next_batch(0, 10)
+    dp.get_next_batch(1, 7)
+    status_handler.close()
+
+    # after a restart, the stream continues right after the last source batch
+    dp, status_handler = _streaming_data_provider(config, db_file, 25)
+    try:
+        assert status_handler.get_cur_source_batch_id() == 1
+        rows = dp.get_next_batch(2, 10)
+        assert [row.target_id for row in rows] == [f"id_{i}" for i in range(17, 25)]
+        assert rows[0].source_batch_id == 2
+    finally:
+        status_handler.close()
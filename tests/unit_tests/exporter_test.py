@@ -1,5 +1,10 @@
-from dane_workflows.status import ExampleStatusHandler
+import pytest
+from mockito import when, verify, ANY
+from dane_workflows.exporter import ExampleExporter
+from dane_workflows.data_processing import ProcessingResult
+from dane_workflows.status import ExampleStatusHandler, ProcessingStatus
 from dane_workflows.util.base_util import import_dane_workflow_class
+from test_util import new_batch
 
 
 def test_get_pretty_config(example_exporter_config):
@@ -9,3 +14,25 @@ def test_get_pretty_config(example_exporter_config):
     )
     exporter = exporter_class(example_exporter_config, status_handler)
     assert exporter.get_pretty_config() == {}
+
+
+@pytest.mark.parametrize(
+    ("chunk_results", "success", "num_exports"),
+    [
+        ([True, True, True], True, 3),
+        ([True, False, True], False, 2),  # stops at the first failing chunk
+        ([], False, 0),  # nothing to export
+    ],
+)
+def test_export_results_stream(
+    example_exporter_config, chunk_results, success, num_exports
+):
+    status_handler = ExampleStatusHandler(example_exporter_config)
+    exporter = ExampleExporter(example_exporter_config, status_handler)
+    chunks = [
+        [ProcessingResult(row, {}, {}) for row in new_batch(i, ProcessingStatus.NEW)]
+        for i in range(len(chunk_results))
+    ]
+    with when(exporter).export_results(ANY).thenReturn(*chunk_results):
+        assert exporter.export_results_stream(iter(chunks)) is success
+        verify(exporter, times=num_exports).export_results(ANY)
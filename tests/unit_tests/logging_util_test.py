@@ -0,0 +1,26 @@
+import logging
+from dane_workflows.util.logging_util import LazyLogArg, lazy_json, log_aggregated
+
+
+logger = logging.getLogger(__name__)
+
+
+def test_lazy_log_arg(caplog):
+    calls: list = []
+    with caplog.at_level(logging.INFO, logger=__name__):
+        logger.debug("%s", LazyLogArg(calls.append, "not called"))
+        assert calls == []
+        logger.info("%s", lazy_json({"b": 1, "a": [2]}))
+    assert caplog.messages == ['{\n    "a": [\n        2\n    ],\n    "b": 1\n}']
+
+
+def test_log_aggregated(caplog):
+    with caplog.at_level(logging.INFO, logger=__name__):
+        with log_aggregated(logger, logging.WARNING, "items failed", 2) as log:
+            for i in range(5):
+                log.add(f"item_{i}")
+        with log_aggregated(logger, logging.WARNING, "items failed") as log:
+            pass  # nothing to log
+        with log_aggregated(logger, logging.DEBUG, "items failed") as log:
+            log.add("item_0")  # the log level is disabled
+    assert caplog.messages == ["5 items failed, e.g.: item_0, item_1"]
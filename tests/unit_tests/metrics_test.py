@@ -0,0 +1,151 @@
+import socket
+import sys
+import pytest
+from mockito import when, verify
+from dane_workflows import metrics as metrics_module
+from dane_workflows.metrics import (
+    NoopMetrics,
+    PrometheusMetrics,
+    StatsDMetrics,
+    get_metrics,
+    set_metrics,
+)
+from dane_workflows.task_scheduler import TaskScheduler
+from dane_workflows.data_provider import ExampleDataProvider
+from dane_workflows.data_processing import ExampleDataProcessingEnvironment
+from dane_workflows.exporter import ExampleExporter
+from dane_workflows.status import ExampleStatusHandler, ProcessingStatus
+from dane_workflows.util import dane_util
+from dane_workflows.util.dane_stub import DANEStub
+from dane_workflows.util.dane_util import DANEHandler
+from test_util import new_batch
+
+
+@pytest.fixture
+def prometheus_metrics(config):
+    metrics = PrometheusMetrics(config)
+    set_metrics(metrics)
+    yield metrics
+    set_metrics(NoopMetrics({}))
+
+
+def test_noop_metrics_by_default():
+    assert isinstance(get_metrics(), NoopMetrics)
+    assert get_metrics().enabled is False
+
+
+@pytest.mark.parametrize(
+    ("metrics_config", "success"),
+    [
+        ({}, True),
+        ({"PREFIX": "wf", "OUTPUT_FILE": "metrics.prom"}, True),
+        ({"PREFIX": 1}, False),
+        ({"OUTPUT_FILE": True}, False),
+    ],
+)
+def test_validate_config(config, metrics_config, success):
+    config["METRICS"] = {"TYPE": "PrometheusMetrics", "CONFIG": metrics_config}
+    with when(sys).exit().thenReturn():
+        PrometheusMetrics(config)
+        verify(sys, times=0 if success else 1).exit()
+
+
+def test_prometheus_metrics(config, tmp_path):
+    output_file = str(tmp_path / "metrics.prom")
+    config["METRICS"] = {"CONFIG": {"PREFIX": "wf", "OUTPUT_FILE": output_file}}
+    metrics = PrometheusMetrics(config)
+    metrics.observe("persist", 0.5)
+    metrics.observe("persist", 1.5)
+    metrics.increment("steps", labels={"step": "register", "success": "true"})
+    metrics.increment("steps", 2, {"step": "register", "success": "true"})
+    metrics.set_gauge("items", 10, {"status": 'NEW"'})
+    metrics.set_gauge("items", 5, {"status": 'NEW"'})
+    metrics.flush()
+
+    with open(output_file) as f:
+        assert f.read() == (
+            "# TYPE wf_items gauge\n"
+            'wf_items{status="NEW\\""} 5\n'
+            "# TYPE wf_persist_seconds summary\n"
+            "wf_persist_seconds_count 2\n"
+            "wf_persist_seconds_sum 2.0\n"
+            "# TYPE wf_steps_total counter\n"
+            'wf_steps_total{step="register",success="true"} 3\n'
+        )
+
+
+def test_statsd_metrics(config):
+    with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as daemon:
+        daemon.bind(("127.0.0.1", 0))
+        daemon.settimeout(5)
+        config["METRICS"] = {
+            "CONFIG": {"HOST": "127.0.0.1", "PORT": daemon.getsockname()[1]}
+        }
+        metrics = StatsDMetrics(config)
+        with when(metrics_module).perf_counter().thenReturn(1.0, 1.25):
+            with metrics.timer("persist"):
+                pass
+        metrics.increment("steps", labels={"step": "export", "success": "true"})
+        metrics.set_gauge("items", 3)
+
+        assert [daemon.recv(1024).decode("utf-8") for _ in range(3)] == [
+            "dane_workflows.persist:250.000|ms",
+            "dane_workflows.steps:1|c|#step:export,success:true",
+            "dane_workflows.items:3|g",
+        ]
+
+
+def test_run_proc_batch__step_metrics(config, prometheus_metrics):
+    task_scheduler = TaskScheduler(
+        config,
+        ExampleStatusHandler,
+        ExampleDataProvider,
+        ExampleDataProcessingEnvironment,
+        ExampleExporter,
+        unit_test=True,
+    )
+    proc_batch = new_batch(0, ProcessingStatus.BATCH_ASSIGNED)
+    proc_env = task_scheduler.data_processing_env
+    with when(proc_env).process_batch(0).thenReturn(proc_batch), when(
+        proc_env
+    ).monitor_batch(0).thenReturn(proc_batch), when(
+        task_scheduler.data_processing_env
+    ).fetch_results_of_batch(
+        0
+    ).thenReturn(
+        None  # fails the fetch step
+    ):
+        assert task_scheduler._run_proc_batch(proc_batch, 0) is False
+
+    text = prometheus_metrics.to_text()
+    for step in ["register", "process", "monitor"]:
+        assert f'dane_workflows_steps_total{{step="{step}",success="true"}} 1' in text
+        assert f'dane_workflows_step_duration_seconds_count{{step="{step}"}} 1' in text
+    assert 'dane_workflows_step_duration_seconds_count{step="fetch"} 1' in text
+    assert "dane_workflows_persist_seconds_count" in text
+
+
+def test_dane_handler_metrics(
+    dane_data_processing_config, prometheus_metrics, tmp_path
+):
+    with DANEStub() as dane_stub:
+        config = dane_data_processing_config["PROC_ENV"]["CONFIG"]
+        config.update(dane_stub.get_config())
+        config["DANE_STATUS_DIR"] = str(tmp_path)
+        dane_handler = DANEHandler(config)
+        batch = new_batch(0, ProcessingStatus.BATCH_ASSIGNED, size=5)
+        for row in batch:
+            row.proc_batch_id = 0
+        dane_handler.register_batch(0, batch)
+        dane_handler.process_batch(0)
+        with when(dane_util).sleep(...).thenReturn(None):
+            dane_handler.monitor_batch(0)
+
+    text = prometheus_metrics.to_text()
+    for endpoint in ["documents", "task"]:
+        assert (
+            f'dane_workflows_dane_http_requests_total{{endpoint="{endpoint}",method="POST",status="200"}} 1'
+            in text
+        )
+    for query in ["task_states_of_batch", "tasks_of_batch"]:
+        assert f'dane_workflows_es_query_seconds_count{{query="{query}"}}' in text
@@ -385,10 +385,19 @@ def test_monitor_status(config, include_extra_info):
     dummy_satus_report = {"dummy-error-key": "dummy-error-value"}
     dummy_formatted_status_info = "dummy formatted info"
     dummy_formatted_status_report = "dummy formatted error report"
+    dummy_snapshot = status_handler.get_status_snapshot(include_extra_info)
 
-    with when(status_monitor)._check_status().thenReturn(dummy_status), when(
+    with when(status_handler).get_status_snapshot(
+        include_extra_info=include_extra_info
+    ).thenReturn(dummy_snapshot), when(status_monitor)._check_status(
+        dummy_snapshot
+    ).thenReturn(
+        dummy_status
+    ), when(
         status_monitor
-    )._get_detailed_status_report(include_extra_info=include_extra_info).thenReturn(
+    )._get_detailed_status_report(
+        include_extra_info=include_extra_info, snapshot=dummy_snapshot
+    ).thenReturn(
         dummy_satus_report
     ), when(
         status_monitor
@@ -410,10 +419,13 @@ def test_monitor_status(config, include_extra_info):
 
         status_monitor.monitor_status()
 
-        verify(status_monitor, times=1)._check_status()
-        verify(status_monitor, times=1)._get_detailed_status_report(
+        verify(status_handler, times=1).get_status_snapshot(
             include_extra_info=include_extra_info
         )
+        verify(status_monitor, times=1)._check_status(dummy_snapshot)
+        verify(status_monitor, times=1)._get_detailed_status_report(
+            include_extra_info=include_extra_info, snapshot=dummy_snapshot
+        )
         verify(status_monitor, times=1)._format_status_info(dummy_status)
         verify(status_monitor, times=1)._format_status_report(dummy_satus_report)
         verify(status_monitor, times=1)._send_status(
@@ -1,12 +1,17 @@
+import sys
 import time
+from datetime import datetime
 import os
+import sqlite3
 from os import sep
 import pytest
+from typing import Optional
 
 from mockito import unstub, when, verify, spy2, ANY
 from test_util import new_batch
 from dane_workflows.status import (
     ExampleStatusHandler,
+    InMemoryStatusHandler,
     SQLiteStatusHandler,
     StatusRow,
     ProcessingStatus,
@@ -33,7 +38,36 @@ def test_set_current_source_batch(config):
 def test_get_sb_status_rows_of_type(config):
     try:
         status_handler = ExampleStatusHandler(config)
-        assert status_handler is not None
+        status_handler.set_current_source_batch(
+            new_batch(0, ProcessingStatus.NEW, None, 10)
+        )
+        first_rows = status_handler.get_sb_status_rows_of_type(ProcessingStatus.NEW, 4)
+        assert [row.target_id for row in first_rows] == ["0", "1", "2", "3"]
+
+        # rows updated via update_status_rows() move to the bucket of their new status
+        status_handler.update_status_rows(
+            first_rows, status=ProcessingStatus.BATCH_ASSIGNED
+        )
+        next_rows = status_handler.get_sb_status_rows_of_type(ProcessingStatus.NEW, 4)
+        assert [row.target_id for row in next_rows] == ["4", "5", "6", "7"]
+        assert (
+            status_handler.get_sb_status_rows_of_type(
+                ProcessingStatus.BATCH_ASSIGNED, 100
+            )
+            == first_rows
+        )
+
+        # rows whose status was changed directly are still handled correctly
+        next_rows[0].status = ProcessingStatus.ERROR
+        last_rows = status_handler.get_sb_status_rows_of_type(ProcessingStatus.NEW, 4)
+        assert [row.target_id for row in last_rows] == ["5", "6", "7", "8"]
+        assert status_handler.get_sb_status_rows_of_type(ProcessingStatus.ERROR, 4) == [
+            next_rows[0]
+        ]
+        assert (
+            status_handler.get_sb_status_rows_of_type(ProcessingStatus.FINISHED, 4)
+            is None
+        )
     finally:
         unstub()
 
@@ -84,29 +118,52 @@ def test_persist__input_types(config, status_rows, success):
         status_handler = ExampleStatusHandler(config)
         spy2(status_handler._persist)
         spy2(status_handler._update_status_rows_modification_date)
+        spy2(status_handler._sync_current_source_batch)
         spy2(status_handler._recover_source_batch)
         assert status_handler.persist(status_rows) is success
         verify(status_handler, times=1 if success else 0)._persist(ANY)
         verify(
             status_handler, times=1 if success else 0
         )._update_status_rows_modification_date(ANY)
-        verify(status_handler, times=1 if success else 0)._recover_source_batch()
+        verify(status_handler, times=1 if success else 0)._sync_current_source_batch(
+            ANY
+        )
+        verify(status_handler, times=0)._recover_source_batch()
 
     finally:
         unstub()
 
 
-def test_persist__failed_source_batch_recovery(config):
+def test_persist__failed_persist(config):
     status_handler = ExampleStatusHandler(config)
     status_rows = new_batch(0, ProcessingStatus.NEW, None, 5)
-    with when(status_handler)._recover_source_batch().thenReturn(False):
-        spy2(status_handler._persist)
+    with when(status_handler)._persist(ANY).thenReturn(False):
         spy2(status_handler._update_status_rows_modification_date)
+        spy2(status_handler._sync_current_source_batch)
 
         assert status_handler.persist(status_rows) is False
         verify(status_handler, times=1)._persist(ANY)
         verify(status_handler, times=1)._update_status_rows_modification_date(ANY)
-        verify(status_handler, times=1)._recover_source_batch()
+        verify(status_handler, times=0)._sync_current_source_batch(ANY)
+
+
+# persisted rows replace their counterpart in the current source batch (in place)
+def test_persist__syncs_current_source_batch(config):
+    status_handler = ExampleStatusHandler(config)
+    status_handler.set_current_source_batch(new_batch(0, ProcessingStatus.NEW, None, 5))
+    updated_rows = new_batch(0, ProcessingStatus.BATCH_ASSIGNED, None, 5)[1:3]
+
+    assert status_handler.persist(updated_rows) is True
+    cur_source_batch = status_handler.get_current_source_batch()
+    assert len(cur_source_batch) == 5
+    assert [row.status for row in cur_source_batch] == [
+        ProcessingStatus.NEW,
+        ProcessingStatus.BATCH_ASSIGNED,
+        ProcessingStatus.BATCH_ASSIGNED,
+        ProcessingStatus.NEW,
+        ProcessingStatus.NEW,
+    ]
+    assert cur_source_batch[1] is updated_rows[0]
 
 
 # test if the _update_status_rows_modification_date function
@@ -140,6 +197,38 @@ def test__default_status_row_date_fields(config):
     )
 
 
+# tests if the default dates are assigned per StatusRow instead of once at import time
+def test__status_row_dates_per_instance():
+    first_row = new_batch(0, ProcessingStatus.NEW, None, 1)[0]
+    time.sleep(0.01)
+    second_row = new_batch(0, ProcessingStatus.NEW, None, 1)[0]
+    assert second_row.date_created_ts > first_row.date_created_ts
+    assert not hasattr(first_row, "__dict__")  # compact, slotted rows
+
+    now = datetime.now()
+    first_row.date_modified = now
+    assert first_row.date_modified_ts == now.timestamp()
+    assert first_row.date_modified == now
+
+
+# the dates can still be passed as datetime, by keyword or by position
+def test__status_row_datetime_arguments():
+    created = datetime(2022, 1, 1, 12, 0, 0)
+    modified = datetime(2022, 1, 2, 12, 0, 0)
+    fields = ["1", "http://1", ProcessingStatus.NEW, 0, None, None, None, None, None]
+    by_keyword = StatusRow(
+        *fields, proc_error_code=None, date_created=created, date_modified=modified
+    )
+    by_position = StatusRow(*fields, None, created, modified)
+    for row in [by_keyword, by_position]:
+        assert row.date_created == created
+        assert row.date_modified == modified
+        assert row.date_created_ts == created.timestamp()
+
+    by_timestamp = StatusRow(*fields, None, date_created_ts=created.timestamp())
+    assert by_timestamp.date_created == created
+
+
 """ --------------------- SQLLITE Status Handler Tests ------------------ """
 
 
@@ -641,6 +730,9 @@ def test_get_error_code_counts_for_source_batch_id(
             ["0"],
             ["1"],
         ),
+        # source batches without a semantic ID are left out
+        ([ProcessingStatus.NEW, ProcessingStatus.FINISHED], [None, 0], ["0"], []),
+        ([ProcessingStatus.NEW], [None], None, None),
     ],
 )
 def test_get_completed_semantic_source_batch_ids(
@@ -1050,3 +1142,570 @@ def test_get_status_counts_per_extra_info(
 
     # clean up after the test
     status_handler._delete_all_rows()
+
+
+def _new_sqlite_status_handler(config) -> SQLiteStatusHandler:
+    # use a test folder to store the database so production database is not affected
+    if os.getcwd().endswith("unit_tests"):
+        config["STATUS_HANDLER"]["CONFIG"] = {
+            "DB_FILE": sep.join(["..", "proc_stats", "all_stats.db"])
+        }
+    else:
+        config["STATUS_HANDLER"]["CONFIG"] = {
+            "DB_FILE": sep.join(["proc_stats", "all_stats.db"])
+        }
+    status_handler = SQLiteStatusHandler(config)
+    status_handler._delete_all_rows()
+    return status_handler
+
+
+def test_get_unfinished_proc_batch_ids(config):
+    status_handler = _new_sqlite_status_handler(config)
+    try:
+        statuses = [
+            ProcessingStatus.FINISHED,  # proc_batch 0 was exported
+            ProcessingStatus.PROCESSING,  # proc_batch 1 is still in flight
+            ProcessingStatus.ERROR,  # proc_batch 2 failed
+            ProcessingStatus.RESULTS_FETCHED,  # proc_batch 3 was not exported yet
+            ProcessingStatus.NEW,  # no proc_batch assigned yet
+        ]
+        status_rows = new_batch(0, ProcessingStatus.NEW, None, len(statuses))
+        for i, row in enumerate(status_rows):
+            row.status = statuses[i]
+            row.proc_batch_id = i if statuses[i] != ProcessingStatus.NEW else None
+        status_handler._persist(status_rows)
+
+        assert status_handler.get_unfinished_proc_batch_ids() == [1, 3]
+        assert status_handler.get_unfinished_proc_batch_ids(2) == [3]
+    finally:
+        status_handler._delete_all_rows()
+        status_handler.close()
+
+
+def test_persist__single_connection_and_transaction(config):
+    status_handler = _new_sqlite_status_handler(config)
+    try:
+        spy2(status_handler._create_connection)
+        status_rows = new_batch(0, ProcessingStatus.NEW, None, 50)
+        assert status_handler._persist(status_rows) is True
+        assert status_handler._persist(status_rows) is True
+
+        # the connection was opened by _delete_all_rows(), so it's simply reused
+        verify(status_handler, times=0)._create_connection(ANY)
+        assert len(status_handler.get_status_rows_of_source_batch(0)) == 50
+    finally:
+        status_handler._delete_all_rows()
+        status_handler.close()
+        unstub()
+
+
+def test_persist__rolls_back_on_failure(config):
+    status_handler = _new_sqlite_status_handler(config)
+    try:
+        status_rows = new_batch(0, ProcessingStatus.NEW, None, 10)
+        status_rows[-1].status = None  # violates NOT NULL, so the whole batch fails
+
+        assert status_handler._persist(status_rows) is False
+        assert status_handler.get_status_rows_of_source_batch(0) is None
+    finally:
+        status_handler._delete_all_rows()
+        status_handler.close()
+
+
+# the dates survive a round trip through the DB (stored as epoch seconds)
+def test_persist__round_trips_dates(config, tmp_path):
+    config["STATUS_HANDLER"]["CONFIG"] = {"DB_FILE": str(tmp_path / "dates.db")}
+    status_handler = SQLiteStatusHandler(config)
+    try:
+        status_rows = new_batch(0, ProcessingStatus.NEW, None, 2)
+        status_rows[0].date_created = datetime(2022, 3, 4, 5, 6, 7, 890000)
+        assert status_handler._persist(status_rows)
+
+        stored_rows = status_handler.get_status_rows_of_source_batch(0)
+        assert [row.date_created_ts for row in stored_rows] == [
+            row.date_created_ts for row in status_rows
+        ]
+        assert stored_rows[0].date_created == datetime(2022, 3, 4, 5, 6, 7, 890000)
+    finally:
+        status_handler.close()
+
+
+# a DB file created before schema versioning (user_version 0) is upgraded on start-up
+def test_migrate_database__upgrades_existing_db(config, tmp_path):
+    db_file = str(tmp_path / "old_stats.db")
+    config["STATUS_HANDLER"]["CONFIG"] = {"DB_FILE": db_file}
+
+    # a database as created before schema versioning: text dates and no indexes
+    conn = sqlite3.connect(db_file)
+    with conn:
+        conn.execute(SQLiteStatusHandler._get_table_sql(None, date_type="text"))
+        conn.executemany(
+            "INSERT INTO status_rows VALUES(?,?,?,?,?,?,?,?,?,?,?,?)",
+            [
+                (str(i), f"http://{i}", 1, 0, "batch_0", "unit_test", None, None)
+                + (None, None, "2022-03-04 05:06:07.890", "2022-03-04 05:06:08.000")
+                for i in range(5)
+            ],
+        )
+    conn.close()
+
+    status_handler = SQLiteStatusHandler(config)
+    try:
+        with status_handler._connection() as conn:
+            schema_version = conn.execute("PRAGMA user_version").fetchone()[0]
+            assert schema_version == len(status_handler._get_migrations())
+            assert "idx_status_rows_proc_batch" in _get_index_names(conn)
+            query_plan = conn.execute(
+                "EXPLAIN QUERY PLAN SELECT status, count(status) FROM status_rows "
+                "WHERE proc_batch_id = ? GROUP BY status",
+                (1,),
+            ).fetchall()
+            assert "idx_status_rows_proc_batch" in str(query_plan)
+        status_rows = status_handler.get_status_rows_of_source_batch(0)
+        assert len(status_rows) == 5
+        assert status_rows[0].date_created == datetime(2022, 3, 4, 5, 6, 7, 890000)
+        assert status_rows[0].date_modified == datetime(2022, 3, 4, 5, 6, 8)
+
+        # the status count tables are filled with the existing rows
+        assert status_handler.get_status_counts() == {ProcessingStatus.NEW: 5}
+        assert status_handler.get_status_counts_for_source_batch_id(0) == {
+            ProcessingStatus.NEW: 5
+        }
+    finally:
+        status_handler.close()
+
+
+def _get_index_names(conn: sqlite3.Connection):
+    return [
+        row[0]
+        for row in conn.execute(
+            "SELECT name FROM sqlite_master WHERE type = 'index' AND sql IS NOT NULL"
+        ).fetchall()
+    ]
+
+
+# the single-pass snapshot reports the same as each of the separate count functions
+# rows cycling through FINISHED, ERROR, PROCESSING and NEW (or all with the given
+# status), in source batches of source_batch_size rows and proc_batches of 4 rows
+def _new_status_rows(
+    num_rows: int, source_batch_size: int = 6, status: Optional[ProcessingStatus] = None
+) -> list:
+    statuses = [
+        ProcessingStatus.FINISHED,
+        ProcessingStatus.ERROR,
+        ProcessingStatus.PROCESSING,
+        ProcessingStatus.NEW,
+    ]
+    status_rows = []
+    for i in range(num_rows):
+        row_status = status if status is not None else statuses[i % 4]
+        status_rows.append(
+            StatusRow(
+                target_id=f"id_{i}",
+                target_url=f"url_{i}",
+                status=row_status,
+                source_batch_id=i // source_batch_size,
+                source_batch_name=f"source_batch_{i // source_batch_size}",
+                source_extra_info=f"genre_{i % 3}",
+                proc_batch_id=i // 4 if row_status != ProcessingStatus.NEW else None,
+                proc_id=None,
+                proc_status_msg=None,
+                proc_error_code=ErrorCode.IMPOSSIBLE
+                if row_status == ProcessingStatus.ERROR
+                else None,
+            )
+        )
+    return status_rows
+
+
+@pytest.mark.parametrize("include_extra_info", [False, True])
+def test_sqlite_get_status_snapshot(config, tmp_path, include_extra_info):
+    config["STATUS_HANDLER"]["CONFIG"] = {"DB_FILE": str(tmp_path / "snapshot.db")}
+    status_handler = SQLiteStatusHandler(config)
+    try:
+        empty_snapshot = status_handler.get_status_snapshot(include_extra_info)
+        assert empty_snapshot.last_proc_batch_id == -1
+        assert empty_snapshot.completed_semantic_source_batch_ids is None
+
+        status_rows = _new_status_rows(12)
+        for row in status_rows[8:]:  # the last proc_batch was exported
+            row.status = ProcessingStatus.FINISHED
+        status_handler.set_current_source_batch(status_rows[6:])
+
+        snapshot = status_handler.get_status_snapshot(include_extra_info)
+        last_proc_batch_id = status_handler.get_last_proc_batch_id()
+        last_source_batch_id = status_handler.get_last_source_batch_id()
+        assert snapshot.last_proc_batch_id == last_proc_batch_id == 2
+        assert snapshot.last_source_batch_id == last_source_batch_id == 1
+        assert snapshot.current_semantic_source_batch_id == "source_batch_1"
+        assert snapshot.status_counts == status_handler.get_status_counts()
+        assert snapshot.error_code_counts == status_handler.get_error_code_counts()
+        assert (
+            snapshot.status_counts_of_last_proc_batch
+            == status_handler.get_status_counts_for_proc_batch_id(last_proc_batch_id)
+        )
+        assert (
+            snapshot.error_code_counts_of_last_proc_batch
+            == status_handler.get_error_code_counts_for_proc_batch_id(
+                last_proc_batch_id
+            )
+        )
+        assert (
+            snapshot.status_counts_of_last_source_batch
+            == status_handler.get_status_counts_for_source_batch_id(
+                last_source_batch_id
+            )
+        )
+        assert (
+            snapshot.error_code_counts_of_last_source_batch
+            == status_handler.get_error_code_counts_for_source_batch_id(
+                last_source_batch_id
+            )
+        )
+        assert (
+            snapshot.completed_semantic_source_batch_ids,
+            snapshot.uncompleted_semantic_source_batch_ids,
+        ) == status_handler.get_completed_semantic_source_batch_ids()
+        assert snapshot.status_counts_per_extra_info_value == (
+            status_handler.get_status_counts_per_extra_info_value()
+            if include_extra_info
+            else None
+        )
+    finally:
+        status_handler.close()
+
+
+# the status count tables always match a GROUP BY on status_rows
+def test_sqlite_status_count_tables(config, tmp_path):
+    config["STATUS_HANDLER"]["CONFIG"] = {"DB_FILE": str(tmp_path / "counts.db")}
+    status_handler = SQLiteStatusHandler(config)
+
+    def assert_counts_match():
+        with status_handler._connection() as conn:
+            for table, columns in status_handler.STATUS_COUNT_TABLES.items():
+                column_list = ", ".join(columns)
+                expected = conn.execute(
+                    f"SELECT {column_list}, COUNT(*) FROM status_rows "
+                    f"GROUP BY {column_list}"
+                ).fetchall()
+                actual = conn.execute(
+                    f"SELECT {column_list}, count FROM {table} WHERE count > 0"
+                ).fetchall()
+                assert sorted(actual, key=str) == sorted(expected, key=str)
+
+    try:
+        status_rows = new_batch(0, ProcessingStatus.NEW, size=10)
+        status_handler.persist(status_rows)
+        assert_counts_match()
+        assert status_handler.get_status_counts() == {ProcessingStatus.NEW: 10}
+
+        # changing statuses (and proc_batches) moves the counts along
+        status_handler.persist(
+            status_handler.update_status_rows(
+                status_rows[:6], status=ProcessingStatus.BATCH_ASSIGNED, proc_batch_id=0
+            )
+        )
+        status_handler.persist(
+            status_handler.update_status_rows(
+                status_rows[:2],
+                status=ProcessingStatus.ERROR,
+                proc_error_code=ErrorCode.IMPOSSIBLE,
+            )
+        )
+        assert_counts_match()
+        assert status_handler.get_status_counts() == {
+            ProcessingStatus.NEW: 4,
+            ProcessingStatus.BATCH_ASSIGNED: 4,
+            ProcessingStatus.ERROR: 2,
+        }
+        assert status_handler.get_status_counts_for_proc_batch_id(0) == {
+            ProcessingStatus.BATCH_ASSIGNED: 4,
+            ProcessingStatus.ERROR: 2,
+        }
+        assert status_handler.get_error_code_counts_for_proc_batch_id(0) == {
+            ErrorCode.IMPOSSIBLE: 2,
+            None: 0,
+        }
+
+        status_handler._delete_all_rows()
+        assert_counts_match()
+        assert status_handler.get_status_counts() == {}
+        assert status_handler.get_completed_semantic_source_batch_ids() == (None, None)
+    finally:
+        status_handler.close()
+
+
+# a source batch is completed once none of its rows is running anymore
+def test_get_completed_semantic_source_batch_ids_after_updates(config, tmp_path):
+    config["STATUS_HANDLER"]["CONFIG"] = {"DB_FILE": str(tmp_path / "completed.db")}
+    status_handler = SQLiteStatusHandler(config)
+    try:
+        status_rows = _new_status_rows(30, 10, ProcessingStatus.NEW)
+        status_handler.persist(status_rows)
+        assert status_handler.get_completed_semantic_source_batch_ids() == (
+            [],
+            ["source_batch_0", "source_batch_1", "source_batch_2"],
+        )
+
+        status_handler.persist(
+            status_handler.update_status_rows(
+                status_rows[:10], status=ProcessingStatus.FINISHED
+            )
+            + status_handler.update_status_rows(
+                status_rows[10:15], status=ProcessingStatus.ERROR
+            )
+        )
+        assert status_handler.get_completed_semantic_source_batch_ids() == (
+            ["source_batch_0"],
+            ["source_batch_1", "source_batch_2"],
+        )
+    finally:
+        status_handler.close()
+
+
+@pytest.mark.parametrize(
+    ("sqlite_config", "success"),
+    [
+        ({"JOURNAL_MODE": "WAL", "SYNCHRONOUS": "NORMAL"}, True),
+        ({"CACHE_SIZE": -64000, "MMAP_SIZE": 268435456}, True),
+        ({"JOURNAL_MODE": "wal"}, False),
+        ({"SYNCHRONOUS": 1}, False),
+        ({"CACHE_SIZE": "64MB"}, False),
+        ({"READ_ONLY": "yes"}, False),
+    ],
+)
+def test_sqlite_validate_config(config, tmp_path, sqlite_config, success):
+    config["STATUS_HANDLER"]["CONFIG"] = {
+        "DB_FILE": str(tmp_path / "pragmas.db"),
+        **sqlite_config,
+    }
+    with when(sys).exit().thenReturn():
+        SQLiteStatusHandler(config).close()
+        if success:
+            verify(sys, times=0).exit()
+        else:
+            verify(sys, atleast=1).exit()
+
+
+def test_sqlite_pragmas(config, tmp_path):
+    config["STATUS_HANDLER"]["CONFIG"] = {
+        "DB_FILE": str(tmp_path / "pragmas.db"),
+        "JOURNAL_MODE": "WAL",
+        "SYNCHRONOUS": "NORMAL",
+        "CACHE_SIZE": -16000,
+        "MMAP_SIZE": 1048576,
+    }
+    status_handler = SQLiteStatusHandler(config)
+    try:
+        with status_handler._connection() as conn:
+            assert conn.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+            assert conn.execute("PRAGMA synchronous").fetchone()[0] == 1  # NORMAL
+            assert conn.execute("PRAGMA cache_size").fetchone()[0] == -16000
+            assert conn.execute("PRAGMA mmap_size").fetchone()[0] == 1048576
+    finally:
+        status_handler.close()
+
+
+# a read-only handler (e.g. of a dashboard) reads the DB while the writer is busy
+def test_sqlite_read_only(config, tmp_path):
+    db_file = str(tmp_path / "shared.db")
+    config["STATUS_HANDLER"]["CONFIG"] = {"DB_FILE": db_file, "JOURNAL_MODE": "WAL"}
+    writer = SQLiteStatusHandler(config)
+    status_rows = new_batch(0, ProcessingStatus.NEW, size=10)
+    writer.persist(status_rows)
+
+    config["STATUS_HANDLER"]["CONFIG"] = {"DB_FILE": db_file, "READ_ONLY": True}
+    reader = SQLiteStatusHandler(config)
+    try:
+        assert reader.get_status_counts() == {ProcessingStatus.NEW: 10}
+
+        # the reader does not block on (and does not see) an uncommitted write
+        with writer._connection() as conn:
+            writer._save_status_rows(
+                conn,
+                [
+                    writer._to_tuple(row)
+                    for row in writer.update_status_rows(
+                        status_rows, status=ProcessingStatus.FINISHED
+                    )
+                ],
+            )
+            assert reader.get_status_counts() == {ProcessingStatus.NEW: 10}
+        assert reader.get_status_counts() == {ProcessingStatus.FINISHED: 10}
+
+        # but cannot write itself
+        assert reader.persist(status_rows) is False
+    finally:
+        reader.close()
+        writer.close()
+
+
+def test_sqlite_read_only_requires_existing_db(config, tmp_path):
+    config["STATUS_HANDLER"]["CONFIG"] = {
+        "DB_FILE": str(tmp_path / "missing.db"),
+        "READ_ONLY": True,
+    }
+    with when(sys).exit().thenReturn():
+        SQLiteStatusHandler(config).close()
+        verify(sys, atleast=1).exit()
+    assert not os.path.exists(tmp_path / "missing.db")
+
+
+# the InMemoryStatusHandler answers all queries exactly like the SQLiteStatusHandler
+def test_in_memory_matches_sqlite(config, tmp_path):
+    config["STATUS_HANDLER"]["CONFIG"] = {"DB_FILE": str(tmp_path / "compare.db")}
+    sqlite_status_handler = SQLiteStatusHandler(config)
+    config["STATUS_HANDLER"]["CONFIG"] = {}
+    in_memory_status_handler = InMemoryStatusHandler(config)
+
+    def query_all(status_handler) -> dict:
+        results = {
+            "snapshot": status_handler.get_status_snapshot(True),
+            "unfinished": status_handler.get_unfinished_proc_batch_ids(),
+            "unfinished_from_2": status_handler.get_unfinished_proc_batch_ids(2),
+            "missing_target_id": status_handler.get_status_row_by_target_id("nope"),
+        }
+        for i in range(-1, 4):
+            results[f"status_counts_{i}"] = (
+                status_handler.get_status_counts_for_proc_batch_id(i),
+                status_handler.get_status_counts_for_source_batch_id(i),
+                status_handler.get_error_code_counts_for_proc_batch_id(i),
+                status_handler.get_error_code_counts_for_source_batch_id(i),
+            )
+            results[f"name_{i}"] = status_handler.get_name_of_source_batch_id(i)
+            for get_rows in [
+                status_handler.get_status_rows_of_proc_batch,
+                status_handler.get_status_rows_of_source_batch,
+            ]:
+                status_rows = get_rows(i)
+                results[f"{get_rows.__name__}_{i}"] = (
+                    sorted(status_rows, key=lambda row: row.target_id)
+                    if status_rows
+                    else status_rows
+                )
+        for i in range(12):
+            results[f"id_{i}"] = status_handler.get_status_row_by_target_id(f"id_{i}")
+        return results
+
+    try:
+        assert query_all(in_memory_status_handler) == query_all(sqlite_status_handler)
+
+        # each handler gets its own rows, as update_status_rows changes them in place
+        for status_handler in [sqlite_status_handler, in_memory_status_handler]:
+            status_rows = _new_status_rows(12)
+            status_handler.set_current_source_batch(status_rows[:6])
+            status_handler.set_current_source_batch(status_rows[6:])
+        assert query_all(in_memory_status_handler) == query_all(sqlite_status_handler)
+
+        # finish source batch 0 & move the unfinished items of source batch 1 along
+        for status_handler in [sqlite_status_handler, in_memory_status_handler]:
+            status_rows = status_handler.get_status_rows_of_source_batch(
+                0
+            ) + status_handler.get_status_rows_of_source_batch(1)
+            status_handler.persist(
+                status_handler.update_status_rows(
+                    [row for row in status_rows[:6] if row.proc_error_code is None],
+                    status=ProcessingStatus.FINISHED,
+                )
+            )
+            status_handler.persist(
+                status_handler.update_status_rows(
+                    [row for row in status_rows[6:] if row.proc_batch_id is None],
+                    status=ProcessingStatus.BATCH_ASSIGNED,
+                    proc_batch_id=3,
+                )
+            )
+        assert query_all(in_memory_status_handler) == query_all(sqlite_status_handler)
+        assert in_memory_status_handler.get_completed_semantic_source_batch_ids() == (
+            ["source_batch_0"],
+            ["source_batch_1"],
+        )
+
+        # a source batch without semantic ID is not part of the (un)completed ones
+        for status_handler in [sqlite_status_handler, in_memory_status_handler]:
+            status_rows = _new_status_rows(13)[12:]
+            status_rows[0].source_batch_name = None
+            status_handler.persist(status_rows)
+        assert query_all(in_memory_status_handler) == query_all(sqlite_status_handler)
+        assert in_memory_status_handler.get_completed_semantic_source_batch_ids() == (
+            ["source_batch_0"],
+            ["source_batch_1"],
+        )
+    finally:
+        sqlite_status_handler.close()
+        in_memory_status_handler.close()
+
+
+# changes to the rows are only stored on persist, as with a DB
+def test_in_memory_stores_copies(config):
+    config["STATUS_HANDLER"]["CONFIG"] = {}
+    status_handler = InMemoryStatusHandler(config)
+    status_rows = new_batch(0, ProcessingStatus.NEW, size=10)
+    status_handler.persist(status_rows)
+
+    status_rows[0].status = ProcessingStatus.FINISHED
+    status_handler.get_status_row_by_target_id("1").status = ProcessingStatus.ERROR
+    assert status_handler.get_status_counts() == {ProcessingStatus.NEW: 10}
+
+    status_handler.persist(status_rows)
+    assert status_handler.get_status_counts() == {
+        ProcessingStatus.NEW: 9,
+        ProcessingStatus.FINISHED: 1,
+    }
+    assert status_handler.save_snapshot() is False  # no SNAPSHOT_FILE configured
+
+
+def test_in_memory_snapshot(config, tmp_path):
+    snapshot_file = tmp_path / "snapshots" / "status.json"
+    config["STATUS_HANDLER"]["CONFIG"] = {"SNAPSHOT_FILE": str(snapshot_file)}
+    status_handler = InMemoryStatusHandler(config)
+    status_rows = _new_status_rows(12)
+    status_handler.set_current_source_batch(status_rows[:6], cursor="5")
+    status_handler.set_current_source_batch(status_rows[6:], cursor="11")
+    assert not snapshot_file.exists()  # the (default) interval has not passed yet
+    status_handler.close()
+
+    # a new handler continues where the previous one stopped
+    restored_status_handler = InMemoryStatusHandler(config)
+    assert restored_status_handler._recover_source_batch() is True
+    assert restored_status_handler.get_current_source_batch() == status_rows[6:]
+    assert restored_status_handler.get_status_snapshot(
+        True
+    ) == status_handler.get_status_snapshot(True)
+    assert restored_status_handler.get_status_rows_of_source_batch(
+        0
+    ) == status_handler.get_status_rows_of_source_batch(0)
+    assert restored_status_handler.get_source_batch_cursor(1) == "11"
+
+
+def test_in_memory_snapshot_interval(config, tmp_path):
+    snapshot_file = tmp_path / "status.json"
+    config["STATUS_HANDLER"]["CONFIG"] = {
+        "SNAPSHOT_FILE": str(snapshot_file),
+        "SNAPSHOT_INTERVAL": 0,
+    }
+    status_handler = InMemoryStatusHandler(config)
+    status_handler.persist(new_batch(0, ProcessingStatus.NEW, size=10))
+    assert snapshot_file.exists()
+    assert InMemoryStatusHandler(config).get_status_counts() == {
+        ProcessingStatus.NEW: 10
+    }
+
+
+@pytest.mark.parametrize(
+    ("in_memory_config", "success"),
+    [
+        ({}, True),
+        ({"SNAPSHOT_INTERVAL": 10}, True),
+        ({"SNAPSHOT_FILE": 1}, False),
+        ({"SNAPSHOT_INTERVAL": "10s"}, False),
+    ],
+)
+def test_in_memory_validate_config(config, tmp_path, in_memory_config, success):
+    config["STATUS_HANDLER"]["CONFIG"] = in_memory_config
+    with when(sys).exit().thenReturn():
+        InMemoryStatusHandler(config)
+        if success:
+            verify(sys, times=0).exit()
+        else:
+            verify(sys, atleast=1).exit()
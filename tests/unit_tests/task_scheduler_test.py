@@ -1,6 +1,8 @@
 import sys
+import threading
+import time
 import pytest
-from mockito import when, verify, ANY
+from mockito import when, verify, spy2, ANY
 from dane_workflows.task_scheduler import TaskScheduler
 from dane_workflows.data_provider import ExampleDataProvider
 from dane_workflows.data_processing import (
@@ -10,6 +12,7 @@ from dane_workflows.exporter import ExampleExporter
 from dane_workflows.status import (
     ExampleStatusHandler,
     ProcessingStatus,
+    SQLiteStatusHandler,
 )
 from dane_workflows.status_monitor import ExampleStatusMonitor
 from test_util import new_batch
@@ -136,3 +139,225 @@ def test_check_batch_limit(config, proc_batch_id, batch_limit, sys_exit):
     with when(sys).exit().thenReturn():
         ts._check_batch_limit(proc_batch_id)
         verify(sys, times=sys_exit).exit()
+
+
+@pytest.mark.parametrize(
+    ("max_in_flight_batches", "success"),
+    [(1, True), (4, True), (0, False), ("4", False)],
+)
+def test_validate_config__max_in_flight_batches(config, max_in_flight_batches, success):
+    config["TASK_SCHEDULER"]["MAX_IN_FLIGHT_BATCHES"] = max_in_flight_batches
+    with when(sys).exit().thenReturn():
+        TaskScheduler(
+            config,
+            ExampleStatusHandler,
+            ExampleDataProvider,
+            ExampleDataProcessingEnvironment,
+            ExampleExporter,
+            unit_test=True,
+        )
+        verify(sys, times=0 if success else 1).exit()
+
+
+def test_recover__all_unfinished_proc_batches(config):
+    config["TASK_SCHEDULER"]["MAX_IN_FLIGHT_BATCHES"] = 3
+    ts = TaskScheduler(
+        config,
+        ExampleStatusHandler,
+        ExampleDataProvider,
+        ExampleDataProcessingEnvironment,
+        ExampleExporter,
+        unit_test=True,
+    )
+    last_proc_batch = new_batch(3, ProcessingStatus.BATCH_ASSIGNED)
+    with when(ts.status_handler).recover(ANY).thenReturn((True, last_proc_batch)), when(
+        ts.status_handler
+    ).get_last_proc_batch_id().thenReturn(3), when(
+        ts.status_handler
+    ).get_unfinished_proc_batch_ids(
+        1
+    ).thenReturn(
+        [1, 2, 3]
+    ), when(
+        ts.status_handler
+    ).get_status_rows_of_proc_batch(
+        1
+    ).thenReturn(
+        new_batch(1, ProcessingStatus.ERROR)
+    ), when(
+        ts.status_handler
+    ).get_status_rows_of_proc_batch(
+        2
+    ).thenReturn(
+        new_batch(2, ProcessingStatus.PROCESSED)
+    ):
+        unfinished_proc_batches, next_proc_batch_id = ts._recover()
+
+    # proc_batch 1 failed completely, so only 2 and 3 should be finished up
+    assert [(pb_id, skip) for _, pb_id, skip in unfinished_proc_batches] == [
+        (2, 3),
+        (3, 0),
+    ]
+    assert unfinished_proc_batches[1][0] is last_proc_batch
+    assert next_proc_batch_id == 4
+
+
+# old proc_batches with lingering unfinished rows (e.g. PROCESSED items without a DANE
+# result) are not recovered, only the ones that can still be in flight
+@pytest.mark.parametrize(
+    ("max_in_flight_batches", "expected_proc_batch_ids"),
+    [(1, [3]), (2, [3]), (4, [0, 3])],
+)
+def test_recover__only_proc_batches_in_flight(
+    config, tmp_path, max_in_flight_batches, expected_proc_batch_ids
+):
+    config["TASK_SCHEDULER"]["MAX_IN_FLIGHT_BATCHES"] = max_in_flight_batches
+    config["STATUS_HANDLER"]["CONFIG"] = {"DB_FILE": str(tmp_path / "recover.db")}
+    ts = TaskScheduler(
+        config,
+        SQLiteStatusHandler,
+        ExampleDataProvider,
+        ExampleDataProcessingEnvironment,
+        ExampleExporter,
+        unit_test=True,
+    )
+    for proc_batch_id in range(4):
+        status = (
+            ProcessingStatus.PROCESSED
+            if proc_batch_id == 3
+            else ProcessingStatus.FINISHED
+        )
+        proc_batch = new_batch(proc_batch_id, status, size=10)
+        for row in proc_batch:
+            row.proc_batch_id = proc_batch_id
+        if proc_batch_id == 0:
+            proc_batch[0].status = ProcessingStatus.PROCESSED  # no result from DANE
+        ts.status_handler.persist(proc_batch)
+
+    try:
+        unfinished_proc_batches, next_proc_batch_id = ts._recover()
+        assert [pb_id for _, pb_id, _ in unfinished_proc_batches] == (
+            expected_proc_batch_ids
+        )
+        assert next_proc_batch_id == 4
+    finally:
+        ts.status_handler.close()
+
+
+@pytest.mark.parametrize(
+    ("failing_proc_batch_id", "expected_proc_batch_ids"),
+    [
+        (None, [0, 1, 2, 3, 4, 5, 6, 7]),
+        (1, [0, 1, 2]),  # batches already in flight are finished
+    ],
+)
+def test_run__in_flight_batches(config, failing_proc_batch_id, expected_proc_batch_ids):
+    config["TASK_SCHEDULER"]["MAX_IN_FLIGHT_BATCHES"] = 3
+    ts = TaskScheduler(
+        config,
+        ExampleStatusHandler,
+        ExampleDataProvider,
+        ExampleDataProcessingEnvironment,
+        ExampleExporter,
+        unit_test=True,
+    )
+    lock = threading.Lock()
+    running_proc_batch_ids: list = []
+    max_running = []
+
+    def run_proc_batch(status_rows, proc_batch_id, skip_steps=0):
+        with lock:
+            running_proc_batch_ids.append(proc_batch_id)
+            max_running.append(len(running_proc_batch_ids))
+        time.sleep(0.05 if proc_batch_id != failing_proc_batch_id else 0.01)
+        with lock:
+            running_proc_batch_ids.remove(proc_batch_id)
+        return proc_batch_id != failing_proc_batch_id
+
+    def get_next_proc_batch(proc_batch_id, batch_size):
+        return (
+            new_batch(proc_batch_id, ProcessingStatus.NEW)
+            if proc_batch_id < 8
+            else None
+        )
+
+    with when(ts)._recover().thenReturn(([], 0)), when(ts)._get_next_proc_batch(
+        ANY, ANY
+    ).thenAnswer(get_next_proc_batch), when(ts)._run_proc_batch(ANY, ANY).thenAnswer(
+        run_proc_batch
+    ):
+        ts.run()
+        verify(ts, times=len(expected_proc_batch_ids))._run_proc_batch(ANY, ANY)
+
+    assert max(max_running) == 3
+    assert len(running_proc_batch_ids) == 0
+
+
+# the data provider is closed (e.g. to stop prefetching) however the run ends
+@pytest.mark.parametrize("exception", [None, SystemExit])
+def test_run__closes_data_provider(config, exception):
+    ts = TaskScheduler(
+        config,
+        ExampleStatusHandler,
+        ExampleDataProvider,
+        ExampleDataProcessingEnvironment,
+        ExampleExporter,
+        unit_test=True,
+    )
+    with when(ts)._recover().thenReturn(([], 0)), when(ts.data_provider).close():
+        if exception:
+            with when(ts)._get_next_proc_batch(ANY, ANY).thenRaise(exception):
+                with pytest.raises(exception):
+                    ts.run()
+        else:
+            with when(ts)._get_next_proc_batch(ANY, ANY).thenReturn(None):
+                ts.run()
+        verify(ts.data_provider, times=1).close()
+
+
+@pytest.mark.parametrize(
+    ("statuses", "skip_steps"),
+    [
+        ([ProcessingStatus.BATCH_ASSIGNED, ProcessingStatus.ERROR], 0),
+        ([ProcessingStatus.PROCESSED, ProcessingStatus.PROCESSING], 3),
+        ([ProcessingStatus.FINISHED, ProcessingStatus.ERROR], 5),
+        # partially exported (e.g. when exporting in chunks) so fetch & export again
+        ([ProcessingStatus.FINISHED, ProcessingStatus.RESULTS_FETCHED], 4),
+        ([ProcessingStatus.FINISHED, ProcessingStatus.PROCESSED], 3),
+        ([ProcessingStatus.ERROR, ProcessingStatus.ERROR], None),
+    ],
+)
+def test_get_skip_steps(config, statuses, skip_steps):
+    ts = TaskScheduler(
+        config,
+        ExampleStatusHandler,
+        ExampleDataProvider,
+        ExampleDataProcessingEnvironment,
+        ExampleExporter,
+        unit_test=True,
+    )
+    proc_batch = new_batch(0, ProcessingStatus.NEW, None, len(statuses))
+    for row, status in zip(proc_batch, statuses):
+        row.status = status
+    assert ts._get_skip_steps(proc_batch) == skip_steps
+
+
+@pytest.mark.parametrize("export_chunk_size", [-1, 2])
+def test_fetch_and_export_proc_batch_output(config, export_chunk_size):
+    config["TASK_SCHEDULER"]["EXPORT_CHUNK_SIZE"] = export_chunk_size
+    ts = TaskScheduler(
+        config,
+        ExampleStatusHandler,
+        ExampleDataProvider,
+        ExampleDataProcessingEnvironment,
+        ExampleExporter,
+        unit_test=True,
+    )
+    status_rows = new_batch(0, ProcessingStatus.PROCESSED, None, 5)
+    with when(ts.status_handler).get_status_rows_of_proc_batch(0).thenReturn(
+        status_rows
+    ):
+        spy2(ts.exporter.export_results)
+        assert ts._fetch_and_export_proc_batch_output(0) is True
+        verify(ts.exporter, times=3 if export_chunk_size > 0 else 1).export_results(ANY)
+    assert all(row.status == ProcessingStatus.FINISHED for row in status_rows)